@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import platform
+import subprocess
+import tempfile
+import ffmpeg
+
+from check_structure import check_structure, check_mp3_filename_pattern
+from convert_audiobooks import finde_alle_hoerbuecher, check_hoerbuecher, output_path_for
+
+# Vorlagen für die synthetischen Hörbücher: Name -> (Quelle, Bitrate, Kanäle, joint stereo)
+TEMPLATES = {
+    "sinus_mono_48k": ("sine=frequency=440", "48k", 1, 0),
+    "rauschen_mono_64k": ("anoisesrc=color=pink:amplitude=0.2", "64k", 1, 0),
+    "sinus_joint_128k": ("sine=frequency=220", "128k", 2, 1),
+    "rauschen_stereo_96k": ("anoisesrc=color=brown:amplitude=0.2", "96k", 2, 0),
+}
+
+FIRST_NAMES = ["Anna", "Bernd", "Clara", "Dieter", "Emma", "Frieda", "Gerd", "Hanna", "Ingo", "Jana",
+               "Karl", "Lena", "Moritz", "Nina", "Otto", "Paula", "Rolf", "Sina", "Theo", "Ute"]
+LAST_NAMES = ["Albers", "Becker", "Conrad", "Dorn", "Engel", "Fuchs", "Graf", "Haas", "Imhof", "Jung",
+              "Kraus", "Lang", "Mohr", "Nagel", "Ott", "Pohl", "Roth", "Sauer", "Thiel", "Voss"]
+TITLE_WORDS = ["Abenteuer", "Reise", "Geheimnis", "Sommer", "Winter", "Insel", "Schatten", "Spur",
+               "Stadt", "Wald", "Nacht", "Morgen", "Welt", "Zeit", "Brief", "Haus"]
+
+
+def make_templates(template_dir, duration):
+    """
+    Erzeugt mit ffmpeg (lavfi sine/anoisesrc, libmp3lame) je eine echte MP3-Datei pro Vorlage.
+    Gibt ein dict Vorlagenname -> Pfad zurück.
+    """
+    os.makedirs(template_dir, exist_ok=True)
+    templates = {}
+    for name, (source, bitrate, channels, joint_stereo) in TEMPLATES.items():
+        path = os.path.join(template_dir, f"{name}.mp3")
+        (
+            ffmpeg
+            .input(f"{source}:duration={duration}", f="lavfi")
+            .output(path, acodec="libmp3lame", audio_bitrate=bitrate, ac=channels, joint_stereo=joint_stereo)
+            .run(overwrite_output=True, quiet=True)
+        )
+        templates[name] = path
+    return templates
+
+
+def generate_library(root, num_files, templates, seed=1, copy_files=False):
+    """
+    Erzeugt reproduzierbar eine Bibliothek Buchstabe/Author/Buch[/CDxx]/Track nn.mp3 mit
+    insgesamt num_files Dateien, die den Regeln von check_structure entspricht.
+    Alle Dateien eines Hörbuchs stammen aus derselben Vorlage. Dateien werden standardmäßig
+    als Hardlinks angelegt, mit copy_files als echte Kopien.
+    Gibt die Anzahl der erzeugten Hörbücher zurück.
+    """
+    rng = random.Random(seed)
+    template_names = sorted(templates)
+    def link(src, dst):
+        if not copy_files:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(src, dst)
+
+    created = 0
+    num_books = 0
+    while created < num_files:
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        title = f"{rng.choice(TITLE_WORDS)} {num_books + 1}"
+        book_path = os.path.join(root, author[0], author, title)
+        template = templates[rng.choice(template_names)]
+        if rng.random() < 0.5:
+            num_cds = rng.randint(1, 12)
+            dirs = [os.path.join(book_path, f"CD{cd:02d}") for cd in range(1, num_cds + 1)]
+        else:
+            dirs = [book_path]
+        for directory in dirs:
+            if created >= num_files:
+                break
+            os.makedirs(directory, exist_ok=True)
+            for track in range(1, rng.randint(5, 20) + 1):
+                if created >= num_files:
+                    break
+                link(template, os.path.join(directory, f"Track {track:02d}.mp3"))
+                created += 1
+        num_books += 1
+    return num_books
+
+
+def peak_memory_mb(who=resource.RUSAGE_SELF):
+    """
+    Höchster Speicherverbrauch seit Prozessstart: RUSAGE_SELF für diesen Prozess, RUSAGE_CHILDREN
+    für den größten beendeten Kindprozess (ffmpeg, ffprobe).
+    """
+    # ru_maxrss ist unter Linux in KiB, unter macOS in Bytes
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def measure_memory(func):
+    """
+    Wie measure, liefert zusätzlich, um wie viele MB die Höchstwerte des Prozesses und der
+    Kindprozesse während des Aufrufs gestiegen sind. ru_maxrss gilt für die ganze Laufzeit:
+    0 bedeutet, dass die Phase unter dem Höchstwert früherer Phasen geblieben ist.
+    """
+    before = peak_memory_mb(), peak_memory_mb(resource.RUSAGE_CHILDREN)
+    result, elapsed = measure(func)
+    memory = {
+        "peak_memory_increase_mb": peak_memory_mb() - before[0],
+        "children_peak_memory_increase_mb": peak_memory_mb(resource.RUSAGE_CHILDREN) - before[1],
+    }
+    return result, elapsed, memory
+
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def benchmark_filename_pattern(num_files=5000, rounds=5):
+    """
+    Misst check_mp3_filename_pattern für ein Verzeichnis mit num_files Dateien, deren Namen
+    mehrere lange Ziffernfolgen enthalten (beste von rounds Wiederholungen).
+    """
+    files = [f"Hörbuch 2024 Teil {i // 100:07d} Track {i % 100:05d} Version 1.mp3" for i in range(num_files)]
+    best = None
+    for _ in range(rounds):
+        _, elapsed = measure(lambda: check_mp3_filename_pattern(files, "benchmark"))
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(root, work_dir, probe_backend, jobs, convert_books, segment_jobs):
+    results = {}
+
+    hoerbuecher, elapsed, memory = measure_memory(lambda: finde_alle_hoerbuecher(root))
+    num_files = sum(h.num_mp3_files() for h in hoerbuecher)
+    results["scan"] = {"seconds": elapsed, "books": len(hoerbuecher), "files": num_files,
+                       "books_per_second": len(hoerbuecher) / elapsed if elapsed else None, **memory}
+    print(f"Scan: {len(hoerbuecher)} Hörbücher, {num_files} Dateien in {elapsed:.2f} s")
+
+    violations, elapsed, memory = measure_memory(lambda: check_structure(root))
+    results["structure"] = {"seconds": elapsed, "violations": len(violations),
+                            "files_per_second": num_files / elapsed if elapsed else None, **memory}
+    print(f"Strukturprüfung: {len(violations)} Verletzungen in {elapsed:.2f} s")
+
+    pattern_files = 5000
+    elapsed = benchmark_filename_pattern(pattern_files)
+    results["filename_pattern"] = {"seconds": elapsed, "files": pattern_files}
+    print(f"Dateinamen-Muster: {pattern_files} Dateien in {elapsed * 1000:.1f} ms")
+
+    checked, elapsed, memory = measure_memory(lambda: list(check_hoerbuecher(hoerbuecher, jobs, None, probe_backend)))
+    failed = sum(1 for _, errors in checked if errors)
+    results["probe"] = {"seconds": elapsed, "backend": probe_backend, "jobs": jobs, "failed_books": failed,
+                        "files_per_second": num_files / elapsed if elapsed else None, **memory}
+    print(f"Probe ({probe_backend}): {num_files / elapsed if elapsed else 0:.1f} Dateien/s")
+
+    target = os.path.join(work_dir, "converted")
+    os.makedirs(target, exist_ok=True)
+    convert_results = []
+    convert_before = peak_memory_mb(), peak_memory_mb(resource.RUSAGE_CHILDREN)
+    for h in hoerbuecher[:convert_books]:
+        output = output_path_for(h, target)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        source_bytes = h.source_bytes()
+        mode = h.conversion_settings()["mode"]
+        # Neu enkodierte Hörbücher werden mit --segment-jobs > 1 zum Vergleich auch in einem Prozess konvertiert
+        errors, elapsed = measure(lambda: h.convert(output, 1))
+        result = {
+            "book": f"{h.author} - {h.title}",
+            "mode": mode,
+            "seconds": elapsed,
+            "audio_seconds": h.duration,
+            "realtime_factor": h.duration / elapsed if elapsed else None,
+            "source_mb_per_second": source_bytes / elapsed / 1e6 if elapsed else None,
+            "errors": errors,
+        }
+        if segment_jobs > 1 and mode == "encode":
+            segmented_errors, segmented = measure(lambda: h.convert(output, segment_jobs))
+            result.update({
+                "segmented_seconds": segmented,
+                "segmented_realtime_factor": h.duration / segmented if segmented else None,
+                "segmented_speedup": elapsed / segmented if segmented else None,
+                "segmented_errors": segmented_errors,
+            })
+            print(f"Konvertierung {result['book']}: {elapsed:.2f} s in einem Prozess, {segmented:.2f} s mit "
+                  f"{segment_jobs} Segmenten ({result['segmented_speedup'] or 0:.2f}x)")
+        convert_results.append(result)
+    results["convert"] = {
+        "segment_jobs": segment_jobs,
+        "books": convert_results,
+        "peak_memory_increase_mb": peak_memory_mb() - convert_before[0],
+        "children_peak_memory_increase_mb": peak_memory_mb(resource.RUSAGE_CHILDREN) - convert_before[1],
+    }
+    # Höchstwerte über den ganzen Lauf, nicht einer einzelnen Phase zuzuordnen
+    results["process"] = {
+        "peak_memory_mb": peak_memory_mb(),
+        "children_peak_memory_mb": peak_memory_mb(resource.RUSAGE_CHILDREN),
+    }
+    return results
+
+
+def compare(old, new):
+    """
+    Gibt die relative Veränderung der Laufzeiten pro Phase gegenüber einem früheren Ergebnis aus.
+    """
+    for stage in ("scan", "structure", "filename_pattern", "probe"):
+        before = old["results"].get(stage, {}).get("seconds")
+        after = new["results"].get(stage, {}).get("seconds")
+        if before and after:
+            print(f"{stage}: {before:.2f} s -> {after:.2f} s ({(after - before) / before * 100:+.1f} %)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark für Scan, Strukturprüfung, Probing und Konvertierung auf einer synthetischen Hörbuch-Bibliothek.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--files", type=int, default=1000, help="Anzahl der MP3-Dateien in der Bibliothek (bis 100000)")
+    parser.add_argument("--seed", type=int, default=1, help="Startwert für die reproduzierbare Erzeugung")
+    parser.add_argument("--duration", type=float, default=10, help="Länge der Vorlage-MP3s in Sekunden")
+    parser.add_argument("--library", type=str, help="Vorhandene Bibliothek verwenden bzw. hier erzeugen statt in einem temporären Verzeichnis")
+    parser.add_argument("--copy-files", action="store_true", help="Echte Kopien statt Hardlinks anlegen")
+    parser.add_argument("--probe-backend", choices=["ffprobe", "native"], default="ffprobe")
+    parser.add_argument("-j", type=int, default=(os.cpu_count() or 1) + 1, help="Anzahl paralleler Prüfungen")
+    parser.add_argument("--convert-books", type=int, default=3, help="Anzahl der Hörbücher, die konvertiert werden")
+    parser.add_argument("--segment-jobs", type=int, default=1,
+                        help="Neu enkodierte Hörbücher zusätzlich mit so vielen parallelen Segmenten konvertieren und vergleichen")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="JSON-Datei für die Ergebnisse")
+    parser.add_argument("--compare", type=str, help="Früheres Ergebnis (JSON), mit dem verglichen wird")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix="hoerbuch_benchmark_")
+    try:
+        root = args.library or os.path.join(work_dir, "library")
+        if not os.path.isdir(root) or not os.listdir(root):
+            templates = make_templates(os.path.join(work_dir, "templates"), args.duration)
+            num_books = generate_library(root, args.files, templates, args.seed, args.copy_files)
+            print(f"Bibliothek erzeugt: {num_books} Hörbücher, {args.files} Dateien in {root}")
+        results = run_benchmark(root, work_dir, args.probe_backend, args.j, args.convert_books, args.segment_jobs)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "time": time.time(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Ergebnisse gespeichert in {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
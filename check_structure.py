@@ -2,6 +2,9 @@ import os
 import sys
 import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from structure_cache import StructureCache, default_structure_cache_path, dirs_unchanged
 
 
 in_path = "/media/fermat/Seagate Portable Drive/Hörspiele_grosse_Dateien"
@@ -10,13 +13,18 @@ out_path = "/media/fermat/Seagate Portable Drive/Hörspiele_converted"
 
 def print_help():
     print("""
-Verwendung: python convert_all.py <Pfad> [--tryFix] [-h]
+Verwendung: python convert_all.py <Pfad> [--tryFix] [--noCache] [--rebuildCache] [-h]
 
 Parameter:
   <Pfad>      Wurzelverzeichnis, das geprüft werden soll.
   --tryFix    Versucht, bestimmte Strukturfehler automatisch zu beheben:
               Wenn in einem CD-Verzeichnis keine mp3-Dateien, aber genau ein Unterverzeichnis mit mp3-Dateien existiert,
               werden die mp3-Dateien in das CD-Verzeichnis verschoben und das Unterverzeichnis ggf. gelöscht.
+  --noCache   Struktur-Cache weder lesen noch schreiben. Ohne diese Option werden nur Hörbücher erneut
+              geprüft, deren Verzeichnisse (mtime) sich seit dem letzten Lauf geändert haben.
+              Mit --tryFix wird der Cache nicht verwendet.
+  --rebuildCache
+              Struktur-Cache verwerfen und alle Hörbücher neu prüfen.
   -h, --help  Zeigt diese Hilfe an.
 """)
 
@@ -28,76 +36,240 @@ def relpath(path, root_path):
 author_valid_re = re.compile(r'^(?! )[A-Za-zÄÖÜäöüß\-.]+( [A-Za-zÄÖÜäöüß\-.]+)+(?! )$')
 book_valid_re = re.compile(r'^[A-Za-zÄÖÜäöüß0-9 \-.]+$')
 
-def check_structure(root_path, try_fix=False):
+class DirNode:
+    """
+    Momentaufnahme eines Verzeichnisses: Unterverzeichnisse (Name -> DirNode) und übrige Einträge.
+    Alle Regeln laufen auf dieser Momentaufnahme; --tryFix aktualisiert sie beim Umbenennen und Verschieben.
+    """
+    __slots__ = ("dirs", "files")
+
+    def __init__(self):
+        self.dirs = {}
+        self.files = []
+
+    def names(self):
+        return list(self.dirs) + self.files
+
+    def mp3s(self):
+        return [name for name in self.names() if name.lower().endswith('.mp3')]
+
+    def exists(self, name):
+        return name in self.dirs or name in self.files
+
+    def remove(self, name):
+        """
+        Entfernt einen Eintrag und gibt den DirNode (bzw. None für Dateien) zurück.
+        """
+        if name in self.dirs:
+            return self.dirs.pop(name)
+        self.files.remove(name)
+        return None
+
+    def add(self, name, node):
+        if node is not None:
+            self.dirs[name] = node
+        else:
+            self.files.append(name)
+
+    def rename(self, name, new_name):
+        self.add(new_name, self.remove(name))
+
+
+def snapshot(path, mtimes=None):
+    """
+    Liest den gesamten Baum unter path mit einem scandir-Durchlauf pro Verzeichnis ein.
+    Mit mtimes (dict) wird zusätzlich die mtime jedes Verzeichnisses (relativ zu path) vor dem
+    Einlesen gespeichert.
+    """
+    root = DirNode()
+    stack = [(path, root)]
+    while stack:
+        dir_path, node = stack.pop()
+        if mtimes is not None:
+            mtimes[os.path.relpath(dir_path, path)] = os.stat(dir_path).st_mtime_ns
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    child = DirNode()
+                    node.dirs[entry.name] = child
+                    stack.append((entry.path, child))
+                else:
+                    node.files.append(entry.name)
+    return root
+
+
+def check_structure(root_path, try_fix=False, jobs=None, cache=None):
+    """
+    Prüft die Struktur unter root_path. Die Buchstaben-Verzeichnisse werden mit jobs Threads
+    parallel eingelesen und geprüft; jeder Thread sammelt seine Fehler in einer eigenen Liste.
+    Mit cache (StructureCache) werden nur Hörbücher mit geänderten Verzeichnissen neu geprüft;
+    mit try_fix wird der Cache nicht verwendet.
+    """
+    if try_fix:
+        cache = None
     errors = []
-    for letter in os.listdir(root_path):
-        letter_path = os.path.join(root_path, letter)
-        if not os.path.isdir(letter_path):
+    letters = []
+    with os.scandir(root_path) as it:
+        entries = list(it)
+    for entry in entries:
+        letter = entry.name
+        letter_path = entry.path
+        if not entry.is_dir():
             errors.append(f"{relpath(letter_path, root_path)} ist kein Verzeichnis (Ebene 1)")
             continue
         if not (len(letter) == 1 and letter.isalpha()):
             errors.append(f"{relpath(letter_path, root_path)} Name ist kein einzelner Buchstabe (Ebene 1)")
             continue
+        letters.append(letter)
 
-        for author in os.listdir(letter_path):
-            author_path = os.path.join(letter_path, author)
-
-            # --tryFix: Authornamen reparieren
-            if try_fix:
-                new_author = author.replace("_", " ")
-                new_author = re.sub(r'\s+', ' ', new_author)
-                new_author = new_author.strip()
-                if new_author != author:
-                    new_author_path = os.path.join(letter_path, new_author)
-                    # Nur umbenennen, wenn das Ziel noch nicht existiert
-                    if not os.path.exists(new_author_path):
-                        os.rename(author_path, new_author_path)
-                        author = new_author
-                        author_path = new_author_path
-                    else:
-                        errors.append(f"{relpath(author_path, root_path)} kann nicht umbenannt werden in {new_author} (Ebene 2)")
-                        return
+    with ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) + 4)) as executor:
+        for letter_errors in executor.map(lambda letter: check_letter_dir(letter, root_path, try_fix, cache), letters):
+            errors.extend(letter_errors)
+    return errors
 
-            check_author_dir(author, author_path, letter, root_path, errors, try_fix)
+def check_letter_dir(letter, root_path, try_fix, cache=None):
+    errors = []
+    letter_path = os.path.join(root_path, letter)
+    letter_node = DirNode()
+    with os.scandir(letter_path) as it:
+        for entry in it:
+            letter_node.add(entry.name, DirNode() if entry.is_dir() else None)
+    for author in letter_node.names():
+        author_path = os.path.join(letter_path, author)
+
+        # --tryFix: Authornamen reparieren
+        if try_fix:
+            new_author = author.replace("_", " ")
+            new_author = re.sub(r'\s+', ' ', new_author)
+            new_author = new_author.strip()
+            if new_author != author:
+                new_author_path = os.path.join(letter_path, new_author)
+                # Nur umbenennen, wenn das Ziel noch nicht existiert
+                if not letter_node.exists(new_author):
+                    os.rename(author_path, new_author_path)
+                    letter_node.rename(author, new_author)
+                    author = new_author
+                    author_path = new_author_path
+                else:
+                    errors.append(f"{relpath(author_path, root_path)} kann nicht umbenannt werden in {new_author} (Ebene 2)")
+                    continue
 
+        if author not in letter_node.dirs:
+            check_author_dir(author, author_path, letter, root_path, errors, try_fix)
+        elif cache is not None:
+            errors.extend(check_author_dir_cached(author, author_path, letter, root_path, cache))
+        else:
+            check_author_dir(author, author_path, letter, root_path, errors, try_fix, snapshot(author_path))
     return errors
 
-def check_author_dir(author, author_path, letter, root_path, errors, try_fix):
-    found_files_in_author = False
-    if not os.path.isdir(author_path):
-        errors.append(f"{relpath(author_path, root_path)} ist kein Verzeichnis (Ebene 2)")
-        return
+def check_author_name(author, author_path, letter, root_path, errors):
+    """
+    Regeln für den Namen des Author-Verzeichnisses. Gibt False zurück, wenn ein Fehler gefunden wurde.
+    """
     if not author.lower().startswith(letter.lower()):
         errors.append(f"{relpath(author_path, root_path)} beginnt nicht mit '{letter}' (Ebene 2)")
-        return
+        return False
     if not author_valid_re.match(author):
         errors.append(f"{relpath(author_path, root_path)} Authorenverzeichnisname {author} enthält ungültige Zeichen oder kein Leerzeichen in der Mitte (Ebene 2)")
+        return False
+    return True
+
+def check_author_dir(author, author_path, letter, root_path, errors, try_fix, node=None):
+    if node is None:
+        if not os.path.isdir(author_path):
+            errors.append(f"{relpath(author_path, root_path)} ist kein Verzeichnis (Ebene 2)")
+            return
+        node = snapshot(author_path)
+    if not check_author_name(author, author_path, letter, root_path, errors):
         return
 
-    for book in os.listdir(author_path):
+    if node.files:
+        errors.append(f"{relpath(author_path, root_path)} enthält Dateien (Ebene 3)")
+    for book in list(node.dirs):
         book_path = os.path.join(author_path, book)
-        if not os.path.isdir(book_path):
-            if not found_files_in_author:
-                found_files_in_author = True
-                errors.append(f"{relpath(author_path, root_path)} enthält Dateien (Ebene 3)")
-            continue
-        # KORREKTUR: author_path entfernen!
-        check_book_dir(book, book_path, author, author_path, root_path, errors, try_fix)
+        check_book_dir(book, book_path, author, author_path, root_path, errors, try_fix, node)
+
+def check_author_dir_cached(author, author_path, letter, root_path, cache):
+    """
+    Wie check_author_dir (ohne --tryFix), aber mit StructureCache: Bei unveränderter mtime des
+    Author-Verzeichnisses werden die gespeicherten Fehler übernommen, ein Hörbuch wird nur neu
+    eingelesen und geprüft, wenn sich eines seiner Verzeichnisse geändert hat.
+    Gibt die Fehlerliste zurück.
+    """
+    entry = cache.get(root_path, author_path)
+    author_mtime = os.stat(author_path).st_mtime_ns
+    changed = entry is None or entry["mtime"] != author_mtime
+    if changed:
+        author_errors = []
+        books = []
+        with os.scandir(author_path) as it:
+            entries = [(e.name, e.is_dir()) for e in it]
+        if check_author_name(author, author_path, letter, root_path, author_errors):
+            if any(not is_dir for _, is_dir in entries):
+                author_errors.append(f"{relpath(author_path, root_path)} enthält Dateien (Ebene 3)")
+            books = [name for name, is_dir in entries if is_dir]
+        old_books = entry["books"] if entry is not None else {}
+        entry = {"mtime": author_mtime, "errors": author_errors,
+                 "books": {book: old_books.get(book) for book in books}}
+
+    errors = list(entry["errors"])
+    for book, book_entry in entry["books"].items():
+        book_path = os.path.join(author_path, book)
+        if book_entry is not None and dirs_unchanged(book_path, book_entry["dirs"]):
+            cache.count(hit=True)
+        else:
+            cache.count(hit=False)
+            mtimes = {}
+            author_node = DirNode()
+            author_node.dirs[book] = snapshot(book_path, mtimes)
+            book_errors = []
+            check_book_dir(book, book_path, author, author_path, root_path, book_errors, False, author_node)
+            book_entry = entry["books"][book] = {"dirs": mtimes, "errors": book_errors}
+            changed = True
+        errors.extend(book_entry["errors"])
+    if changed:
+        cache.put(root_path, author_path, entry)
+    return errors
+
+def check_book(root_path, letter, author, book):
+    """
+    Prüft nur das Hörbuch root_path/<letter>/<author>/<book> mit den Regeln für Buchstaben-,
+    Author- und Hörbuchverzeichnis (ohne --tryFix). Gibt die Fehlerliste zurück.
+    """
+    errors = []
+    letter_path = os.path.join(root_path, letter)
+    if not (len(letter) == 1 and letter.isalpha()):
+        errors.append(f"{relpath(letter_path, root_path)} Name ist kein einzelner Buchstabe (Ebene 1)")
+        return errors
+    author_path = os.path.join(letter_path, author)
+    if not check_author_name(author, author_path, letter, root_path, errors):
+        return errors
+    book_path = os.path.join(author_path, book)
+    if not os.path.isdir(book_path):
+        errors.append(f"{relpath(author_path, root_path)} enthält Dateien (Ebene 3)")
+        return errors
+    author_node = DirNode()
+    author_node.dirs[book] = snapshot(book_path)
+    check_book_dir(book, book_path, author, author_path, root_path, errors, False, author_node)
+    return errors
 
 def check_Words_in_one_or_the_other(text1, text2):
     words1 = set(text1.lower().split())
     words2 = set(text2.lower().split())
     return not words1.isdisjoint(words2)
 
-def check_book_dir(book, book_path, author, author_path, root_path, errors, try_fix):
+def check_book_dir(book, book_path, author, author_path, root_path, errors, try_fix, author_node=None):
+    if author_node is None:
+        author_node = snapshot(author_path)
     if try_fix:
         new_book = book.replace("_", " ")
         new_book = re.sub(r'\s+', ' ', new_book)
         new_book = new_book.strip()
         if new_book != book:
             new_book_path = os.path.join(author_path, new_book)
-            if not os.path.exists(new_book_path):
+            if not author_node.exists(new_book):
                 os.rename(book_path, new_book_path)
+                author_node.rename(book, new_book)
                 book = new_book
                 book_path = new_book_path
             else:
@@ -113,11 +285,11 @@ def check_book_dir(book, book_path, author, author_path, root_path, errors, try_
         errors.append(f"{relpath(book_path, root_path)} Name des Authors und des Hörbuchs dürfen sich nicht gegenseitig enthalten (Ebene 3)")
         return
 
-    flatten_single_subdirs(book_path, try_fix)
+    node = author_node.dirs[book]
+    flatten_single_subdirs(book_path, try_fix, node)
 
-    entries = os.listdir(book_path)
-    mp3s = [f for f in entries if f.lower().endswith('.mp3')]
-    cds = [f for f in entries if os.path.isdir(os.path.join(book_path, f))]
+    mp3s = node.mp3s()
+    cds = list(node.dirs)
 
     if mp3s and cds:
         errors.append(f"{relpath(book_path, root_path)} enthält sowohl mp3-Dateien als auch CD-Verzeichnisse (Ebene 4)")
@@ -129,30 +301,34 @@ def check_book_dir(book, book_path, author, author_path, root_path, errors, try_
         if err:
             errors.append(err)
     if cds:
-        check_cd_dirs(book_path, root_path, errors, cds, try_fix)
+        check_cd_dirs(book_path, root_path, errors, cds, try_fix, node)
 
-def flatten_single_subdirs(book_path, try_fix):
+def flatten_single_subdirs(book_path, try_fix, node=None):
     if not try_fix:
         return
+    if node is None:
+        node = snapshot(book_path)
     changed = True
     while changed:
-        entries = os.listdir(book_path)
-        subdirs = [d for d in entries if os.path.isdir(os.path.join(book_path, d))]
-        files = [f for f in entries if os.path.isfile(os.path.join(book_path, f))]
-        if len(subdirs) == 1 and not files:
-            only_subdir = os.path.join(book_path, subdirs[0])
-            for entry in os.listdir(only_subdir):
+        if len(node.dirs) == 1 and not node.files:
+            subdir, only_node = next(iter(node.dirs.items()))
+            only_subdir = os.path.join(book_path, subdir)
+            for entry in only_node.names():
                 src = os.path.join(only_subdir, entry)
                 dst = os.path.join(book_path, entry)
-                if os.path.exists(dst):
+                if node.exists(entry):
                     continue
                 shutil.move(src, dst)
+                node.add(entry, only_node.remove(entry))
             os.rmdir(only_subdir)
+            node.remove(subdir)
             changed = True
         else:
             changed = False
 
-def check_cd_dirs(book_path, root_path, errors, cds, try_fix):
+def check_cd_dirs(book_path, root_path, errors, cds, try_fix, node=None):
+    if node is None:
+        node = snapshot(book_path)
     cd_numbers = []
     cd_name_bases = set()
     for cd in cds:
@@ -177,27 +353,31 @@ def check_cd_dirs(book_path, root_path, errors, cds, try_fix):
 
     for cd in cds:
         cd_path = os.path.join(book_path, cd)
-        check_cd_mp3s(cd_path, root_path, errors, try_fix)
+        check_cd_mp3s(cd_path, root_path, errors, try_fix, node.dirs.get(cd))
 
-def check_cd_mp3s(cd_path, root_path, errors, try_fix):
-    cd_mp3s = [f for f in os.listdir(cd_path) if f.lower().endswith('.mp3')]
+def check_cd_mp3s(cd_path, root_path, errors, try_fix, node=None):
+    if node is None:
+        node = snapshot(cd_path)
+    cd_mp3s = node.mp3s()
     if not cd_mp3s:
-        subdirs = [d for d in os.listdir(cd_path) if os.path.isdir(os.path.join(cd_path, d))]
         mp3_subdirs = []
-        for subdir in subdirs:
-            subdir_path = os.path.join(cd_path, subdir)
-            subdir_mp3s = [f for f in os.listdir(subdir_path) if f.lower().endswith('.mp3')]
+        for subdir, subdir_node in node.dirs.items():
+            subdir_mp3s = subdir_node.mp3s()
             if subdir_mp3s:
-                mp3_subdirs.append((subdir_path, subdir_mp3s))
+                mp3_subdirs.append((subdir, subdir_mp3s))
         if len(mp3_subdirs) == 1 and try_fix:
-            subdir_path, subdir_mp3s = mp3_subdirs[0]
+            subdir, subdir_mp3s = mp3_subdirs[0]
+            subdir_path = os.path.join(cd_path, subdir)
+            subdir_node = node.dirs[subdir]
             for mp3_file in subdir_mp3s:
                 src = os.path.join(subdir_path, mp3_file)
                 dst = os.path.join(cd_path, mp3_file)
                 shutil.move(src, dst)
-            if not os.listdir(subdir_path):
+                node.add(mp3_file, subdir_node.remove(mp3_file))
+            if not subdir_node.names():
                 os.rmdir(subdir_path)
-            cd_mp3s = [f for f in os.listdir(cd_path) if f.lower().endswith('.mp3')]
+                node.remove(subdir)
+            cd_mp3s = node.mp3s()
             if not cd_mp3s:
                 errors.append(f"{relpath(cd_path, root_path)} enthält nach Fix immer noch keine mp3-Dateien (Ebene 5)")
             else:
@@ -214,67 +394,47 @@ def check_cd_mp3s(cd_path, root_path, errors, try_fix):
             errors.append(err)
     return errors
 
+number_split_re = re.compile(r'(\d+)')
+
 def check_mp3_filename_pattern(file_list, relpath):
     """
     Prüft, ob alle mp3-Dateien in file_list denselben Präfix vor der ersten Zahl haben.
     Gibt None zurück, wenn alles passt, sonst eine Fehlermeldung.
-    Ruft sich rekursiv für jede Gruppe gleicher Zahl auf.
-    In number_dict wird nur der Teil von fname nach der Zahl gespeichert.
+    Dateien mit gleicher Zahl werden anschließend genauso auf den Rest nach der Zahl geprüft.
+    Jeder Dateiname wird nur einmal in Text- und Zahlenteile zerlegt; die Gruppen gleicher Zahlen
+    bilden einen Trie, der ohne Rekursion in derselben Reihenfolge wie früher durchlaufen wird,
+    sodass dieselbe Fehlermeldung entsteht.
     """
     if len(file_list) <= 1:
         return None
-    
-    recList = []
-
 
-    for fname in file_list:
-        recList.append((fname, fname))
-    
-    return check_mp3_filename_patternrec(recList, relpath)
-
-
-def check_mp3_filename_patternrec(file_list, relpath):
-    """
-    Prüft, ob alle mp3-Dateien in file_list denselben Präfix vor der ersten Zahl haben.
-    Gibt None zurück, wenn alles passt, sonst eine Fehlermeldung.
-    Ruft sich rekursiv für jede Gruppe gleicher Zahl auf.
-    In number_dict wird nur der Teil von fname nach der Zahl gespeichert.
-    """
-    if len(file_list) <= 1:
-        return None
+    # parts[2*k] ist der Text vor der k-ten Zahl, parts[2*k+1] die Zahl selbst
+    stack = [([(fname, number_split_re.split(fname)) for fname in file_list], 0)]
+    while stack:
+        group, level = stack.pop()
+        if len(group) <= 1:
+            continue
+        text_index = 2 * level
+        firstName, firstParts = group[0]
+        if len(firstParts) <= text_index + 1:
+            return f"{relpath}: Dateiname '{firstName}' enthält keine Zahl."
+        prefix = firstParts[text_index]
+
+        number_dict = {}
+        for entry in group:
+            parts = entry[1]
+            if len(parts) <= text_index + 1:
+                return f"{relpath}: Dateiname '{''.join(parts[text_index:])}' aus '{entry[0]}' enthält keine Zahl."
+            if parts[text_index] != prefix:
+                return f"{relpath}: Dateiname '{''.join(parts[text_index:])}' aus '{entry[0]}' beginnt nicht mit dem Präfix vor der nächsten Zahl wie '{prefix}' von '{''.join(firstParts[text_index:])}' aus '{firstName}'."
+            number = parts[text_index + 1]
+            if number in number_dict:
+                number_dict[number].append(entry)
+            else:
+                number_dict[number] = [entry]
 
-    # Sortiere die Liste lexikographisch
-    #file_list = sorted(file_list)
-    firstName = file_list[0][0]
-    firstRest = file_list[0][1]
-    m = re.search(r'\d+', firstRest)
-    if not m:
-        return f"{relpath}: Dateiname '{firstName}' enthält keine Zahl."
-
-    prefix = firstRest[:m.start()]
-    number_dict = {}
-
-    for entry in file_list:
-        fname = entry[0]
-        frest = entry[1]
-    
-        m2 = re.search(r'\d+', frest)
-        if not m2:
-            return f"{relpath}: Dateiname '{frest}' aus '{fname}' enthält keine Zahl."
-        if not prefix == frest[:m2.start()]:
-            return f"{relpath}: Dateiname '{frest}' aus '{fname}' beginnt nicht mit dem Präfix vor der nächsten Zahl wie '{prefix}' von '{firstRest}' aus '{firstName}'."
-        
-        number = m2.group(0)
-        # Der Teil nach der Zahl:
-        rest = frest[m2.end():]
-        number_dict.setdefault(number, []).append((fname, rest))
-
-    for num, group in number_dict.items():
-        if len(group) > 1:
-            # Rekursiv prüfen, aber jetzt nur noch auf den Rest
-            err = check_mp3_filename_patternrec(group, relpath)
-            if err:
-                return err
+        # Gruppen in umgekehrter Reihenfolge ablegen, damit die erste zuerst geprüft wird
+        stack.extend((g, level + 1) for g in reversed(list(number_dict.values())) if len(g) > 1)
 
     return None
 
@@ -287,6 +447,9 @@ if __name__ == "__main__":
     if "--tryFix" in args:
         try_fix = True
         args.remove("--tryFix")
+    use_cache = "--noCache" not in args
+    rebuild_cache = "--rebuildCache" in args
+    args = [a for a in args if a not in ("--noCache", "--rebuildCache")]
     if len(args) != 1:
         print_help()
         sys.exit(1)
@@ -294,7 +457,11 @@ if __name__ == "__main__":
     if not os.path.isdir(root):
         print(f"{root} ist kein Verzeichnis!")
         sys.exit(1)
-    violations = check_structure(root, try_fix=try_fix)
+    cache = StructureCache(default_structure_cache_path(), rebuild=rebuild_cache) if use_cache and not try_fix else None
+    violations = check_structure(root, try_fix=try_fix, cache=cache)
+    if cache is not None:
+        cache.save()
+        print(cache.summary())
     if violations:
         print("Verletzungen der Strukturregeln gefunden:")
         for v in sorted(violations):
@@ -2,14 +2,115 @@ import os
 import sys
 import re
 import time
+import struct
 import ffmpeg
 import argparse
 import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import shutil
+import json
+import threading
+from itertools import groupby
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import mutagen
-from mutagen.id3 import ID3, TIT2, TPE1, ID3NoHeaderError
+from mutagen.id3 import ID3, TIT2, TPE1, CHAP, CTOC, CTOCFlags, ID3NoHeaderError
+from mutagen.mp4 import MP4
+from probe_cache import ProbeCache, default_cache_path
+from metrics import recorder
+from journal import RunJournal, partial_path, commit_output, remove_partial, segment_prefix
+import manifest as manifest_mod
+import scheduler
+import planner
+import dedupe
+import mp3_frames
+import process_engine
+import watcher
+import check_structure
+import work_queue
+import staging
+import devices
+import profiles
+
+class Mp3PropertyCheck:
+    """
+    Sammelt die Probe-Ergebnisse der einzelnen mp3-Dateien eines Hörbuchs in beliebiger Reihenfolge
+    und wertet sie in finish() aus (Bitraten, Kanalanzahlen, Kanal-Modi, Fehler).
+    """
+    def __init__(self, hoerbuch):
+        self.hoerbuch = hoerbuch
+        self.file_errors = []
+        self.channels = set()
+        self.channel_layouts = set()
+        self.sum_bitrates = 0
+        self.checked_files = 0
+        self.max_bitrate = 0
+        self.min_bitrate = 10000
+        self.sum_duration = 0.0
+        self.durations = [0.0] * hoerbuch.num_mp3_files()
+        self.pending = hoerbuch.num_mp3_files()
+
+    def add(self, index, mp3, info, error=None):
+        """
+        Übernimmt das Ergebnis für die Datei mit Position index in hoerbuch.mp3_files.
+        Gibt True zurück, sobald für alle Dateien ein Ergebnis vorliegt.
+        """
+        self.pending -= 1
+        if error is not None:
+            self.file_errors.append((index, error))
+            return self.pending == 0
+        codec = info['codec_name']
+        if codec != "mp3":
+            self.file_errors.append((index, f"{mp3}: ist kein MP3-Stream (gefunden: {codec})"))
+        bitrate = int(info['bit_rate'] or 0)
+        channel_count = int(info['channels'] or 0)
+        layout = info['channel_layout']
+        # joint stereo wird meist als "joint_stereo" oder "stereo" kodiert, aber joint stereo ist ein MP3-Feature
+        # ffmpeg gibt "joint_stereo" als channel_layout aus, falls erkannt
+        kbs = bitrate // 1000 if bitrate else 0
+        if self.max_bitrate < kbs:
+            self.max_bitrate = kbs
+        if self.min_bitrate > kbs and kbs > 0:
+            self.min_bitrate = kbs
+        self.sum_bitrates += kbs
+        self.durations[index] = float(info['duration'] or 0)
+        self.sum_duration += self.durations[index]
+        self.channels.add(channel_count)
+        self.channel_layouts.add(layout)
+        self.checked_files += 1
+        return self.pending == 0
+
+    def finish(self):
+        """
+        Gibt die Fehlerliste (in Reihenfolge der Dateien) zurück und setzt bei Erfolg
+        avg_bitrate, min_bitrate, max_bitrate, duration und channel_layout des Hörbuchs.
+        """
+        errors = [err for _, err in sorted(self.file_errors, key=lambda e: e[0])]
+        if len(self.channels) > 1:
+            errors.append(f"Unterschiedliche Kanalanzahlen gefunden: {sorted(self.channels)}")
+        if len(self.channel_layouts) > 1:
+            errors.append(f"Unterschiedliche Kanal-Modi gefunden: {sorted(self.channel_layouts)}")
+
+        h = self.hoerbuch
+        if len(errors) == 0 and self.checked_files > 0:
+            h.avg_bitrate = self.sum_bitrates // self.checked_files
+            h.min_bitrate = self.min_bitrate
+            h.max_bitrate = self.max_bitrate
+            h.duration = self.sum_duration
+            h.file_durations = tuple(self.durations)
+            h.channel_layout = next(iter(self.channel_layouts)) if self.channel_layouts else 'UNDEFINED'
+        return errors
 
 class Hoerbuch:
+    """
+    Ein Hörbuch-Verzeichnis. Die mp3-Dateien werden relativ zum Hörbuch-Verzeichnis gespeichert
+    (bei der Suche mit iter_hoerbuecher schon in deren Threads, sonst beim ersten Zugriff);
+    __slots__ hält die Objekte klein, damit auch Bibliotheken mit Hunderttausenden Hörbüchern wenig
+    Speicher brauchen. mp3_files baut bei jedem Zugriff eine neue Liste absoluter Pfade, häufig
+    durchlaufene Stellen verwenden relative_mp3_files.
+    """
+    __slots__ = ("author", "title", "path", "avg_bitrate", "min_bitrate", "max_bitrate",
+                 "channel_layout", "duration", "file_durations", "_files")
+
     def __init__(self, author, title, path):
         self.author = author
         self.title = title
@@ -18,44 +119,102 @@ class Hoerbuch:
         self.min_bitrate = 0
         self.max_bitrate = 0
         self.channel_layout = 'UNDEFINED'
-        self.mp3_files = self._find_mp3_files()
+        self.duration = 0.0
+        # Spieldauer jeder mp3-Datei in Sekunden (nach erfolgreicher Prüfung)
+        self.file_durations = None
+        self._files = None
+
+    @property
+    def relative_mp3_files(self):
+        """
+        Die mp3-Dateien relativ zum Hörbuch-Verzeichnis (werden beim ersten Zugriff gesucht).
+        """
+        if self._files is None:
+            self._files = self._find_mp3_files()
+        return self._files
+
+    @property
+    def mp3_files(self):
+        return [os.path.join(self.path, f) for f in self.relative_mp3_files]
+
+    @mp3_files.setter
+    def mp3_files(self, files):
+        self._files = tuple(os.path.relpath(f, self.path) for f in files)
+
+    def iter_mp3_files(self):
+        """
+        Die absoluten Pfade der mp3-Dateien, ohne eine Liste aufzubauen.
+        """
+        path = self.path
+        for f in self.relative_mp3_files:
+            yield os.path.join(path, f)
+
+    def num_mp3_files(self):
+        return len(self.relative_mp3_files)
+
+    def take_properties_from(self, other):
+        """
+        Übernimmt die Prüfergebnisse eines Hörbuchs mit identischen Audiodaten.
+        """
+        self.avg_bitrate = other.avg_bitrate
+        self.min_bitrate = other.min_bitrate
+        self.max_bitrate = other.max_bitrate
+        self.channel_layout = other.channel_layout
+        self.duration = other.duration
+        self.file_durations = other.file_durations
+
+    def at_path(self, path):
+        """
+        Dasselbe Hörbuch mit denselben Dateien und Prüfergebnissen, aber unter path
+        (z. B. der Kopie im Staging-Verzeichnis).
+        """
+        h = Hoerbuch(self.author, self.title, path)
+        h._files = self.relative_mp3_files
+        h.take_properties_from(self)
+        return h
+
+    def job_data(self, root_path):
+        """
+        Pfad relativ zu root_path, mp3-Dateien und Prüfergebnisse als dict für die Warteschlange,
+        damit Worker auf anderen Hosts (mit anderem Mount-Punkt) das Hörbuch nicht erneut prüfen müssen.
+        """
+        return {
+            "author": self.author,
+            "title": self.title,
+            "path": os.path.relpath(self.path, root_path),
+            "files": list(self.relative_mp3_files),
+            "avg_bitrate": self.avg_bitrate,
+            "min_bitrate": self.min_bitrate,
+            "max_bitrate": self.max_bitrate,
+            "channel_layout": self.channel_layout,
+            "duration": self.duration,
+            "file_durations": list(self.file_durations) if self.file_durations is not None else None,
+        }
+
+    @classmethod
+    def from_job_data(cls, root_path, data):
+        h = cls(data["author"], data["title"], os.path.join(root_path, data["path"]))
+        h._files = tuple(data["files"])
+        h.avg_bitrate = data["avg_bitrate"]
+        h.min_bitrate = data["min_bitrate"]
+        h.max_bitrate = data["max_bitrate"]
+        h.channel_layout = data["channel_layout"]
+        h.duration = data["duration"]
+        if data["file_durations"] is not None:
+            h.file_durations = tuple(data["file_durations"])
+        return h
 
     def _find_mp3_files(self):
-        mp3_files = []
-        cd_dirs = []
         # Suche nach CD-Verzeichnissen (nur direkte Unterverzeichnisse)
-        for entry in os.listdir(self.path):
-            full_path = os.path.join(self.path, entry)
-            if os.path.isdir(full_path):
-                cd_dirs.append(entry)
-            elif entry.lower().endswith('.mp3'):
-                mp3_files.append((None, entry))
-
-        # Wenn CD-Verzeichnisse existieren, berücksichtige nur mp3s in diesen
-        if cd_dirs:
-            cd_dirs_sorted = sorted(cd_dirs)
-            for cd in cd_dirs_sorted:
-                cd_path = os.path.join(self.path, cd)
-                files = [f for f in os.listdir(cd_path) if f.lower().endswith('.mp3')]
-                for f in sorted(files):
-                    mp3_files.append((cd, f))
-        else:
-            # Nur mp3s im Hauptverzeichnis
-            mp3_files = [(None, f) for _, f in sorted(mp3_files, key=lambda x: x[1])]
-
-        # Sortiere: erst nach CD-Verzeichnis (None < alles andere), dann nach Dateiname
-        mp3_files_sorted = sorted(
-            mp3_files,
-            key=lambda x: (x[0] if x[0] is not None else '', x[1])
-        )
-        # Erzeuge vollständige Pfade
-        result = []
-        for cd, fname in mp3_files_sorted:
-            if cd:
-                result.append(os.path.join(self.path, cd, fname))
-            else:
-                result.append(os.path.join(self.path, fname))
-        return result
+        cd_dirs, files = scan_dir(self.path)
+
+        # Sortiert: erst mp3s im Hauptverzeichnis, dann je CD-Verzeichnis nach Dateiname
+        result = [f for f in sorted(files) if f.lower().endswith('.mp3')]
+        for cd in sorted(cd_dirs):
+            with os.scandir(os.path.join(self.path, cd)) as it:
+                names = [entry.name for entry in it if entry.name.lower().endswith('.mp3')]
+            result.extend(os.path.join(cd, f) for f in sorted(names))
+        return tuple(result)
 
     @staticmethod
     def _normalize_string(s):
@@ -81,7 +240,7 @@ class Hoerbuch:
     def normalized_author(self):
         return self._normalize_string(self.author)
 
-    def check_mp3_properties(self):
+    def check_mp3_properties(self, probe_cache=None, probe_backend='ffprobe'):
         """
         Prüft für alle mp3-Dateien:
         - Sind es wirklich mp3-Dateien?
@@ -89,116 +248,513 @@ class Hoerbuch:
         - Liegt die Bitrate unter 96 kbit/s?
         - Sind sie stereo, mono oder joint stereo kodiert?
         Gibt eine Liste von Fehlern und eine Zusammenfassung der Modi zurück.
+        Mit probe_cache (ProbeCache) werden nur neue oder veränderte Dateien untersucht.
+        probe_backend wählt aus PROBE_BACKENDS, wie die Dateien untersucht werden.
         """
-        errors = []
-        channels = set()
-        channel_layouts = set()
-        sum_bitrates = 0
-        checked_files = 0
-        max_bitrate = 0
-        min_bitrate = 10000
-
-        for mp3 in self.mp3_files:
-            try:
-                probe = ffmpeg.probe(mp3)
-                audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
-                if not audio_stream:
-                    codec_types = []
-                    for stream in probe['streams']:
-                        codec_types.append(stream['codec_type'])
-                        if stream['codec_type'] == 'audio':
-                            codec_types.append(stream.get('codec_name', ''))
-                    errors.append(f"{mp3}: Keine Audiospur gefunden. codec_types: {codec_types}")
-                    continue
-                codec = audio_stream.get('codec_name', '')
-                if codec != "mp3":
-                    errors.append(f"{mp3}: ist kein MP3-Stream (gefunden: {codec})")
-                bitrate = int(audio_stream.get('bit_rate', 0))
-                channel_count = int(audio_stream.get('channels', 0))
-                layout = audio_stream.get('channel_layout', '').lower()
-                # joint stereo wird meist als "joint_stereo" oder "stereo" kodiert, aber joint stereo ist ein MP3-Feature
-                # ffmpeg gibt "joint_stereo" als channel_layout aus, falls erkannt
-                kbs = bitrate // 1000 if bitrate else 0
-                if max_bitrate < kbs:
-                    max_bitrate = kbs
-                if min_bitrate > kbs and kbs > 0:
-                    min_bitrate = kbs
-                sum_bitrates += kbs
-                channels.add(channel_count)
-                channel_layouts.add(layout)
-                checked_files += 1
-            except Exception as e:
-                errors.append(f"{mp3}: Fehler beim Prüfen: {e}")
-
-        if len(channels) > 1:
-            errors.append(f"Unterschiedliche Kanalanzahlen gefunden: {sorted(channels)}")
-        if len(channel_layouts) > 1:
-            errors.append(f"Unterschiedliche Kanal-Modi gefunden: {sorted(channel_layouts)}")
-        
-        if len(errors) == 0 and checked_files > 0:
-            self.avg_bitrate = sum_bitrates // checked_files
-            self.min_bitrate = min_bitrate
-            self.max_bitrate = max_bitrate
-            self.channel_layout = channel_layouts.pop() if channel_layouts else 'UNDEFINED'
-        return errors
+        check = Mp3PropertyCheck(self)
+        for index, mp3 in enumerate(self.iter_mp3_files()):
+            info, error = probe_mp3_file(mp3, probe_cache, probe_backend)
+            check.add(index, mp3, info, error)
+        return check.finish()
 
-    def convert(self, output_path):
+    def convert(self, output_path, segment_jobs=1, chapters='file', profile=None):
         """
-        Konvertiert das gesamte Hörbuch zu einer einzelnen MP3-Datei mit variabler Bitrate (~64 kBit/s).
-        Stereomodus: joint stereo falls channel_layout auf stereo schließen lässt, sonst mono.
-        Falls avg_bitrate < 70, werden die Daten nur konkateniert, aber nicht neu enkodiert.
-        Fügt ID3-Tags für Author und Titel hinzu und übernimmt weitere Tags aus der ersten Quelldatei.
+        Konvertiert das gesamte Hörbuch zu einer einzelnen Datei im Ausgabeprofil profile
+        (Standard: das mit --profile gewählte, sonst MP3 mit ca. 64 kBit/s).
+        Ohne feste Kanalzahl im Profil: stereo falls channel_layout auf stereo schließen lässt, sonst mono.
+        Liegt avg_bitrate unter copy_below des Profils, werden die Daten nur konkateniert, aber nicht neu enkodiert.
+        Mit segment_jobs > 1 werden MP3-Ausgaben beim Neuenkodieren in Teilen (CDs bzw. Dateigruppen)
+        parallel enkodiert und anschließend auf Frame-Ebene zusammengefügt.
+        Author und Titel werden als Tags des Containers gesetzt, weitere Tags aus der ersten Quelldatei
+        übernommen. Mit chapters 'file' bzw. 'cd' werden Kapitel pro Quelldatei bzw. CD geschrieben:
+        bei MP3 als ID3 CHAP/CTOC (die Ausgabe hat immer einen Xing/Info-Header mit TOC für schnelles
+        Springen), bei anderen Containern von ffmpeg aus einer FFMETADATA-Datei (MP4-Kapitel bzw. Vorbis-Kommentare).
         """
-        if not self.mp3_files:
+        if not self.num_mp3_files():
             return ["Keine MP3-Dateien zum Konvertieren gefunden."]
 
-        # Bestimme Stereomodus
+        profile = profile or output_profile
+        mp3_files = self.mp3_files
+        ac = self.channel_count()
+        book = f"{self.author} - {self.title}"
+        durations = self.file_durations
+        reencode = self.needs_reencoding(profile)
+
+        try:
+            output_args = profile.output_args(ac, ffmpeg_threads(profile)) if reencode else None
+            if not reencode:
+                print(f"Durchschnittliche Bitrate {self.avg_bitrate} kBit/s ist unter {profile.copy_below} kBit/s, daher werden die Dateien nur zusammengefügt, ohne neu zu enkodieren.")
+                # Nur zusammenfügen, nicht neu enkodieren
+                with recorder.span("join", book):
+                    joined_durations = self._join_without_reencoding(output_path)
+                durations = joined_durations or durations
+            elif profile.is_mp3:
+                segmented = None
+                if segment_jobs > 1 and self.num_mp3_files() > 1:
+                    print(f"Durchschnittliche Bitrate {self.avg_bitrate} kBit/s, die Dateien werden neu enkodiert ({profile.describe(ac)}, {segment_jobs} Segmente parallel).")
+                    try:
+                        segmented = self._encode_segmented(output_path, output_args, segment_jobs, profile.sample_rate)
+                    except ValueError as e:
+                        print(f"Paralleles Enkodieren für {book} nicht möglich ({e}), enkodiere in einem Prozess.")
+                else:
+                    print(f"Durchschnittliche Bitrate {self.avg_bitrate} kBit/s, die Dateien werden neu enkodiert ({profile.describe(ac)}).")
+                if segmented is None:
+                    with recorder.span("encode", book):
+                        run_ffmpeg_concat(mp3_files, output_path, **output_args)
+                else:
+                    durations = segmented
+            else:
+                print(f"Die Dateien werden neu enkodiert ({profile.describe(ac)}).")
+                # Tags und Kapitel schreibt ffmpeg passend zum Container
+                tags = source_tags(mp3_files[0], self.author, self.title)
+                with recorder.span("encode", book):
+                    run_ffmpeg_concat(mp3_files, output_path, metadata=ffmetadata(tags, self.chapter_list(durations, chapters)),
+                                      **output_args)
+            if profile.is_mp3:
+                # ID3-Tags übernehmen und setzen
+                with recorder.span("tags", book):
+                    merge_id3_tags_from_first_mp3(output_path, mp3_files[0], self.author, self.title,
+                                                  self.chapter_list(durations, chapters), len(mp3_files))
+        except Exception as e:
+            return [f"Fehler bei der Konvertierung: {e}"]
+        return []
+
+    def channel_count(self):
+        """
+        Stereomodus der Ausgabe: 2 falls channel_layout auf stereo schließen lässt, sonst 1 (mono).
+        """
         stereo_keywords = {"stereo", "joint_stereo", "stereo_left", "stereo_right"}
         if any(kw in (self.channel_layout or "") for kw in stereo_keywords):
-            ac = 2
+            return 2
+        return 1
+
+    def conversion_settings(self, profile=None):
+        """
+        Die von convert gewählten Einstellungen, wie sie im Manifest gespeichert werden.
+        """
+        profile = profile or output_profile
+        if not self.needs_reencoding(profile):
+            return {"mode": "copy"}
+        return profile.settings(self.channel_count())
+
+    def needs_reencoding(self, profile=None):
+        """
+        Neu enkodiert wird bei einer durchschnittlichen Bitrate ab copy_below des Profils (MP3: 70 kBit/s),
+        sonst nur zusammengefügt. Profile ohne copy_below enkodieren immer neu.
+        """
+        profile = profile or output_profile
+        return profile.copy_below is None or self.avg_bitrate >= profile.copy_below
+
+    def source_bytes(self):
+        return sum(os.path.getsize(mp3) for mp3 in self.iter_mp3_files())
+
+    def _join_without_reencoding(self, output_path):
+        """
+        Fügt die mp3-Dateien direkt auf Frame-Ebene zusammen (ohne ffmpeg, Daten werden per
+        copy_file_range kopiert) und schreibt dabei einen neuen Xing/Info-Header mit TOC.
+        Ein einzelnes File mit Seek-Tabelle wird als Reflink bzw. Kopie übernommen.
+        Lassen sich die Dateien nicht zusammenfügen, wird der concat demuxer von ffmpeg verwendet.
+        Gibt die exakten Dauern der Quelldateien (aus der Frameanzahl) zurück, sofern bekannt, sonst None.
+        """
+        mp3_files = self.mp3_files
+        if len(mp3_files) == 1 and mp3_frames.has_seek_table(mp3_files[0]):
+            mp3_frames.clone_file(mp3_files[0], output_path)
+            return None
+        durations = []
+        try:
+            mp3_frames.join_mp3_files(mp3_files, output_path, durations)
+        except ValueError as e:
+            print(f"Natives Zusammenfügen für {self.author} - {self.title} nicht möglich ({e}), verwende ffmpeg.")
+            run_ffmpeg_concat(mp3_files, output_path, acodec='copy', write_xing=1)
+            return None
+        return durations
+
+    def chapter_list(self, durations, mode='file'):
+        """
+        Kapitel als Liste (Titel, Start in ms, Ende in ms): mit mode 'file' eines pro Quelldatei
+        (Titel aus dem TIT2-Tag, sonst der Dateiname), mit 'cd' eines pro CD-Verzeichnis.
+        Ohne Dauern, mit 'none' oder bei nur einem Kapitel wird eine leere Liste geliefert.
+        """
+        files = self.relative_mp3_files
+        if mode == 'none' or not durations or len(durations) != len(files):
+            return []
+        if mode == 'cd' and len({os.path.dirname(f) for f in files}) > 1:
+            parts = []
+            for cd, group in groupby(zip(files, durations), key=lambda e: os.path.dirname(e[0])):
+                parts.append((cd or self.title, sum(duration for _, duration in group)))
         else:
-            ac = 1
+            parts = [(source_title(os.path.join(self.path, f)), duration) for f, duration in zip(files, durations)]
+        if len(parts) < 2:
+            return []
+        chapters = []
+        start = 0.0
+        for title, duration in parts:
+            end = start + duration
+            chapters.append((title, int(round(start * 1000)), int(round(end * 1000))))
+            start = end
+        return chapters
+
+    def segment_groups(self, num_segments):
+        """
+        Teilt mp3_files in aufeinanderfolgende Gruppen für das parallele Enkodieren:
+        eine Gruppe pro CD-Verzeichnis, ohne CDs num_segments etwa gleich große Gruppen.
+        """
+        mp3_files = self.mp3_files
+        by_dir = [list(files) for _, files in groupby(mp3_files, key=os.path.dirname)]
+        if len(by_dir) > 1:
+            return by_dir
+        num_segments = max(1, min(num_segments, len(mp3_files)))
+        size, rest = divmod(len(mp3_files), num_segments)
+        groups = []
+        pos = 0
+        for i in range(num_segments):
+            end = pos + size + (1 if i < rest else 0)
+            groups.append(mp3_files[pos:end])
+            pos = end
+        return groups
+
+    def _encode_segmented(self, output_path, output_args, segment_jobs, sample_rate=None):
+        """
+        Enkodiert die Gruppen aus segment_groups parallel und fügt sie lückenlos zusammen: jedes Segment
+        beginnt mit etwas Vorlauf aus der vorigen Gruppe auf einer Framegrenze des Gesamtdatenstroms und
+        wird auf Frame-Ebene dort angeschnitten, wo es an das vorige anschließt (siehe mp3_frames.plan_segments).
+        Die Ausgabe hat dieselbe Anzahl Samples und dieselben Frames wie beim Enkodieren in einem Prozess,
+        ohne Encoder-Delay und -Padding an den Gruppengrenzen.
+        Gibt die exakten Dauern der Quelldateien in Sekunden zurück. Wirft ValueError, wenn das Hörbuch
+        dafür nicht geeignet ist (unterschiedliche oder umgerechnete Samplerate, zu kurze Gruppen).
+        """
+        mp3_files = self.mp3_files
+        counts = [mp3_frames.decoded_samples(mp3) for mp3 in mp3_files]
+        rates = {rate for _, rate in counts}
+        if len(rates) != 1:
+            raise ValueError("unterschiedliche Samplerates")
+        rate = rates.pop()
+        if sample_rate and sample_rate != rate:
+            raise ValueError("die Samplerate wird umgerechnet")
+        samples = [count for count, _ in counts]
+        groups = self.segment_groups(segment_jobs)
+        plan = mp3_frames.plan_segments(samples, [len(group) for group in groups], mp3_frames.samples_per_frame(rate))
+        book = f"{self.author} - {self.title}"
 
-        # Erzeuge temporäre Datei mit allen Inputs als Liste für concat demuxer
-        with tempfile.NamedTemporaryFile("w", delete=False, suffix=".txt") as f:
-            for mp3 in self.mp3_files:
-                f.write(f"file '{os.path.abspath(mp3)}'\n")
-            concat_list = f.name
+        def encode_segment(part, segment):
+            with recorder.span("segment_encode", book, files=part.end_file - part.first_file):
+                run_ffmpeg_concat(mp3_files[part.first_file:part.end_file], segment, start_sample=part.start_sample,
+                                  end_sample=part.end_sample, **output_args)
 
+        segment_dir = tempfile.mkdtemp(prefix=segment_prefix(output_path), dir=os.path.dirname(os.path.abspath(output_path)))
         try:
-            if self.avg_bitrate < 70:
-                print(f"Durchschnittliche Bitrate {self.avg_bitrate} kBit/s ist unter 70 kBit/s, daher werden die Dateien nur zusammengefügt, ohne neu zu enkodieren.")
-                # Nur zusammenfügen, nicht neu enkodieren
-                (
-                    ffmpeg
-                    .input(concat_list, format='concat', safe=0)
-                    .output(
-                        output_path,
-                        acodec='copy'
-                    )
-                    .run(overwrite_output=True, quiet=True)
-                )
-            else:
-                print(f"Durchschnittliche Bitrate {self.avg_bitrate} kBit/s ist über 70 kBit/s, daher werden die Dateien neu enkodiert mit ca. 64 kBit/s.")
-                # Neu enkodieren mit ca. 64 kBit/s
-                (
-                    ffmpeg
-                    .input(concat_list, format='concat', safe=0)
-                    .output(
-                        output_path,
-                        acodec='libmp3lame',
-                        audio_bitrate='64k',
-                        ac=ac
-                    )
-                    .run(overwrite_output=True, quiet=True)
-                )
-            # ID3-Tags übernehmen und setzen
-            merge_id3_tags_from_first_mp3(output_path, self.mp3_files[0], self.author, self.title)
-        except Exception as e:
-            return [f"Fehler bei der Konvertierung: {e}"]   
+            segments = [os.path.join(segment_dir, f"{i:04d}.mp3") for i in range(len(plan))]
+            with ThreadPoolExecutor(max_workers=segment_jobs) as executor:
+                futures = [
+                    recorder.submit(executor, "segment_encode", encode_segment, part, segment, book=book)
+                    for part, segment in zip(plan, segments)
+                ]
+                for future in futures:
+                    future.result()
+            with recorder.span("segment_join", book):
+                mp3_frames.join_segments(segments, output_path, [part.first_frame for part in plan],
+                                         [part.cut_window for part in plan])
         finally:
-            os.remove(concat_list)
-        return []
+            shutil.rmtree(segment_dir, ignore_errors=True)
+        return [count / rate for count in samples]
+
+def run_ffmpeg_concat(inputs, output_path, metadata=None, start_sample=None, end_sample=None, **output_args):
+    """
+    Führt die Eingabedateien mit dem concat demuxer von ffmpeg zusammen und schreibt sie mit
+    den angegebenen Ausgabeparametern (z.B. acodec, audio_bitrate, ac) nach output_path.
+    metadata (Inhalt einer FFMETADATA-Datei) ersetzt Tags und Kapitel der Ausgabe.
+    Mit start_sample bzw. end_sample wird nur dieser Bereich der dekodierten Samples enkodiert.
+    """
+    # Erzeuge temporäre Datei mit allen Inputs als Liste für concat demuxer
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".txt") as f:
+        for mp3 in inputs:
+            f.write(f"file '{os.path.abspath(mp3)}'\n")
+        concat_list = f.name
+    metadata_file = None
+    try:
+        audio = ffmpeg.input(concat_list, format='concat', safe=0)
+        if start_sample is not None or end_sample is not None:
+            trim = {key: value for key, value in (('start_sample', start_sample), ('end_sample', end_sample))
+                    if value is not None}
+            audio = audio['a'].filter('atrim', **trim).filter('asetpts', 'N/SR/TB')
+        if metadata is None:
+            stream = audio.output(output_path, **output_args)
+        else:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", delete=False, suffix=".txt") as f:
+                f.write(metadata)
+                metadata_file = f.name
+            # Nur die Audiospur (ohne eingebettete Cover); die Metadaten-Eingabe hat keine Spuren,
+            # '1:a?' bindet sie ein, ohne einen Fehler auszulösen
+            meta = ffmpeg.input(metadata_file, format='ffmetadata')
+            stream = ffmpeg.output(audio['a'], meta['a?'], output_path, map_metadata=1, map_chapters=1, **output_args)
+        run_ffmpeg(stream, 'copy' if output_args.get('acodec') == 'copy' else 'encode')
+    finally:
+        os.remove(concat_list)
+        if metadata_file is not None:
+            os.remove(metadata_file)
+
+class ConversionCancelled(Exception):
+    pass
+
+# Sekunden, nach denen ein ffprobe-Aufruf beendet wird
+PROBE_TIMEOUT = 60.0
+# Sekunden ohne Fortschrittsmeldung, nach denen ein ffmpeg-Prozess als hängend beendet wird
+FFMPEG_STALL_TIMEOUT = 300.0
+
+# Alle ffmpeg- und ffprobe-Prozesse laufen über diese Engine
+engine = process_engine.ProcessEngine()
+# Threads pro ffmpeg-Prozess bei Encodern mit Thread-Unterstützung, damit die gleichzeitigen
+# Enkodier-Prozesse zusammen die Kerne nicht überbelegen (siehe configure_engine)
+encoder_threads = 1
+
+def configure_engine(probe_jobs, encode_jobs, copy_jobs, probe_timeout=PROBE_TIMEOUT,
+                     stall_timeout=FFMPEG_STALL_TIMEOUT):
+    """
+    Grenzen der Ressourcenklassen: 'probe' (ffprobe, mit Gesamt-Zeitlimit), 'encode' und 'copy'
+    (ffmpeg, beendet nach stall_timeout Sekunden ohne Fortschritt).
+    """
+    global encoder_threads
+    engine.configure('probe', probe_jobs, timeout=probe_timeout)
+    engine.configure('encode', encode_jobs, stall_timeout=stall_timeout)
+    engine.configure('copy', copy_jobs, stall_timeout=stall_timeout)
+    encoder_threads = max(1, (os.cpu_count() or 1) // max(1, encode_jobs))
+
+configure_engine((os.cpu_count() or 1) + 1, (os.cpu_count() or 1) + 1, 2)
+
+# Ausgabeprofil für convert, needs_reencoding und output_path_for (--profile)
+output_profile = profiles.DEFAULT_PROFILE
+
+def use_profile(profile):
+    global output_profile
+    output_profile = profile
+
+def process_error(cmd, result):
+    """
+    ffmpeg.Error mit Rückgabewert und letzter stderr-Zeile in der Meldung.
+    """
+    error = ffmpeg.Error(cmd, result.stdout, result.stderr_tail.encode("utf-8"))
+    last_line = (result.stderr_tail.strip().splitlines() or [""])[-1]
+    error.args = (f"{cmd} beendet mit Code {result.returncode}: {last_line}",)
+    return error
+
+def run_ffmpeg(stream, resource='encode', on_progress=None):
+    """
+    Führt einen ffmpeg-Aufruf (mit -y) über die Prozess-Engine aus. ffmpeg meldet seinen Fortschritt
+    über -progress, damit hängende Prozesse erkannt werden; von stderr werden nur die letzten Zeilen
+    aufbewahrt. cancel_conversions() beendet laufende Prozesse.
+    """
+    args = stream.global_args('-nostats', '-progress', 'pipe:1').compile(overwrite_output=True)
+    try:
+        result = engine.run(args, resource, on_progress=on_progress)
+    except process_engine.ProcessCancelled:
+        raise ConversionCancelled("Konvertierung abgebrochen")
+    if result.returncode != 0:
+        raise process_error('ffmpeg', result)
+    return result
+
+def ffprobe_json(path):
+    """
+    Wie ffmpeg.probe(path), aber über die Prozess-Engine mit Zeitlimit.
+    """
+    args = ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path]
+    result = engine.run(args, 'probe', capture_stdout=True)
+    if result.returncode != 0:
+        raise process_error('ffprobe', result)
+    return json.loads(result.stdout.decode('utf-8'))
+
+# Encoder -> True, wenn ffmpeg für ihn Threading meldet
+_encoder_threading = {}
+_encoder_threading_lock = threading.Lock()
+
+def encoder_supports_threads(codec):
+    """
+    Fragt ffmpeg einmal pro Encoder nach dessen 'Threading capabilities'. Ohne ffmpeg oder ohne
+    Angabe wird ohne -threads enkodiert.
+    """
+    with _encoder_threading_lock:
+        if codec in _encoder_threading:
+            return _encoder_threading[codec]
+    try:
+        result = engine.run(['ffmpeg', '-hide_banner', '-h', f'encoder={codec}'], 'probe', capture_stdout=True)
+        text = result.stdout.decode('utf-8', 'replace')
+    except (OSError, process_engine.ProcessCancelled, process_engine.ProcessTimeout):
+        text = ""
+    match = re.search(r"Threading capabilities:\s*(\S[^\n]*)", text)
+    supported = match is not None and match.group(1).strip() != "none"
+    with _encoder_threading_lock:
+        _encoder_threading[codec] = supported
+    return supported
+
+def ffmpeg_threads(profile):
+    """
+    -threads für ffmpeg: aus dem Profil bzw. encoder_threads, None bei Encodern ohne Thread-Unterstützung.
+    """
+    if not encoder_supports_threads(profile.codec):
+        return None
+    return profile.threads or encoder_threads
+
+def cancel_conversions():
+    """
+    Verhindert den Start weiterer ffmpeg-Prozesse und beendet alle laufenden.
+    """
+    engine.cancel_all()
+
+class ProbeError(Exception):
+    pass
+
+def ffprobe_mp3_info(mp3):
+    """
+    Ermittelt mit ffprobe codec_name, bit_rate, channels, channel_layout und duration der ersten Audiospur.
+    Wirft ProbeError, wenn die Datei keine Audiospur enthält.
+    """
+    probe = ffprobe_json(mp3)
+    audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
+    if not audio_stream:
+        codec_types = []
+        for stream in probe['streams']:
+            codec_types.append(stream['codec_type'])
+            if stream['codec_type'] == 'audio':
+                codec_types.append(stream.get('codec_name', ''))
+        raise ProbeError(f"Keine Audiospur gefunden. codec_types: {codec_types}")
+    duration = audio_stream.get('duration') or probe.get('format', {}).get('duration') or 0
+    return {
+        'codec_name': audio_stream.get('codec_name', ''),
+        'bit_rate': int(audio_stream.get('bit_rate', 0)),
+        'channels': int(audio_stream.get('channels', 0)),
+        'channel_layout': audio_stream.get('channel_layout', '').lower(),
+        'duration': float(duration),
+    }
+
+def native_mp3_info(mp3):
+    """
+    Liest dieselben Eigenschaften wie ffprobe_mp3_info direkt aus den MPEG-Frame-Headern, ohne Prozessstart.
+    Dateien, die sich so nicht klassifizieren lassen, werden doch mit ffprobe untersucht.
+    """
+    try:
+        info = mp3_frames.read_mp3_info(mp3)
+    except (ValueError, struct.error):
+        info = None
+    if info is None:
+        return ffprobe_mp3_info(mp3)
+    return info
+
+PROBE_BACKENDS = {
+    'ffprobe': ffprobe_mp3_info,
+    'native': native_mp3_info,
+}
+
+def probe_mp3(mp3, probe_cache=None, probe_backend='ffprobe'):
+    probe_func = PROBE_BACKENDS[probe_backend]
+    if probe_cache is not None:
+        return probe_cache.probe(mp3, probe_func)
+    return probe_func(mp3)
+
+def probe_mp3_file(mp3, probe_cache=None, probe_backend='ffprobe'):
+    """
+    Untersucht eine einzelne Datei. Gibt (info, None) oder bei Fehlern (None, Fehlermeldung) zurück.
+    """
+    try:
+        with recorder.span("probe", file=mp3, backend=probe_backend):
+            return probe_mp3(mp3, probe_cache, probe_backend), None
+    except ProbeError as e:
+        return None, f"{mp3}: {e}"
+    except Exception as e:
+        return None, f"{mp3}: Fehler beim Prüfen: {e}"
+
+def check_hoerbuecher(hoerbuecher, num_jobs, probe_cache=None, probe_backend='ffprobe', devices=None):
+    """
+    Prüft die mp3-Dateien aller Hörbücher über eine gemeinsame Warteschlange auf Dateiebene,
+    sodass große Hörbücher auf alle Worker verteilt werden.
+    Liefert (hoerbuch, fehler) als Generator, sobald alle Dateien eines Hörbuchs geprüft sind.
+    hoerbuecher wird nur einmal und nur so weit wie nötig durchlaufen (auch ein Generator ist möglich);
+    es sind höchstens num_jobs * 2 Dateien gleichzeitig in der Warteschlange.
+    Mit devices (devices.DeviceLimits) werden Dateien eines ausgelasteten Geräts zurückgestellt und
+    die nächsten Dateien anderer Geräte vorgezogen.
+    """
+    max_pending = max(1, num_jobs) * 2
+    checks = {}
+    started = {}
+    # Geräte pro Hörbuch und zurückgestellte Dateien, deren Gerät gerade ausgelastet ist
+    book_devices = {}
+    held = deque()
+    # Hörbücher ohne mp3-Dateien, die beim Füllen der Warteschlange gefunden wurden
+    empty = deque()
+
+    def file_tasks():
+        for h in hoerbuecher:
+            # Von iter_hoerbuecher gefundene Hörbücher kennen ihre Dateien schon, hier wird nicht gesucht
+            if not h.relative_mp3_files:
+                empty.append(h)
+                continue
+            for index, mp3 in enumerate(h.iter_mp3_files()):
+                yield h, index, mp3
+    tasks = file_tasks()
+
+    with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+        pending = {}
+
+        def submit(h, index, mp3, devs):
+            if h not in checks:
+                checks[h] = Mp3PropertyCheck(h)
+                started[h] = time.perf_counter()
+            future = recorder.submit(
+                executor, "probe", probe_mp3_file, mp3, probe_cache, probe_backend, book=f"{h.author} - {h.title}"
+            )
+            pending[future] = (h, index, mp3, devs)
+
+        def submit_next():
+            if devices is not None:
+                for i, task in enumerate(held):
+                    if devices.try_acquire(task[3]):
+                        del held[i]
+                        submit(*task)
+                        return True
+            for h, index, mp3 in tasks:
+                devs = ()
+                if devices is not None:
+                    if h not in book_devices:
+                        book_devices[h] = devices.devices(h.path)
+                    devs = book_devices[h]
+                    if not devices.try_acquire(devs):
+                        held.append((h, index, mp3, devs))
+                        if len(held) >= max_pending:
+                            return False
+                        continue
+                submit(h, index, mp3, devs)
+                return True
+            return False
+
+        while len(pending) < max_pending and submit_next():
+            pass
+        while True:
+            while empty:
+                h = empty.popleft()
+                yield h, Mp3PropertyCheck(h).finish()
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                h, index, mp3, devs = pending.pop(future)
+                if devices is not None:
+                    # Die Prüfung liest die Datei: ihre Größe zählt für den Durchsatz des Geräts
+                    try:
+                        size = os.path.getsize(mp3)
+                    except OSError:
+                        size = 0
+                    devices.release(devs, {dev: size for dev in devs})
+                info, error = future.result()
+                if checks[h].add(index, mp3, info, error):
+                    book_devices.pop(h, None)
+                    errors = checks.pop(h).finish()
+                    check_start = started.pop(h)
+                    check_end = time.perf_counter()
+                    recorder.record("check", check_start, check_end, f"{h.author} - {h.title}",
+                                    files=h.num_mp3_files(), errors=len(errors))
+                    elapsed_ms = int((check_end - check_start) * 1000)
+                    print(f"[Done] Author: {h.author}, Titel: {h.title}, Needed: {elapsed_ms} ms")
+                    yield h, errors
+                while len(pending) < max_pending and submit_next():
+                    pass
 
 def copy_id3_tags(src_file, dst_file, author, title):
     try:
@@ -210,34 +766,182 @@ def copy_id3_tags(src_file, dst_file, author, title):
     tags["TIT2"] = TIT2(encoding=3, text=title)
     tags.save(dst_file)
 
-def merge_id3_tags_from_first_mp3(output_path, first_mp3, author, title):
+def merge_id3_tags_from_first_mp3(output_path, first_mp3, author, title, chapters=None, num_sources=1):
+    """
+    Übernimmt die Tags der ersten Quelldatei, setzt Author und Titel und schreibt ggf.
+    Kapitel (Liste aus Titel, Start in ms, Ende in ms) als CHAP-Frames mit einem CTOC-Inhaltsverzeichnis.
+    Kapitel der Quelldatei bleiben erhalten, wenn keine neuen geschrieben werden und sie die
+    einzige Quelldatei ist (num_sources), denn dann gelten sie auch für die Ausgabe.
+    """
     try:
         tags = ID3(first_mp3)
     except ID3NoHeaderError:
         tags = ID3()
     tags["TPE1"] = TPE1(encoding=3, text=author)
     tags["TIT2"] = TIT2(encoding=3, text=title)
+    if chapters or num_sources > 1:
+        # Kapitel der ersten Quelldatei gelten nicht für das ganze Hörbuch
+        tags.delall("CHAP")
+        tags.delall("CTOC")
+    if chapters:
+        element_ids = []
+        for i, (chapter_title, start_ms, end_ms) in enumerate(chapters):
+            element_id = f"chp{i}"
+            element_ids.append(element_id)
+            tags.add(CHAP(element_id=element_id, start_time=start_ms, end_time=end_ms,
+                          start_offset=0xFFFFFFFF, end_offset=0xFFFFFFFF,
+                          sub_frames=[TIT2(encoding=3, text=chapter_title)]))
+        tags.add(CTOC(element_id="toc", flags=CTOCFlags.TOP_LEVEL | CTOCFlags.ORDERED,
+                      child_element_ids=element_ids, sub_frames=[TIT2(encoding=3, text=title)]))
     tags.save(output_path)
 
-def finde_alle_hoerbuecher(root_path):
-    hoerbuecher = []
-    for letter in os.listdir(root_path):
+# ID3-Textframes, die für andere Container als MP3 übernommen werden, mit ihrem Namen in FFMETADATA
+ID3_TO_FFMETADATA = {
+    "TALB": "album",
+    "TPE2": "album_artist",
+    "TCON": "genre",
+    "TDRC": "date",
+    "TCOM": "composer",
+    "TPUB": "publisher",
+}
+
+def source_tags(first_mp3, author, title):
+    """
+    Tags für andere Container als MP3: gängige Text-Tags der ersten Quelldatei, dazu Author und Titel.
+    """
+    tags = {}
+    try:
+        id3 = ID3(first_mp3)
+        for frame, key in ID3_TO_FFMETADATA.items():
+            if frame in id3 and str(id3[frame]).strip():
+                tags[key] = str(id3[frame])
+    except (ID3NoHeaderError, mutagen.MutagenError):
+        pass
+    tags["artist"] = author
+    tags["title"] = title
+    return tags
+
+def _ffmetadata_escape(value):
+    return re.sub(r"([=;#\\\n])", r"\\\1", str(value))
+
+def ffmetadata(tags, chapters):
+    """
+    Inhalt einer FFMETADATA-Datei mit globalen Tags (dict) und Kapiteln (Liste aus Titel,
+    Start in ms, Ende in ms). ffmpeg schreibt sie im Format des Ziel-Containers.
+    """
+    lines = [";FFMETADATA1"]
+    lines += [f"{key}={_ffmetadata_escape(value)}" for key, value in tags.items()]
+    for chapter_title, start_ms, end_ms in chapters:
+        lines += ["[CHAPTER]", "TIMEBASE=1/1000", f"START={start_ms}", f"END={end_ms}",
+                  f"title={_ffmetadata_escape(chapter_title)}"]
+    return "\n".join(lines) + "\n"
+
+def set_container_tags(path, author, title):
+    """
+    Setzt Author und Titel in einer MP4- (m4a/m4b) oder Ogg-Datei (Opus, Vorbis); Kapitel bleiben erhalten.
+    """
+    audio = mutagen.File(path)
+    if audio is None:
+        raise ValueError(f"{path}: Format nicht erkannt")
+    if audio.tags is None:
+        audio.add_tags()
+    if isinstance(audio, MP4):
+        audio.tags["\xa9ART"] = [author]
+        audio.tags["\xa9nam"] = [title]
+    else:
+        audio.tags["artist"] = [author]
+        audio.tags["title"] = [title]
+    audio.save()
+
+def source_title(mp3):
+    """
+    Titel einer Quelldatei aus dem TIT2-Tag, sonst der Dateiname ohne Endung.
+    """
+    try:
+        tags = ID3(mp3)
+        if "TIT2" in tags and str(tags["TIT2"]).strip():
+            return str(tags["TIT2"])
+    except (ID3NoHeaderError, mutagen.MutagenError):
+        pass
+    return os.path.splitext(os.path.basename(mp3))[0]
+
+def scan_dir(path):
+    """
+    Liest ein Verzeichnis mit einem einzigen scandir-Aufruf und liefert (verzeichnisse, dateien).
+    Der Typ kommt aus dem DirEntry, daher ist in der Regel kein zusätzlicher stat-Aufruf nötig.
+    """
+    dirs = []
+    files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    return dirs, files
+
+def _finde_hoerbuecher_des_authors(author, author_path):
+    books, _ = scan_dir(author_path)
+    hoerbuecher = [Hoerbuch(author, book, os.path.join(author_path, book)) for book in sorted(books)]
+    for h in hoerbuecher:
+        # Die Dateien im Thread suchen, nicht später seriell beim Prüfen
+        h.relative_mp3_files
+    return hoerbuecher
+
+def _author_dirs(root_path):
+    letters, _ = scan_dir(root_path)
+    for letter in sorted(letters):
         letter_path = os.path.join(root_path, letter)
-        if not os.path.isdir(letter_path):
-            continue
-        for author in os.listdir(letter_path):
-            author_path = os.path.join(letter_path, author)
-            if not os.path.isdir(author_path):
-                continue
-            for book in os.listdir(author_path):
-                book_path = os.path.join(author_path, book)
-                if not os.path.isdir(book_path):
-                    continue
-                hoerbuecher.append(Hoerbuch(author, book, book_path))
+        authors, _ = scan_dir(letter_path)
+        for author in sorted(authors):
+            yield author, os.path.join(letter_path, author)
+
+def iter_hoerbuecher(root_path, jobs=None):
+    """
+    Liefert alle Hörbücher unter root_path/<Buchstabe>/<Author>/<Titel> als Generator, sobald sie
+    gefunden werden, sortiert nach Buchstabe, Author und Titel.
+    Die Author-Verzeichnisse samt den mp3-Dateien ihrer Hörbücher werden mit jobs Threads parallel
+    gelesen; es werden nur so viele Verzeichnisse im Voraus gelesen, wie Threads vorhanden sind.
+    """
+    jobs = jobs or min(32, (os.cpu_count() or 1) + 4)
+    author_dirs = _author_dirs(root_path)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for author, author_path in author_dirs:
+            pending.append(executor.submit(_finde_hoerbuecher_des_authors, author, author_path))
+            if len(pending) >= jobs:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def finde_alle_hoerbuecher(root_path, jobs=None):
+    """
+    Findet alle Hörbücher unter root_path/<Buchstabe>/<Author>/<Titel> als Liste.
+    """
+    hoerbuecher = list(iter_hoerbuecher(root_path, jobs))
     # Sortiere zuerst nach Author, dann nach Titel (beides lexikographisch)
     hoerbuecher.sort(key=lambda h: (h.author, h.title))
     return hoerbuecher
 
+def output_path_for(h, target_dir, profile=None):
+    extension = (profile or output_profile).extension
+    return os.path.join(target_dir, h.normalized_author(), f"{h.normalized_title()}{extension}")
+
+def print_status(hoerbuecher, target_dir):
+    """
+    Zeigt allein anhand des Manifests (ohne Probing), welche Hörbücher aktuell, veraltet,
+    nicht konvertiert oder unbekannt (Ausgabe ohne Manifest-Eintrag) sind.
+    """
+    manifest = manifest_mod.Manifest(target_dir)
+    counts = {}
+    for h in hoerbuecher:
+        state = manifest.status(h, output_path_for(h, target_dir))
+        counts[state] = counts.get(state, 0) + 1
+        if state != manifest_mod.UP_TO_DATE:
+            print(f"[{state}] Author: {h.author}, Titel: {h.title}")
+    print("Status: " + ", ".join(f"{state}: {counts.get(state, 0)}" for state in (
+        manifest_mod.UP_TO_DATE, manifest_mod.STALE, manifest_mod.MISSING, manifest_mod.UNKNOWN)))
+
 def parse_args():
     parser = argparse.ArgumentParser(
         description="Werkzeug zur Überprüfung und Konvertierung von MP3-Hörbüchern.\n"
@@ -255,20 +959,675 @@ def parse_args():
         "--nocheck", action="store_true",
         help="MP3-Prüfungen überspringen"
     )
+    parser.add_argument(
+        "--probe-backend", choices=sorted(PROBE_BACKENDS), default="ffprobe",
+        help="Wie MP3-Dateien untersucht werden: 'ffprobe' startet pro Datei einen ffprobe-Prozess, 'native' liest die Frame-Header direkt (Fallback auf ffprobe)"
+    )
+    parser.add_argument(
+        "--probe-cache", type=str, default=default_cache_path(),
+        help="SQLite-Datei, in der die Ergebnisse von ffprobe zwischengespeichert werden. Nur neue oder veränderte Dateien (Pfad, Größe, mtime, Inode) werden erneut untersucht."
+    )
+    parser.add_argument(
+        "--no-probe-cache", action="store_true",
+        help="Probe-Cache weder lesen noch schreiben"
+    )
+    parser.add_argument(
+        "--rebuild-probe-cache", action="store_true",
+        help="Probe-Cache verwerfen und alle Dateien neu untersuchen"
+    )
     parser.add_argument(
         "--convert-to", type=str,
         help="Konvertiere alle Hörbücher in das angegebene Zielverzeichnis (Dateien werden in einzelne MP3 exportiert, ca. 64 kBit/s)"
     )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Prüfen und Konvertieren überlappend ausführen: jedes Hörbuch wird konvertiert, sobald seine Prüfung erfolgreich war; Hörbücher mit Fehlern werden übersprungen statt den ganzen Lauf abzubrechen"
+    )
+    parser.add_argument(
+        "--probe-jobs", type=int,
+        help="Anzahl paralleler Prüfungen (ffprobe bzw. Frame-Header lesen), Standard ist der Wert von -j"
+    )
+    parser.add_argument(
+        "--metrics-jsonl", type=str,
+        help="Zeitspannen aller Phasen (Scan, Probe, Warteschlange, Enkodieren, Zusammenfügen, Tags) pro Hörbuch als JSON Lines in diese Datei schreiben"
+    )
+    parser.add_argument(
+        "--trace", type=str,
+        help="Zeitachse des Laufs im Chrome-Trace-Format (chrome://tracing, ui.perfetto.dev) in diese Datei schreiben"
+    )
+    parser.add_argument(
+        "--prometheus", type=str,
+        help="Summen pro Phase als Prometheus-Textfile (node_exporter textfile collector) in diese Datei schreiben"
+    )
+    parser.add_argument(
+        "--status", action="store_true",
+        help="Zeigt anhand des Manifests im --convert-to Verzeichnis, welche Hörbücher aktuell, veraltet oder noch nicht konvertiert sind (ohne Prüfung und Konvertierung)"
+    )
+    parser.add_argument(
+        "--chapters", choices=["file", "cd", "none"], default="file",
+        help="Kapitel (ID3 CHAP/CTOC) in der Ausgabe: eines pro Quelldatei ('file'), eines pro CD-Verzeichnis ('cd') oder keine"
+    )
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Nur planen, nichts konvertieren: schätzt pro Hörbuch Größe und Dauer der Ausgabe (kalibriert mit den Messwerten früherer Läufe aus dem Manifest), die Gesamtdauer für -j und prüft den freien Platz in --convert-to und im temporären Verzeichnis"
+    )
+    parser.add_argument(
+        "--dedupe", action="store_true",
+        help="Hörbücher mit identischen Audiodaten (unabhängig von ID3-Tags) finden und melden. Jedes Duplikat wird nur einmal geprüft und konvertiert, die anderen übernehmen dessen Ausgabe mit eigenem Author und Titel. Schaltet --pipeline ab, da alle Hörbücher vorab verglichen werden."
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Läuft dauerhaft und überwacht das Wurzelverzeichnis (inotify, sonst Polling). Jedes neue oder geänderte Hörbuch wird nach --settle Sekunden ohne Änderung einzeln geprüft (Strukturregeln und MP3-Prüfung) und mit --convert-to konvertiert. Bereits vorhandene Hörbücher werden beim Start nicht verarbeitet."
+    )
+    parser.add_argument(
+        "--settle", type=float, default=60.0,
+        help="--watch: Sekunden, die ein Hörbuch-Verzeichnis unverändert sein muss, bevor es verarbeitet wird"
+    )
+    parser.add_argument(
+        "--watch-backend", choices=["auto", "inotify", "poll"], default="auto",
+        help="--watch: 'inotify' (nur Linux), 'poll' fragt die mtime aller Verzeichnisse regelmäßig ab, 'auto' nimmt inotify, falls verfügbar"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=5.0,
+        help="--watch: Abstand der Abfragen in Sekunden beim Polling"
+    )
+    parser.add_argument(
+        "--queue", type=str,
+        help="Verteilte Konvertierung über dieses gemeinsame Verzeichnis (z. B. auf NFS): ohne --worker stellt dieser Prozess als Koordinator die Hörbücher als Jobs ein, wartet auf die Ergebnisse und führt das Manifest in --convert-to"
+    )
+    parser.add_argument(
+        "--worker", action="store_true",
+        help="Als Worker für --queue arbeiten: bis zu -j Jobs gleichzeitig übernehmen (Lease-Dateien mit Heartbeat), nach --convert-to konvertieren und die Ergebnisse melden. Wurzelverzeichnis und --convert-to sind die lokalen Pfade dieses Hosts. Endet, wenn alle Jobs des Koordinators erledigt sind."
+    )
+    parser.add_argument(
+        "--lease-seconds", type=float, default=work_queue.LEASE_SECONDS,
+        help="--queue: Sekunden ohne Heartbeat, nach denen ein Job eines ausgefallenen Workers übernommen wird"
+    )
+    parser.add_argument(
+        "--probe-timeout", type=float, default=PROBE_TIMEOUT,
+        help="Sekunden, nach denen ein ffprobe-Prozess beendet und die Datei als fehlerhaft gemeldet wird"
+    )
+    parser.add_argument(
+        "--ffmpeg-stall-timeout", type=float, default=FFMPEG_STALL_TIMEOUT,
+        help="Sekunden ohne Fortschrittsmeldung, nach denen ein ffmpeg-Prozess (z. B. bei einer beschädigten Datei) beendet wird"
+    )
+    parser.add_argument(
+        "--stage-dir", type=str,
+        help="Quelldateien vor dem Neuenkodieren in einem sequentiellen Durchlauf pro Hörbuch in dieses lokale Verzeichnis (tmpfs oder SSD) kopieren, damit parallele ffmpeg-Prozesse nicht gleichzeitig auf der Quell-Festplatte springen. Die Kopie wird nach dem Job sofort entfernt."
+    )
+    parser.add_argument(
+        "--stage-max-mb", type=int, default=2048,
+        help="--stage-dir: höchstens so viele MB gleichzeitig im Staging-Verzeichnis; größere Hörbücher werden direkt gelesen"
+    )
+    parser.add_argument(
+        "--stage-prefetch", type=int, default=2,
+        help="--stage-dir: so viele Hörbücher werden vorausgelesen, bevor ein Job sie braucht"
+    )
+    parser.add_argument(
+        "--device-jobs", action="append", metavar="[PFAD=]N",
+        help="Höchstens N gleichzeitige Konvertierungen pro Gerät (st_dev von Quelle und Ziel): PFAD=N für das Gerät, auf dem PFAD liegt, N allein für alle anderen Geräte. Mehrfach angebbar. -j bleibt die Grenze für die CPU (Neuenkodierungen)."
+    )
+    parser.add_argument(
+        "--device-probe-jobs", action="append", metavar="[PFAD=]N",
+        help="Höchstens N gleichzeitige Prüfungen pro Quell-Gerät, Angabe wie bei --device-jobs. --probe-jobs bleibt die Grenze für alle Geräte zusammen."
+    )
+    parser.add_argument(
+        "--profile", default=profiles.DEFAULT_PROFILE.name,
+        help="Ausgabeprofil für --convert-to: eingebaut sind 'mp3' (libmp3lame, ca. 64 kBit/s), 'opus' (libopus, 32 kBit/s) und 'm4b' (AAC, 64 kBit/s); weitere Profile stehen in --profiles"
+    )
+    parser.add_argument(
+        "--profiles", type=str, default=profiles.default_profiles_path(),
+        help="JSON-Datei mit Ausgabeprofilen, z. B. {\"sprache\": {\"codec\": \"libopus\", \"container\": \"opus\", \"bitrate\": \"24k\", \"channels\": 1, \"sample_rate\": 48000}}. Mögliche Einträge: codec, container (mp3, ogg, opus, m4a, m4b), bitrate oder quality (VBR, -q:a), sample_rate, channels, threads, copy_below (nur mp3) und options (weitere ffmpeg-Ausgabeparameter)"
+    )
+    parser.add_argument(
+        "--copy-jobs", type=int, default=2,
+        help="Anzahl paralleler Jobs für Hörbücher, die nur zusammengefügt und nicht neu enkodiert werden. Diese laufen in einem eigenen Pool, damit sie keine Enkodier-Slots belegen."
+    )
+    parser.add_argument(
+        "--segment-jobs", type=int, default=1,
+        help="Anzahl paralleler ffmpeg-Prozesse pro Hörbuch beim Neuenkodieren. Bei Werten > 1 werden CDs bzw. Dateigruppen getrennt enkodiert und danach auf Frame-Ebene zusammengefügt."
+    )
     return parser.parse_args()
 
+class ConvertRun:
+    """
+    Konvertierung in ein Zielverzeichnis: Ausgaben werden atomar geschrieben, im Journal
+    protokolliert und im Manifest erfasst. Reste unterbrochener Läufe werden beim Start entfernt.
+    """
+    def __init__(self, target_dir, segment_jobs=1, compare_settings=True, chapters='file', stager=None):
+        self.target_dir = target_dir
+        self.segment_jobs = segment_jobs
+        # Optional: Quelldateien vor dem Neuenkodieren in ein lokales Staging-Verzeichnis kopieren
+        self.stager = stager
+        self.chapters = chapters
+        self.compare_settings = compare_settings
+        self.journal = RunJournal(target_dir)
+        for output in self.journal.recover():
+            print(f"Unterbrochene Konvertierung nach {output} wird neu gestartet.")
+        self.manifest = manifest_mod.Manifest(target_dir)
+        self.calibration = planner.calibrate(self.manifest, output_profile)
+        self._space_lock = threading.Lock()
+        self._reserved_bytes = 0
+
+    def _reserve_space(self, need):
+        """
+        Reserviert need Bytes im Zielverzeichnis für einen Job. Gibt False zurück, wenn neben den
+        Reservierungen der laufenden Jobs nicht genug Platz frei ist.
+        """
+        with self._space_lock:
+            free = planner.free_bytes(self.target_dir) - planner.DISK_RESERVE_BYTES - self._reserved_bytes
+            if need > free:
+                return False
+            self._reserved_bytes += need
+            return True
+
+    def _release_space(self, need):
+        with self._space_lock:
+            self._reserved_bytes -= need
+
+    def _staged_source(self, h):
+        """
+        Das Hörbuch, aus dem konvertiert wird: beim Neuenkodieren mit Stager dessen lokale Kopie,
+        sonst h selbst.
+        """
+        if self.stager is None or not h.needs_reencoding():
+            return h
+        staged = self.stager.acquire(h)
+        return h.at_path(staged) if staged is not None else h
+
+    def _release_staged(self, h):
+        if self.stager is not None:
+            self.stager.release(h)
+
+    def job_run(self, h):
+        start = time.time()
+        filepath = output_path_for(h, self.target_dir)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Ohne Prüfung sind die Einstellungen nicht bekannt, dann zählen nur die Quelldateien
+        settings = h.conversion_settings() if self.compare_settings else None
+        state = self.manifest.status(h, filepath, settings)
+        if state in (manifest_mod.UP_TO_DATE, manifest_mod.UNKNOWN):
+            self._release_staged(h)
+            print(f"Skipping conversion for {h.author} - {h.title} into {filepath}, file already exists.")
+            return (h, filepath, [f"Skipping conversion for {h.author} - {h.title} into {filepath}, file already exists."])
+        if state == manifest_mod.STALE:
+            print(f"Quellen oder Einstellungen von {h.author} - {h.title} haben sich geändert, {filepath} wird neu erzeugt.")
+        plan = planner.plan_book(h, filepath, state, self.segment_jobs, self.calibration)
+        need = plan.output_bytes + plan.target_temp_bytes
+        if not self._reserve_space(need):
+            self._release_staged(h)
+            print(f"Nicht genug Speicherplatz für {h.author} - {h.title} (ca. {need / 1024 / 1024:.1f} MB), wird nicht gestartet.")
+            return (h, filepath, [f"Nicht genug Speicherplatz in {self.target_dir}: benötigt ca. {need / 1024 / 1024:.1f} MB"])
+        # In eine temporäre Datei schreiben und erst nach Erfolg atomar umbenennen
+        partial = partial_path(filepath)
+        self.journal.record("started", filepath)
+        try:
+            source = self._staged_source(h)
+            convert_start = time.perf_counter()
+            errors = source.convert(partial, self.segment_jobs, self.chapters)
+        finally:
+            self._release_space(need)
+            self._release_staged(h)
+        convert_end = time.perf_counter()
+        if recorder.enabled:
+            bytes_written = os.path.getsize(partial) if not errors and os.path.exists(partial) else 0
+            elapsed = convert_end - convert_start
+            recorder.record(
+                "convert", convert_start, convert_end, f"{h.author} - {h.title}",
+                mode=h.conversion_settings()["mode"], bytes_read=h.source_bytes(), bytes_written=bytes_written,
+                audio_seconds=h.duration, realtime_factor=h.duration / elapsed if elapsed > 0 else None,
+                errors=len(errors)
+            )
+        if errors:
+            if os.path.exists(partial):
+                os.remove(partial)
+            self.journal.record("failed", filepath, errors=errors)
+        else:
+            commit_output(partial, filepath)
+            self.journal.record("completed", filepath)
+            self.manifest.record(h, filepath, h.conversion_settings(), seconds=convert_end - convert_start)
+        end = time.time()
+        elapsed_ms = int((end - start) * 1000)
+        print(f"[Done] Converting Author: {h.author}, Titel: {h.title}, into {filepath}, Needed: {elapsed_ms} ms")
+        return (h, filepath, errors)
+
+    def reuse_run(self, h, source_output):
+        """
+        Übernimmt für ein Hörbuch mit denselben Audiodaten die bereits konvertierte Ausgabe
+        source_output (Reflink bzw. Kopie) und setzt nur Author und Titel neu, statt erneut zu enkodieren.
+        """
+        filepath = output_path_for(h, self.target_dir)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        settings = h.conversion_settings() if self.compare_settings else None
+        state = self.manifest.status(h, filepath, settings)
+        if state in (manifest_mod.UP_TO_DATE, manifest_mod.UNKNOWN):
+            print(f"Skipping conversion for {h.author} - {h.title} into {filepath}, file already exists.")
+            return (h, filepath, [f"Skipping conversion for {h.author} - {h.title} into {filepath}, file already exists."])
+        if not os.path.exists(source_output):
+            return (h, filepath, [f"Die Ausgabe {source_output} des identischen Hörbuchs fehlt, {h.author} - {h.title} wird nicht konvertiert."])
+        partial = partial_path(filepath)
+        self.journal.record("started", filepath, reused=source_output)
+        try:
+            mp3_frames.clone_file(source_output, partial)
+            if output_profile.is_mp3:
+                merge_id3_tags_from_first_mp3(partial, source_output, h.author, h.title)
+            else:
+                set_container_tags(partial, h.author, h.title)
+        except Exception as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            errors = [f"Fehler beim Übernehmen von {source_output}: {e}"]
+            self.journal.record("failed", filepath, errors=errors)
+            return (h, filepath, errors)
+        commit_output(partial, filepath)
+        self.journal.record("completed", filepath)
+        # Ohne Dauer, damit die Kalibrierung nur echte Konvertierungen verwendet
+        self.manifest.record(h, filepath, h.conversion_settings())
+        print(f"[Done] Author: {h.author}, Titel: {h.title}: Ausgabe von {source_output} übernommen.")
+        return (h, filepath, [])
+
+    @staticmethod
+    def print_errors(results):
+        for h, filepath, errors in results:
+            if errors:
+                print(f"Skipping conversion for {h.author} - {h.title} into {filepath} due to errors:")
+                for err in errors:
+                    print(f"     - {err}")
+
+def plan_conversions(hoerbuecher, target_dir, segment_jobs, compare_settings=True):
+    """
+    Plant die Konvertierung aller Hörbücher (ohne etwas zu verändern): Zustand laut Manifest,
+    geschätzte Größe, Dauer und Platzbedarf. Ohne target_dir gelten alle Ausgaben als fehlend.
+    Gibt (Pläne, Kalibrierung) zurück.
+    """
+    manifest = manifest_mod.Manifest(target_dir) if target_dir else None
+    calibration = planner.calibrate(manifest, output_profile) if manifest is not None else planner.Calibration()
+    plans = []
+    for h in hoerbuecher:
+        if manifest is not None:
+            filepath = output_path_for(h, target_dir)
+            settings = h.conversion_settings() if compare_settings else None
+            state = manifest.status(h, filepath, settings)
+        else:
+            filepath = None
+            state = manifest_mod.MISSING
+        plans.append(planner.plan_book(h, filepath, state, segment_jobs, calibration))
+    return plans, calibration
+
+def open_probe_cache(args):
+    if args.no_probe_cache:
+        return None
+    return ProbeCache(args.probe_cache, rebuild=args.rebuild_probe_cache)
+
+def close_probe_cache(probe_cache):
+    if probe_cache is not None:
+        probe_cache.close()
+        print(probe_cache.summary())
+
+def open_stager(args):
+    if not args.stage_dir:
+        return None
+    return staging.Stager(args.stage_dir, args.stage_max_mb * 1024 * 1024, args.stage_prefetch)
+
+def close_stager(stager):
+    if stager is not None:
+        stager.close()
+        print(stager.summary())
+
+def device_limits(label, specs):
+    try:
+        default, caps = devices.parse_caps(specs)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    return devices.DeviceLimits(label, default, caps)
+
+def assign_devices(plans, limits):
+    """
+    Trägt in die Jobs der Pläne die Geräte von Quelle und Ziel für run_lpt ein.
+    """
+    for plan in plans:
+        job = plan.job
+        job.source_device = limits.devices(job.hoerbuch.path)[0]
+        job.devices = limits.devices(job.hoerbuch.path, plan.output_path)
+        job.target_path = plan.output_path
+
+def print_device_summary(limits):
+    for line in limits.summary():
+        print(line)
+
+def print_check_errors(results):
+    """
+    Gibt die Fehler der MP3-Prüfung aus. Liefert True, wenn es Fehler gab.
+    """
+    print("Found errors:")
+    found_errors = False
+    for h, errors in results:
+        if errors:
+            found_errors = True
+            print(f"- Author: {h.author}, Titel: {h.title}, Average Bitrate: {h.avg_bitrate}, Stereo: {h.channel_layout}")
+            print("    Fehler bei MP3-Prüfung:")
+            for err in errors:
+                print(f"     - {err}")
+    return found_errors
+
+def run_pipeline(hoerbuecher, args, num_jobs, probe_jobs):
+    """
+    Prüfen und Konvertieren als Pipeline: jedes Hörbuch wird konvertiert, sobald seine eigene
+    Prüfung erfolgreich war. Hörbücher mit Fehlern werden gemeldet und übersprungen.
+    Prüfung (probe_jobs), Neuenkodierung (num_jobs) und Kopier-Jobs (--copy-jobs) haben eigene Pools.
+    hoerbuecher darf ein Generator sein; es werden nur die Ergebnisse mit Fehlern aufbewahrt.
+    Liefert (Anzahl der Hörbücher, True wenn es Prüfungsfehler gab).
+    """
+    probe_cache = open_probe_cache(args)
+    probe_devices = device_limits("Prüfung", args.device_probe_jobs)
+    stager = open_stager(args) if args.convert_to else None
+    run = ConvertRun(args.convert_to, args.segment_jobs, chapters=args.chapters, stager=stager) if args.convert_to else None
+    failed_checks = []
+    failed_results = []
+    num_books = 0
+
+    def collect(future):
+        result = future.result()
+        if result[2]:
+            failed_results.append(result)
+
+    with ThreadPoolExecutor(max_workers=num_jobs) as encode_executor, \
+            ThreadPoolExecutor(max_workers=max(1, args.copy_jobs)) as copy_executor:
+        futures = set()
+        try:
+            for h, errors in check_hoerbuecher(hoerbuecher, probe_jobs, probe_cache, args.probe_backend, probe_devices):
+                num_books += 1
+                for future in [f for f in futures if f.done()]:
+                    futures.discard(future)
+                    collect(future)
+                if errors:
+                    failed_checks.append((h, errors))
+                    print(f"[Fehler] Author: {h.author}, Titel: {h.title}: Prüfung fehlgeschlagen, wird nicht konvertiert.")
+                    continue
+                if run is not None:
+                    if h.needs_reencoding() and stager is not None:
+                        # In der Reihenfolge vorauslesen, in der die Jobs eingereicht werden
+                        stager.schedule([h])
+                    executor = encode_executor if h.needs_reencoding() else copy_executor
+                    futures.add(recorder.submit(executor, "convert", run.job_run, h, book=f"{h.author} - {h.title}"))
+            close_probe_cache(probe_cache)
+            probe_cache = None
+            for future in as_completed(futures):
+                collect(future)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            cancel_conversions()
+            print("Abgebrochen: wartende Konvertierungen verworfen, laufende ffmpeg-Prozesse beendet.")
+            sys.exit(130)
+        finally:
+            close_probe_cache(probe_cache)
+            if run is not None:
+                run.manifest.save()
+            close_stager(stager)
+    print_device_summary(probe_devices)
+    found_errors = print_check_errors(failed_checks)
+    ConvertRun.print_errors(failed_results)
+    return num_books, found_errors
+
+def process_book(root, key, run, probe_cache, probe_jobs, probe_backend='ffprobe'):
+    """
+    Verarbeitet ein einzelnes Hörbuch root/<Buchstabe>/<Author>/<Titel> im Watch-Modus:
+    Strukturregeln, MP3-Prüfung und (mit run) Konvertierung. Liefert True, wenn keine Fehler auftraten.
+    """
+    letter, author, title = key
+    book_path = os.path.join(root, *key)
+    if not os.path.exists(book_path):
+        # Umbenannt oder gelöscht, der neue Name wird gesondert gemeldet
+        return True
+    errors = check_structure.check_book(root, letter, author, title)
+    if errors:
+        print(f"[Fehler] Author: {author}, Titel: {title}: Verletzungen der Strukturregeln, wird nicht konvertiert:")
+        for err in errors:
+            print(f"     - {err}")
+        return False
+    h = Hoerbuch(author, title, book_path)
+    results = list(check_hoerbuecher([h], probe_jobs, probe_cache, probe_backend))
+    if probe_cache is not None:
+        # Die Überwachung läuft unbegrenzt, die Ergebnisse jedes Hörbuchs sofort festschreiben
+        probe_cache.commit()
+    for h, errors in results:
+        if errors:
+            print_check_errors([(h, errors)])
+            return False
+    if run is None:
+        return True
+    result = run.job_run(h)
+    run.manifest.save()
+    ConvertRun.print_errors([result])
+    return not result[2]
+
+def run_watch(root, args, num_jobs, probe_jobs, stop=None):
+    """
+    Überwacht root und verarbeitet jedes Hörbuch, sobald es --settle Sekunden unverändert war.
+    Bis zu num_jobs Hörbücher werden gleichzeitig verarbeitet, dasselbe Hörbuch nie zweimal parallel;
+    ändert es sich währenddessen, wird es danach erneut verarbeitet. Läuft bis stop gesetzt ist
+    (threading.Event) bzw. bis Strg+C.
+    """
+    source = watcher.open_watcher(root, args.watch_backend, args.poll_interval)
+    settler = watcher.BookSettler(root, args.settle)
+    probe_cache = open_probe_cache(args)
+    stager = open_stager(args) if args.convert_to else None
+    run = ConvertRun(args.convert_to, args.segment_jobs, chapters=args.chapters, stager=stager) if args.convert_to else None
+    print(f"Überwache {root} ({source.name}), Hörbücher werden nach {args.settle:g} s ohne Änderung verarbeitet.")
+    running = {}
+    with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+        try:
+            while stop is None or not stop.is_set():
+                for rel_path in source.read_changes(settler.timeout(1.0)):
+                    settler.mark_path(rel_path)
+                for key in [key for key, future in running.items() if future.done()]:
+                    try:
+                        running.pop(key).result()
+                    except Exception as e:
+                        # Ein einzelnes Hörbuch darf die Überwachung nicht beenden
+                        print(f"[Fehler] Hörbuch {'/'.join(key)}: {e}")
+                for key in settler.due():
+                    if key in running:
+                        settler.mark(key)
+                        continue
+                    print(f"Hörbuch {'/'.join(key)} ist unverändert seit {args.settle:g} s, wird verarbeitet.")
+                    running[key] = executor.submit(process_book, root, key, run, probe_cache, probe_jobs,
+                                                   args.probe_backend)
+            wait(running.values())
+        except KeyboardInterrupt:
+            for future in running.values():
+                future.cancel()
+            cancel_conversions()
+            print("Überwachung beendet.")
+        finally:
+            source.close()
+            if run is not None:
+                run.manifest.save()
+            close_probe_cache(probe_cache)
+            close_stager(stager)
+
+def recover_queue_results(queue, root, run):
+    """
+    Übernimmt die Ergebnisse, die Worker nach einem Abbruch des Koordinators noch gemeldet haben,
+    ins Manifest und leert danach die Warteschlange.
+    """
+    jobs = queue.jobs()
+    for job_id, result in queue.results().items():
+        data = jobs.get(job_id)
+        if data is None or result["errors"]:
+            continue
+        h = Hoerbuch.from_job_data(root, data["book"])
+        filepath = os.path.join(run.target_dir, data["output"])
+        if os.path.exists(filepath):
+            run.manifest.record(h, filepath, data["settings"], seconds=result["seconds"])
+            print(f"Ergebnis eines früheren Laufs übernommen: {h.author} - {h.title} ({result['worker']})")
+    run.manifest.save()
+    queue.reset()
+
+def run_coordinator(plans, root, run, queue):
+    """
+    Stellt die zu konvertierenden Hörbücher (teuerste zuerst) als Jobs in die Warteschlange,
+    wartet auf die Ergebnisse der Worker und trägt erfolgreiche Konvertierungen ins Manifest ein.
+    Liefert die Ergebnisse (h, filepath, fehler) wie ConvertRun.job_run.
+    """
+    by_job = {id(plan.job): plan for plan in plans}
+    pending = {}
+    for order, job in enumerate(scheduler.lpt_order([plan.job for plan in plans if plan.needs_conversion])):
+        plan = by_job[id(job)]
+        h = plan.hoerbuch
+        data = {
+            "book": h.job_data(root),
+            "output": os.path.relpath(plan.output_path, run.target_dir),
+            "settings": h.conversion_settings(),
+            "chapters": run.chapters,
+            "profile_name": output_profile.name,
+            "profile": output_profile.to_dict(),
+        }
+        pending[queue.enqueue(order, data)] = plan
+    queue.mark_complete()
+    print(f"{len(pending)} Jobs in {queue.path} eingestellt, warte auf die Worker.")
+    results = []
+    while pending:
+        for job_id, result in queue.results().items():
+            plan = pending.pop(job_id, None)
+            if plan is None:
+                continue
+            h = plan.hoerbuch
+            if not result["errors"]:
+                run.manifest.record(h, plan.output_path, h.conversion_settings(), seconds=result["seconds"])
+            results.append((h, plan.output_path, result["errors"]))
+            queue.remove(job_id)
+            print(f"[Done] Author: {h.author}, Titel: {h.title}, Worker: {result['worker']}, noch {len(pending)} Jobs")
+        if pending:
+            time.sleep(work_queue.POLL_SECONDS)
+    return results
+
+def queue_job_run(h, filepath, claim, segment_jobs, worker, stager=None):
+    """
+    Konvertiert einen Job der Warteschlange in eine eigene temporäre Datei des Workers und übernimmt
+    sie nur, wenn die Lease danach noch gültig ist. Liefert (fehler, sekunden) oder None, wenn die
+    Lease inzwischen an einen anderen Worker gegangen ist.
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    if claim.previous_owner:
+        # Reste des ausgefallenen Workers: temporäre Ausgabedatei und Segmente
+        remove_partial(partial_path(filepath, claim.previous_owner))
+    partial = partial_path(filepath, worker)
+    # Das Profil des Koordinators, nicht das dieses Prozesses
+    profile = profiles.Profile.from_dict(claim.data["profile_name"], claim.data["profile"])
+    source = h
+    if stager is not None and h.needs_reencoding(profile):
+        staged = stager.acquire(h)
+        source = h.at_path(staged) if staged is not None else h
+    start = time.perf_counter()
+    try:
+        errors = source.convert(partial, segment_jobs, claim.data["chapters"], profile)
+    finally:
+        if stager is not None:
+            stager.release(h)
+    seconds = time.perf_counter() - start
+    if errors or not claim.lease.renew():
+        if os.path.exists(partial):
+            os.remove(partial)
+        return (errors, seconds) if errors else None
+    commit_output(partial, filepath)
+    return [], seconds
+
+def run_worker(root, args, num_jobs, stop=None):
+    """
+    Worker für die Warteschlange --queue: übernimmt bis zu num_jobs Jobs gleichzeitig, erneuert
+    deren Leases (Heartbeat alle lease_seconds / 3) und meldet die Ergebnisse. Endet, wenn der
+    Koordinator alle Jobs eingestellt hat und alle erledigt sind, bzw. wenn stop gesetzt ist.
+    """
+    queue = work_queue.WorkQueue(args.queue, lease_seconds=args.lease_seconds)
+    stager = open_stager(args)
+    print(f"Worker {queue.worker}: bis zu {num_jobs} Jobs aus {args.queue}")
+    running = {}
+    with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+        try:
+            while stop is None or not stop.is_set():
+                for future in [f for f in running if f.done()]:
+                    claim, h = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        outcome = ([f"Fehler bei der Konvertierung: {e}"], None)
+                    if outcome is None or not queue.finish(claim.lease, {"errors": outcome[0], "seconds": outcome[1]}):
+                        print(f"Lease für {h.author} - {h.title} verloren, das Ergebnis wird verworfen.")
+                    else:
+                        print(f"[Done] Author: {h.author}, Titel: {h.title}, Fehler: {len(outcome[0])}")
+                for claim, _ in running.values():
+                    if queue.clock() - claim.lease.renewed >= args.lease_seconds / 3:
+                        claim.lease.renew()
+                if len(running) < num_jobs:
+                    claim = queue.claim()
+                    if claim is not None:
+                        h = Hoerbuch.from_job_data(root, claim.data["book"])
+                        filepath = os.path.join(args.convert_to, claim.data["output"])
+                        print(f"Übernehme {h.author} - {h.title}")
+                        future = executor.submit(queue_job_run, h, filepath, claim, args.segment_jobs, queue.worker, stager)
+                        running[future] = (claim, h)
+                        continue
+                if not running and queue.finished():
+                    break
+                time.sleep(work_queue.POLL_SECONDS)
+        except KeyboardInterrupt:
+            for future in running:
+                future.cancel()
+            cancel_conversions()
+            print("Worker abgebrochen, die Leases laufen ab und werden von anderen Workern übernommen.")
+            sys.exit(130)
+        finally:
+            close_stager(stager)
+
+def write_metrics(args):
+    if args.metrics_jsonl:
+        recorder.write_jsonl(args.metrics_jsonl)
+    if args.trace:
+        recorder.write_chrome_trace(args.trace)
+    if args.prometheus:
+        recorder.write_prometheus(args.prometheus)
+
 def main():
     args = parse_args()
+    if args.metrics_jsonl or args.trace or args.prometheus:
+        recorder.enable()
+    try:
+        run(args)
+    finally:
+        write_metrics(args)
+        for line in engine.summary():
+            print(f"Prozesse {line}")
+
+def load_output_profile(args):
+    if args.profiles != profiles.default_profiles_path() and not os.path.exists(args.profiles):
+        print(f"Profil-Datei {args.profiles} existiert nicht!")
+        sys.exit(1)
+    try:
+        available = profiles.load_profiles(args.profiles)
+    except profiles.ProfileError as e:
+        print(e)
+        sys.exit(1)
+    if args.profile not in available:
+        print(f"Unbekanntes Profil {args.profile} (vorhanden: {', '.join(sorted(available))})")
+        sys.exit(1)
+    return available[args.profile]
+
+def run(args):
     root = args.wurzelverzeichnis
     if not os.path.isdir(root):
         print(f"{root} ist kein Verzeichnis!")
         sys.exit(1)
-    hoerbuecher = finde_alle_hoerbuecher(root)
-    print(f"Gefundene Hörbücher: {len(hoerbuecher)}")
+    use_profile(load_output_profile(args))
+
+    if args.status:
+        if not args.convert_to or not os.path.isdir(args.convert_to):
+            print("--status benötigt ein existierendes Verzeichnis in --convert-to")
+            sys.exit(1)
+        print_status(iter_hoerbuecher(root), args.convert_to)
+        return
 
     # Bestimme Anzahl der Jobs
     if args.j is not None:
@@ -278,70 +1637,134 @@ def main():
             num_jobs = os.cpu_count() + 1
         except Exception:
             num_jobs = 2
+    probe_jobs = args.probe_jobs if args.probe_jobs is not None else num_jobs
+    configure_engine(probe_jobs, num_jobs * max(1, args.segment_jobs), max(1, args.copy_jobs),
+                     args.probe_timeout, args.ffmpeg_stall_timeout)
 
-    results = []
-    if not args.nocheck:
-        def job_check(h):
-            start = time.time()
-            errors = h.check_mp3_properties()
-            end = time.time()
-            elapsed_ms = int((end - start) * 1000)
-            print(f"[Done] Author: {h.author}, Titel: {h.title}, Needed: {elapsed_ms} ms")
-            return (h, errors)
-
-        # Parallel ausführen
-        with ThreadPoolExecutor(max_workers=num_jobs) as executor:
-            futures = {executor.submit(job_check, h): h for h in hoerbuecher}
-            for future in as_completed(futures):
-                h, errors = future.result()
-                results.append((h, errors))
-
-        print("Found errors:")
-        found_errors = False
-        for result in results:
-            h = result[0]
-            errors = result[1]
-            if errors:
-                found_errors = True
-                print(f"- Author: {h.author}, Titel: {h.title}, Average Bitrate: {h.avg_bitrate}, Stereo: {h.channel_layout}")
-                print("    Fehler bei MP3-Prüfung:")
-                for err in errors:
-                    print(f"     - {err}")
+    if args.convert_to and not os.path.isdir(args.convert_to):
+        print(f"{args.convert_to} ist kein Verzeichnis!")
+        sys.exit(1)
+
+    if args.queue and not args.convert_to:
+        print("--queue benötigt --convert-to")
+        sys.exit(1)
+
+    if args.worker:
+        if not args.queue:
+            print("--worker benötigt --queue")
+            sys.exit(1)
+        run_worker(root, args, num_jobs)
+        return
+
+    if args.watch:
+        run_watch(root, args, num_jobs, probe_jobs)
+        return
+
+    if args.pipeline and not args.nocheck and not args.plan and not args.dedupe and not args.queue:
+        # Hörbücher werden geprüft und konvertiert, während die Suche noch läuft
+        num_books, found_errors = run_pipeline(iter_hoerbuecher(root), args, num_jobs, probe_jobs)
+        print(f"Gefundene Hörbücher: {num_books}")
         if found_errors:
             sys.exit(1)
-    
-    results = []
-    if args.convert_to:
-        if not os.path.isdir(args.convert_to):
-            print(f"{args.convert_to} ist kein Verzeichnis!")
+        return
+
+    with recorder.span("scan"):
+        hoerbuecher = finde_alle_hoerbuecher(root)
+    print(f"Gefundene Hörbücher: {len(hoerbuecher)}")
+
+    # Doppelte Hörbücher werden nur einmal geprüft und konvertiert: Duplikat -> Original
+    duplicates = {}
+    if args.dedupe:
+        with recorder.span("dedupe"):
+            book_groups, file_groups = dedupe.find_duplicate_books(hoerbuecher, probe_jobs)
+        dedupe.print_duplicates(book_groups, file_groups)
+        duplicates = {h: books[0] for books in book_groups for h in books[1:]}
+        hoerbuecher = [h for h in hoerbuecher if h not in duplicates]
+
+    if not args.nocheck:
+        probe_cache = open_probe_cache(args)
+        results = []
+
+        # Dateien aller Hörbücher parallel prüfen
+        check_start = time.time()
+        probe_devices = device_limits("Prüfung", args.device_probe_jobs)
+        try:
+            for h, errors in check_hoerbuecher(hoerbuecher, probe_jobs, probe_cache, args.probe_backend, probe_devices):
+                if errors:
+                    results.append((h, errors))
+        finally:
+            # Auch bei Abbruch oder Fehler bleiben die bisherigen Probe-Ergebnisse erhalten
+            close_probe_cache(probe_cache)
+        check_elapsed = time.time() - check_start
+        num_files = sum(h.num_mp3_files() for h in hoerbuecher)
+        files_per_second = num_files / check_elapsed if check_elapsed > 0 else 0
+        print(f"Geprüfte Dateien: {num_files} in {check_elapsed:.1f} s ({files_per_second:.1f} Dateien/s, Backend: {args.probe_backend})")
+        print_device_summary(probe_devices)
+
+        if print_check_errors(results):
             sys.exit(1)
+        for h, original in duplicates.items():
+            h.take_properties_from(original)
 
-        def job_run(h):
-            start = time.time()
-            authorpath = os.path.join(args.convert_to, f"{h.normalized_author()}")
-            os.makedirs(authorpath, exist_ok=True)
-            filepath = os.path.join(authorpath, f"{h.normalized_title()}.mp3")
-            if os.path.exists(filepath):
-                print(f"Skipping conversion for {h.author} - {h.title} into {filepath}, file already exists.")
-                return (h, filepath, [f"Skipping conversion for {h.author} - {h.title} into {filepath}, file already exists."])
-            errors = h.convert(filepath)
-            end = time.time()
-            elapsed_ms = int((end - start) * 1000)
-            print(f"[Done] Converting Author: {h.author}, Titel: {h.title}, into {filepath}, Needed: {elapsed_ms} ms")
-            return (h, filepath, errors)
-        
-        with ThreadPoolExecutor(max_workers=num_jobs) as executor:
-            futures = {executor.submit(job_run, h): h for h in hoerbuecher}
-            for future in as_completed(futures):
-                h, filepath, errors = future.result()
-                results.append((h, filepath, errors))
+    if args.plan:
+        plans, calibration = plan_conversions(hoerbuecher, args.convert_to, args.segment_jobs, not args.nocheck)
+        refused = []
+        if args.convert_to:
+            _, refused = planner.fit_to_free_space(plans, args.convert_to)
+        planner.print_plan(plans, refused, calibration, num_jobs, args.copy_jobs, args.convert_to)
+        if duplicates:
+            print(f"{len(duplicates)} doppelte Hörbücher übernehmen die Ausgabe ihres Originals.")
+        if refused:
+            sys.exit(1)
+        return
+
+    if args.convert_to:
+        queue = work_queue.WorkQueue(args.queue) if args.queue else None
+        # Der Koordinator konvertiert nicht selbst, die Worker haben ihr eigenes Staging
+        stager = open_stager(args) if queue is None else None
+        run = ConvertRun(args.convert_to, args.segment_jobs, compare_settings=not args.nocheck, chapters=args.chapters,
+                         stager=stager)
+        if queue is not None:
+            recover_queue_results(queue, root, run)
 
+        # Hörbücher, deren Ausgabe nicht mehr auf das Ziellaufwerk passt, werden nicht gestartet
+        plans, _ = plan_conversions(hoerbuecher, args.convert_to, args.segment_jobs, not args.nocheck)
+        fitting, refused = planner.fit_to_free_space(plans, args.convert_to)
+        for plan in refused:
+            print(f"Nicht genug Speicherplatz für {plan.hoerbuch.author} - {plan.hoerbuch.title} (ca. {plan.output_bytes / 1024 / 1024:.1f} MB), wird nicht gestartet.")
 
-        for h, filepath, errors in results:
-            if errors:
-                print(f"Skipping conversion for {h.author} - {h.title} into {filepath} due to errors:")
-                for err in errors:
-                    print(f"     - {err}")
+        # Teuerste Hörbücher zuerst, reine Kopier-Jobs in einem eigenen Pool, höchstens
+        # --device-jobs gleichzeitig pro Gerät von Quelle und Ziel
+        convert_devices = device_limits("Konvertierung", args.device_jobs)
+        assign_devices(fitting, convert_devices)
+        jobs = [plan.job for plan in fitting]
+        predicted = scheduler.predict_total_makespan([plan.job for plan in fitting if plan.needs_conversion],
+                                                     num_jobs, args.copy_jobs)
+        print(f"Vorhergesagte Gesamtdauer der Konvertierung: {predicted:.0f} s")
+        convert_start = time.time()
+        results = []
+        try:
+            if queue is not None:
+                results = run_coordinator(fitting, root, run, queue)
+            else:
+                if stager is not None:
+                    # Vorauslesen in der Reihenfolge, in der der Enkodier-Pool die Jobs startet
+                    stager.schedule([job.hoerbuch for job in scheduler.lpt_order(
+                        [plan.job for plan in fitting if plan.needs_conversion and plan.job.kind == 'encode'])])
+                for result in scheduler.run_lpt(jobs, run.job_run, num_jobs, args.copy_jobs, cancel_conversions,
+                                                convert_devices):
+                    results.append(result)
+            for h, original in duplicates.items():
+                results.append(run.reuse_run(h, output_path_for(original, args.convert_to)))
+        except KeyboardInterrupt:
+            print("Abgebrochen: wartende Konvertierungen verworfen, laufende ffmpeg-Prozesse beendet.")
+            sys.exit(130)
+        finally:
+            run.manifest.save()
+            close_stager(stager)
+        print(f"Tatsächliche Gesamtdauer der Konvertierung: {time.time() - convert_start:.0f} s (vorhergesagt: {predicted:.0f} s)")
+        print_device_summary(convert_devices)
+        ConvertRun.print_errors(results)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
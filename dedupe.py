@@ -0,0 +1,135 @@
+import os
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import mp3_frames
+
+# Anzahl und Größe der Stichproben für den schnellen Fingerabdruck
+SAMPLES = 4
+SAMPLE_SIZE = 64 * 1024
+# Blockgröße beim vollständigen Hashen
+CHUNK_SIZE = 1024 * 1024
+
+
+def _audio_span(data):
+    """
+    Bereich (start, end) der MPEG-Audiodaten ohne ID3v2/ID3v1/APE-Tags und ohne Xing-Frame.
+    Wird kein MPEG-Stream erkannt, zählt alles zwischen den Tags.
+    """
+    try:
+        start, end, _, _ = mp3_frames.audio_range(data)
+    except ValueError:
+        start, end = mp3_frames.id3v2_size(data), mp3_frames.audio_end(data)
+    return start, max(start, end)
+
+
+def _with_audio(path, func):
+    """
+    Ruft func(data, start, end) mit der per mmap eingeblendeten Datei auf.
+    Leere Dateien werden als leerer Audiobereich behandelt.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return func(b"", 0, 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end = _audio_span(data)
+            return func(data, start, end)
+
+
+def audio_length(path):
+    return _with_audio(path, lambda data, start, end: end - start)
+
+
+def quick_fingerprint(path):
+    """
+    Länge der Audiodaten und BLAKE2b über SAMPLES gleichmäßig verteilte Stichproben.
+    """
+    def fingerprint(data, start, end):
+        length = end - start
+        digest = hashlib.blake2b(digest_size=16)
+        if length <= SAMPLES * SAMPLE_SIZE:
+            digest.update(data[start:end])
+        else:
+            step = (length - SAMPLE_SIZE) // (SAMPLES - 1)
+            for i in range(SAMPLES):
+                offset = start + i * step
+                digest.update(data[offset:offset + SAMPLE_SIZE])
+        return length, digest.hexdigest()
+    return _with_audio(path, fingerprint)
+
+
+def full_fingerprint(path):
+    """
+    BLAKE2b über die gesamten Audiodaten (ohne Tags).
+    """
+    def fingerprint(data, start, end):
+        if isinstance(data, mmap.mmap) and hasattr(mmap, "MADV_SEQUENTIAL"):
+            data.madvise(mmap.MADV_SEQUENTIAL)
+        digest = hashlib.blake2b()
+        view = memoryview(data)
+        try:
+            for offset in range(start, end, CHUNK_SIZE):
+                digest.update(view[offset:min(offset + CHUNK_SIZE, end)])
+        finally:
+            view.release()
+        return end - start, digest.hexdigest()
+    return _with_audio(path, fingerprint)
+
+
+def _collisions(paths, func, executor):
+    """
+    Berechnet func(path) parallel und gibt nur die Gruppen mit mehr als einer Datei zurück.
+    """
+    groups = {}
+    for path, key in zip(paths, executor.map(func, paths)):
+        groups.setdefault(key, []).append(path)
+    return {key: group for key, group in groups.items() if len(group) > 1}
+
+
+def find_duplicate_files(paths, jobs=None):
+    """
+    Findet Dateien mit identischen Audiodaten in drei Stufen: Länge der Audiodaten, dann
+    Stichproben-Hash nur bei gleicher Länge, dann vollständiger BLAKE2b-Hash nur bei gleichen
+    Stichproben. Gibt ein dict vollständiger Fingerabdruck -> Liste der Pfade (mindestens zwei) zurück.
+    """
+    paths = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) + 4)) as executor:
+        candidates = [path for group in _collisions(paths, audio_length, executor).values() for path in group]
+        candidates = [path for group in _collisions(candidates, quick_fingerprint, executor).values() for path in group]
+        return _collisions(candidates, full_fingerprint, executor)
+
+
+def find_duplicate_books(hoerbuecher, jobs=None):
+    """
+    Hörbücher, deren mp3-Dateien (in Reihenfolge) dieselben Audiodaten enthalten, unabhängig von Tags.
+    Gibt (Gruppen von Hörbüchern, Gruppen von Dateien) zurück; jede Hörbuch-Gruppe ist nach
+    Author und Titel sortiert.
+    """
+    hoerbuecher = list(hoerbuecher)
+    file_groups = find_duplicate_files((mp3 for h in hoerbuecher for mp3 in h.iter_mp3_files()), jobs)
+    keys = {path: key for key, group in file_groups.items() for path in group}
+    by_signature = {}
+    for h in hoerbuecher:
+        signature = tuple(keys.get(mp3) for mp3 in h.iter_mp3_files())
+        if signature and None not in signature:
+            by_signature.setdefault(signature, []).append(h)
+    book_groups = [sorted(books, key=lambda h: (h.author, h.title))
+                   for books in by_signature.values() if len(books) > 1]
+    book_groups.sort(key=lambda books: (books[0].author, books[0].title))
+    return book_groups, list(file_groups.values())
+
+
+def print_duplicates(book_groups, file_groups):
+    duplicate_book_files = {mp3 for books in book_groups for h in books for mp3 in h.iter_mp3_files()}
+    print(f"Doppelte Hörbücher: {len(book_groups)} Gruppen")
+    for books in book_groups:
+        print(f"- {books[0].author} - {books[0].title}:")
+        for h in books[1:]:
+            print(f"     = {h.author} - {h.title}")
+    other_groups = [group for group in file_groups if not set(group) <= duplicate_book_files]
+    print(f"Doppelte Dateien außerhalb doppelter Hörbücher: {len(other_groups)} Gruppen")
+    for group in other_groups:
+        print(f"- {group[0]}")
+        for path in group[1:]:
+            print(f"     = {path}")
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+
+
+def device_of(path):
+    """
+    st_dev des Dateisystems von path bzw. des nächsten existierenden übergeordneten Verzeichnisses
+    (Ausgabedateien und ihre Verzeichnisse gibt es vor der Konvertierung oft noch nicht).
+    """
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise
+            path = parent
+
+
+def mount_point(path):
+    """
+    Das oberste Verzeichnis über path, das noch auf demselben Gerät liegt.
+    """
+    path = os.path.abspath(path)
+    dev = device_of(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path or os.stat(parent).st_dev != dev:
+            return path
+        path = parent
+
+
+def parse_caps(specs):
+    """
+    Liest Angaben wie ['2', '/mnt/usb=1']: eine Zahl allein gilt für alle Geräte, PFAD=N für das
+    Gerät, auf dem PFAD liegt. Liefert (Standard oder None für unbegrenzt, {st_dev: N}).
+    Wirft ValueError bei ungültigen Angaben.
+    """
+    default = None
+    caps = {}
+    for spec in specs or []:
+        path, sep, value = spec.rpartition("=")
+        try:
+            cap = int(value)
+        except ValueError:
+            raise ValueError(f"Ungültige Angabe '{spec}', erwartet N oder PFAD=N")
+        if cap < 1:
+            raise ValueError(f"Ungültige Angabe '{spec}', N muss mindestens 1 sein")
+        if not sep:
+            default = cap
+            continue
+        if not os.path.exists(path):
+            raise ValueError(f"Ungültige Angabe '{spec}', {path} existiert nicht")
+        caps[device_of(path)] = cap
+    return default, caps
+
+
+class DeviceStats:
+    def __init__(self, name, cap):
+        self.name = name
+        self.cap = cap
+        self.running = 0
+        self.peak = 0
+        self.jobs = 0
+        self.bytes = 0
+        # Sekunden, in denen mindestens ein Job das Gerät verwendet hat
+        self.active_seconds = 0.0
+        self.active_since = None
+
+
+class DeviceLimits:
+    """
+    Begrenzt die Anzahl gleichzeitiger Jobs pro Gerät (st_dev). Ein Job belegt alle Geräte,
+    die er liest oder schreibt, und startet erst, wenn auf jedem davon ein Platz frei ist.
+    Zählt pro Gerät Jobs, übertragene Bytes und die Zeit, in der es belegt war, damit die
+    Grenzen anhand des gemessenen Durchsatzes eingestellt werden können.
+    """
+    def __init__(self, label, default_cap=None, caps=None, clock=time.perf_counter):
+        self.label = label
+        self.default_cap = default_cap
+        self.caps = dict(caps or {})
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._stats = {}
+
+    def devices(self, *paths):
+        """
+        Die (sortierten, verschiedenen) Geräte der Pfade. Beim ersten Auftreten eines Geräts
+        wird dessen Mount-Point als Name für die Auswertung ermittelt.
+        """
+        devices = set()
+        for path in paths:
+            dev = device_of(path)
+            with self._cond:
+                known = dev in self._stats
+            if not known:
+                name = mount_point(path)
+                with self._cond:
+                    self._stats.setdefault(dev, DeviceStats(name, self.caps.get(dev, self.default_cap)))
+            devices.add(dev)
+        return tuple(sorted(devices))
+
+    def _stat(self, dev):
+        if dev not in self._stats:
+            self._stats[dev] = DeviceStats(str(dev), self.caps.get(dev, self.default_cap))
+        return self._stats[dev]
+
+    def _free(self, devices):
+        for dev in devices:
+            stat = self._stat(dev)
+            if stat.cap is not None and stat.running >= stat.cap:
+                return False
+        return True
+
+    def _take(self, devices):
+        now = self.clock()
+        for dev in devices:
+            stat = self._stat(dev)
+            if stat.running == 0:
+                stat.active_since = now
+            stat.running += 1
+            stat.peak = max(stat.peak, stat.running)
+
+    def try_acquire(self, devices):
+        """
+        Belegt je einen Platz auf allen Geräten, falls überall einer frei ist. Gibt True bei Erfolg zurück.
+        """
+        with self._cond:
+            if not self._free(devices):
+                return False
+            self._take(devices)
+            return True
+
+    def acquire(self, devices):
+        """
+        Wartet, bis auf allen Geräten ein Platz frei ist, und belegt ihn.
+        """
+        with self._cond:
+            while not self._free(devices):
+                self._cond.wait()
+            self._take(devices)
+
+    def release(self, devices, transferred=None):
+        """
+        Gibt die Plätze eines fertigen Jobs frei. transferred: {st_dev: gelesene bzw. geschriebene Bytes}.
+        """
+        transferred = transferred or {}
+        now = self.clock()
+        with self._cond:
+            for dev in devices:
+                stat = self._stat(dev)
+                stat.running -= 1
+                stat.jobs += 1
+                stat.bytes += transferred.get(dev, 0)
+                if stat.running == 0:
+                    stat.active_seconds += now - stat.active_since
+                    stat.active_since = None
+            self._cond.notify_all()
+
+    def summary(self):
+        """
+        Eine Zeile pro verwendetem Gerät mit Jobs, Bytes, belegter Zeit und Durchsatz.
+        """
+        mb = 1024 * 1024
+        lines = []
+        with self._cond:
+            stats = sorted(self._stats.values(), key=lambda stat: stat.name)
+        for stat in stats:
+            if not stat.jobs:
+                continue
+            seconds = stat.active_seconds
+            rate = stat.bytes / seconds / mb if seconds > 0 else 0
+            jobs_per_second = stat.jobs / seconds if seconds > 0 else 0
+            cap = stat.cap if stat.cap is not None else "unbegrenzt"
+            lines.append(f"{self.label} {stat.name}: {stat.jobs} Jobs, {stat.bytes / mb:.1f} MB in {seconds:.1f} s "
+                         f"({rate:.1f} MB/s, {jobs_per_second:.1f} Jobs/s), höchstens {stat.peak} von {cap} gleichzeitig")
+        return lines
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+JOURNAL_NAME = ".convert_journal.jsonl"
+
+
+def partial_path(output_path, owner=None):
+    """
+    Temporärer Name im Zielverzeichnis, unter dem eine Ausgabedatei bis zum Abschluss geschrieben wird.
+    Mit owner (Worker-ID) erhält jeder Worker einen eigenen Namen.
+    """
+    directory, name = os.path.split(output_path)
+    base, ext = os.path.splitext(name)
+    if owner:
+        return os.path.join(directory, f".{base}.{owner}.part{ext}")
+    return os.path.join(directory, f".{base}.part{ext}")
+
+
+def segment_prefix(output_path):
+    """
+    Präfix der temporären Verzeichnisse, in denen die Segmente von output_path (der Datei, die
+    convert schreibt, meist die temporäre Ausgabedatei) parallel enkodiert werden.
+    """
+    base = os.path.splitext(os.path.basename(output_path))[0]
+    return f".segmente_{base}_"
+
+
+def remove_partial(partial):
+    """
+    Entfernt eine temporäre Ausgabedatei und die Verzeichnisse ihrer Segmente. Segmente anderer
+    Ausgaben im selben Verzeichnis bleiben unberührt.
+    """
+    if os.path.exists(partial):
+        os.remove(partial)
+    directory = os.path.dirname(partial)
+    prefix = segment_prefix(partial)
+    if os.path.isdir(directory):
+        for entry in os.listdir(directory):
+            if entry.startswith(prefix):
+                shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def commit_output(partial, output_path):
+    """
+    Schreibt die fertige temporäre Datei auf die Platte und benennt sie atomar in output_path um.
+    """
+    fsync_path(partial)
+    os.replace(partial, output_path)
+    fsync_path(os.path.dirname(os.path.abspath(output_path)))
+
+
+class RunJournal:
+    """
+    Journal der Konvertierungen im Zielverzeichnis (JSON Lines).
+    Pro Ausgabedatei werden die Ereignisse 'started', 'completed' und 'failed' angehängt;
+    eine Datei, deren letztes Ereignis 'started' ist, wurde unterbrochen.
+    """
+    def __init__(self, target_dir):
+        self.path = os.path.join(target_dir, JOURNAL_NAME)
+        self._lock = threading.Lock()
+
+    def last_events(self):
+        events = {}
+        if not os.path.exists(self.path):
+            return events
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Unvollständige letzte Zeile nach einem Absturz
+                    continue
+                events[entry["output"]] = entry
+        return events
+
+    def unfinished(self):
+        return [output for output, entry in self.last_events().items() if entry["event"] == "started"]
+
+    def record(self, event, output, **fields):
+        entry = {"event": event, "output": output, "time": time.time()}
+        entry.update(fields)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "a+b") as f:
+                # Eine nach einem Absturz unvollständige Zeile abschließen
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def recover(self):
+        """
+        Entfernt die Reste unterbrochener Konvertierungen (temporäre Ausgabedatei und deren Segmente),
+        damit diese Hörbücher im aktuellen Lauf neu konvertiert werden. Segmente anderer Ausgaben
+        im selben Verzeichnis bleiben unberührt, sie können zu einem noch laufenden Job gehören.
+        Gibt die Liste der betroffenen Ausgabedateien zurück.
+        """
+        recovered = []
+        for output in self.unfinished():
+            remove_partial(partial_path(output))
+            self.record("recovered", output)
+            recovered.append(output)
+        return recovered
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = ".convert_manifest.json"
+
+UP_TO_DATE = "aktuell"
+STALE = "veraltet"
+MISSING = "fehlt"
+UNKNOWN = "unbekannt"
+
+# Mindestabstand in Sekunden zwischen zwei Schreibvorgängen während eines Laufs
+SAVE_INTERVAL = 5.0
+
+
+def source_state(hoerbuch):
+    """
+    Quelldateien eines Hörbuchs als Liste [relativer Pfad, Größe, mtime_ns].
+    """
+    state = []
+    for rel in hoerbuch.relative_mp3_files:
+        st = os.stat(os.path.join(hoerbuch.path, rel))
+        state.append([rel, st.st_size, st.st_mtime_ns])
+    return state
+
+
+def output_state(output_path):
+    try:
+        st = os.stat(output_path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class Manifest:
+    """
+    Manifest der konvertierten Hörbücher im Zielverzeichnis (JSON).
+    Pro Ausgabedatei werden Quelldateien (Größe, mtime), die gewählten Konvertierungs-Einstellungen
+    und Größe/mtime der Ausgabe gespeichert, damit nur Hörbücher mit geänderten Quellen oder
+    Einstellungen neu konvertiert werden.
+    """
+    def __init__(self, target_dir):
+        self.target_dir = target_dir
+        self.path = os.path.join(target_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def _key(self, output_path):
+        return os.path.relpath(output_path, self.target_dir)
+
+    def status(self, hoerbuch, output_path, settings=None):
+        """
+        Zustand der Ausgabedatei ohne Probing: fehlt, unbekannt (nicht im Manifest),
+        veraltet (Quellen, Ausgabe oder - falls angegeben - Einstellungen geändert) oder aktuell.
+        """
+        current_output = output_state(output_path)
+        if current_output is None:
+            return MISSING
+        entry = self.entries.get(self._key(output_path))
+        if entry is None:
+            return UNKNOWN
+        if entry["output"] != current_output:
+            return STALE
+        if settings is not None and entry["settings"] != settings:
+            return STALE
+        try:
+            if entry["sources"] != source_state(hoerbuch):
+                return STALE
+        except FileNotFoundError:
+            return STALE
+        return UP_TO_DATE
+
+    def record(self, hoerbuch, output_path, settings, seconds=None):
+        """
+        Speichert den Eintrag einer fertigen Ausgabedatei. seconds (Dauer der Konvertierung) und
+        die Spieldauer werden für die Kalibrierung der Zeit- und Größenschätzung (planner) verwendet.
+        """
+        entry = {
+            "author": hoerbuch.author,
+            "title": hoerbuch.title,
+            "book_path": hoerbuch.path,
+            "sources": source_state(hoerbuch),
+            "settings": settings,
+            "output": output_state(output_path),
+        }
+        if seconds is not None:
+            entry["seconds"] = seconds
+            entry["duration"] = hoerbuch.duration
+            entry["source_bytes"] = sum(size for _, size, _ in entry["sources"])
+        with self._lock:
+            self.entries[self._key(output_path)] = entry
+            self._dirty = True
+            if time.time() - self._last_save >= SAVE_INTERVAL:
+                self._save_locked()
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    def _save_locked(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._last_save = time.time()
+        self._dirty = False
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class MetricsRecorder:
+    """
+    Sammelt Zeitspannen (Phase, Hörbuch, Thread, Zusatzfelder wie Bytes) eines Laufs und schreibt sie
+    als JSON Lines, als Chrome-Trace (chrome://tracing, Perfetto) und als Prometheus-Textfile.
+    Solange enable() nicht aufgerufen wurde, werden keine Daten gesammelt.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._wall0 = time.time()
+
+    def enable(self):
+        self.enabled = True
+
+    def record(self, stage, start, end, book=None, **fields):
+        """
+        Speichert eine Zeitspanne; start und end sind Werte von time.perf_counter().
+        """
+        if not self.enabled:
+            return
+        event = (stage, book, start - self._t0, end - start, threading.get_ident(), fields)
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, stage, book=None, **fields):
+        """
+        Misst den Block als Zeitspanne. Über das gelieferte dict können im Block weitere
+        Felder (z.B. bytes_read, bytes_written) ergänzt werden.
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(stage, start, time.perf_counter(), book, **fields)
+
+    def submit(self, executor, stage, func, *args, book=None):
+        """
+        Wie executor.submit(func, *args), zusätzlich wird die Wartezeit in der Warteschlange
+        als Phase '<stage>_wait' erfasst.
+        """
+        submitted = time.perf_counter()
+
+        def run():
+            self.record(f"{stage}_wait", submitted, time.perf_counter(), book)
+            return func(*args)
+        return executor.submit(run)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self.events)
+
+    def write_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stage, book, start, duration, thread, fields in self._snapshot():
+                entry = {
+                    "stage": stage,
+                    "book": book,
+                    "start": self._wall0 + start,
+                    "duration": duration,
+                    "thread": thread,
+                }
+                entry.update(fields)
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def write_chrome_trace(self, path):
+        pid = os.getpid()
+        trace_events = []
+        for stage, book, start, duration, thread, fields in self._snapshot():
+            args = dict(fields)
+            if book is not None:
+                args["book"] = book
+            trace_events.append({
+                "name": f"{stage}: {book}" if book else stage,
+                "cat": stage,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": pid,
+                "tid": thread,
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def totals(self):
+        """
+        Summen pro Phase: Anzahl, Sekunden, gelesene und geschriebene Bytes.
+        """
+        totals = {}
+        for stage, _, _, duration, _, fields in self._snapshot():
+            total = totals.setdefault(stage, {"count": 0, "seconds": 0.0, "bytes_read": 0, "bytes_written": 0})
+            total["count"] += 1
+            total["seconds"] += duration
+            total["bytes_read"] += fields.get("bytes_read", 0) or 0
+            total["bytes_written"] += fields.get("bytes_written", 0) or 0
+        return totals
+
+    def write_prometheus(self, path):
+        """
+        Schreibt die Summen pro Phase im Textformat für den textfile collector des node_exporter.
+        Die Datei wird atomar ersetzt.
+        """
+        metrics = (
+            ("hoerbuch_stage_events_total", "count", "Anzahl der erfassten Zeitspannen pro Phase"),
+            ("hoerbuch_stage_seconds_total", "seconds", "Summe der Dauer pro Phase in Sekunden"),
+            ("hoerbuch_stage_bytes_read_total", "bytes_read", "Gelesene Bytes pro Phase"),
+            ("hoerbuch_stage_bytes_written_total", "bytes_written", "Geschriebene Bytes pro Phase"),
+        )
+        totals = self.totals()
+        lines = []
+        for name, key, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for stage in sorted(totals):
+                lines.append(f'{name}{{stage="{stage}"}} {totals[stage][key]}')
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+
+recorder = MetricsRecorder()
@@ -0,0 +1,745 @@
+import errno
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from contextlib import ExitStack
+
+# Bitraten in kBit/s, Index 0 = "free", Index 15 = ungültig
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+
+VERSIONS = {0: 2.5, 2: 2, 3: 1}
+
+CHANNEL_MODES = ("stereo", "joint_stereo", "dual_channel", "mono")
+
+# Länge der LAME-Erweiterung hinter dem Xing-Header (inklusive CRC)
+LAME_TAG_LENGTH = 36
+
+# Größe von Xing-Header (Tag, Flags, Frames, Bytes, TOC, Qualität) ohne LAME-Erweiterung
+XING_LENGTH = 120
+
+# ioctl für Reflink-Kopien (Linux, z.B. btrfs und XFS)
+FICLONE = 0x40049409
+
+# Wie weit nach dem ersten Frame-Sync gesucht wird, bevor aufgegeben wird
+MAX_SYNC_SEARCH = 1 << 20
+
+# Überlappung beim parallelen Enkodieren (in Frames): Vorlauf eines Segments vor dem Schnittfenster,
+# Größe des Schnittfensters und Nachlauf des vorigen Segments hinter dem Fenster
+SEGMENT_PREROLL_FRAMES = 16
+SEGMENT_CUT_FRAMES = 32
+SEGMENT_TAIL_FRAMES = 4
+
+FrameHeader = namedtuple(
+    "FrameHeader",
+    "version layer protected bitrate sample_rate padding channel_mode frame_length samples_per_frame"
+)
+
+
+def parse_frame_header(data, offset=0):
+    """
+    Dekodiert den 4-Byte MPEG-Audio-Frame-Header an offset.
+    Gibt einen FrameHeader zurück oder None, wenn an dieser Stelle kein gültiger Header steht.
+    """
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = VERSIONS.get((b1 >> 3) & 3)
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = (b2 >> 4) & 0xF
+    sr_index = (b2 >> 2) & 3
+    if version is None or layer == 4 or bitrate_index in (0, 15) or sr_index == 3 or (b3 & 3) == 2:
+        return None
+    bitrate = BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sr_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if (layer == 2 or version == 1) else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return FrameHeader(
+        version=version,
+        layer=layer,
+        protected=not (b1 & 1),
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        padding=padding,
+        channel_mode=CHANNEL_MODES[(b3 >> 6) & 3],
+        frame_length=frame_length,
+        samples_per_frame=samples_per_frame,
+    )
+
+
+def _same_stream(a, b):
+    return (a.version, a.layer, a.sample_rate) == (b.version, b.layer, b.sample_rate)
+
+
+def id3v2_size(data):
+    """
+    Größe eines ID3v2-Tags am Dateianfang (inklusive Footer), 0 falls keiner vorhanden ist.
+    """
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for b in data[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def audio_end(data):
+    """
+    Ende der Audiodaten: Position vor ID3v1-, Lyrics3v2- und APEv2-Tags am Dateiende.
+    """
+    end = len(data)
+    changed = True
+    while changed:
+        changed = False
+        if end >= 128 and data[end - 128:end - 125] == b"TAG":
+            end -= 128
+            changed = True
+        if end >= 15 and data[end - 9:end] == b"LYRICS200":
+            size = int(bytes(data[end - 15:end - 9]))
+            end -= 15 + size
+            changed = True
+        if end >= 32 and data[end - 32:end - 24] == b"APETAGEX":
+            tag_size, flags = struct.unpack("<II", data[end - 20:end - 12])
+            end -= tag_size + (32 if flags & 0x80000000 else 0)
+            changed = True
+    return max(end, 0)
+
+
+def find_first_frame(data, start=0, end=None):
+    """
+    Sucht ab start den ersten Frame, dem ein zweiter passender Frame folgt.
+    Gibt (offset, FrameHeader) oder (None, None) zurück.
+    """
+    if end is None:
+        end = len(data)
+    limit = min(end, start + MAX_SYNC_SEARCH)
+    pos = start
+    while pos < limit:
+        pos = data.find(b"\xff", pos, limit)
+        if pos < 0:
+            break
+        header = parse_frame_header(data, pos)
+        if header is not None:
+            next_pos = pos + header.frame_length
+            if next_pos >= end:
+                return pos, header
+            following = parse_frame_header(data, next_pos)
+            if following is not None and _same_stream(header, following):
+                return pos, header
+        pos += 1
+    return None, None
+
+
+def _side_info_length(header):
+    if header.version == 1:
+        return 17 if header.channel_mode == "mono" else 32
+    return 9 if header.channel_mode == "mono" else 17
+
+
+def samples_per_frame(sample_rate):
+    """
+    Samples pro Layer-III-Frame bei dieser Samplerate (MPEG-1: 1152, MPEG-2 und 2.5: 576).
+    """
+    return 1152 if sample_rate >= 32000 else 576
+
+
+def _payload_start(offset, header):
+    return offset + 4 + (2 if header.protected else 0) + _side_info_length(header)
+
+
+def main_data_info(data, offset, header):
+    """
+    Liest aus der Side-Information des Layer-III-Frames an offset main_data_begin (so viele Bytes
+    vor dem Frame beginnen seine Hauptdaten im Bit-Reservoir) und die Länge der Hauptdaten in Bytes.
+    """
+    length = _side_info_length(header)
+    pos = offset + 4 + (2 if header.protected else 0)
+    side = int.from_bytes(data[pos:pos + length], "big")
+    channels = 1 if header.channel_mode == "mono" else 2
+    if header.version == 1:
+        begin_bits, prefix, granules, granule_bits = 9, 9 + (5 if channels == 1 else 3) + 4 * channels, 2, 59
+    else:
+        begin_bits, prefix, granules, granule_bits = 8, 8 + channels, 1, 63
+
+    def field(bit, count):
+        return (side >> (length * 8 - bit - count)) & ((1 << count) - 1)
+
+    # part2_3_length steht am Anfang jedes Blocks pro Granule und Kanal
+    bits = sum(field(prefix + i * granule_bits, 12) for i in range(granules * channels))
+    return field(0, begin_bits), (bits + 7) // 8
+
+
+def read_xing(data, offset, header):
+    """
+    Liest einen Xing/Info- oder VBRI-Header aus dem Frame an offset.
+    Gibt ein dict mit tag, frames, bytes, toc und ggf. LAME enc_delay/enc_padding zurück oder None.
+    """
+    xing_pos = offset + 4 + _side_info_length(header)
+    tag = bytes(data[xing_pos:xing_pos + 4])
+    if tag in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing_pos + 4:xing_pos + 8])[0]
+        pos = xing_pos + 8
+        result = {"tag": tag.decode("ascii"), "frames": None, "bytes": None, "toc": None}
+        if flags & 1:
+            result["frames"] = struct.unpack(">I", data[pos:pos + 4])[0]
+            pos += 4
+        if flags & 2:
+            result["bytes"] = struct.unpack(">I", data[pos:pos + 4])[0]
+            pos += 4
+        if flags & 4:
+            result["toc"] = bytes(data[pos:pos + 100])
+            pos += 100
+        if flags & 8:
+            pos += 4
+        if data[pos:pos + 4] == b"LAME":
+            result["lame"] = bytes(data[pos:pos + LAME_TAG_LENGTH])
+            delay_padding = data[pos + 21:pos + 24]
+            result["enc_delay"] = (delay_padding[0] << 4) | (delay_padding[1] >> 4)
+            result["enc_padding"] = ((delay_padding[1] & 0x0F) << 8) | delay_padding[2]
+        return result
+    vbri_pos = offset + 4 + 32
+    if data[vbri_pos:vbri_pos + 4] == b"VBRI":
+        num_bytes, frames = struct.unpack(">II", data[vbri_pos + 10:vbri_pos + 18])
+        return {"tag": "VBRI", "frames": frames, "bytes": num_bytes, "toc": None}
+    return None
+
+
+def read_mp3_info(path):
+    """
+    Ermittelt codec_name, bit_rate, channels, channel_layout und duration direkt aus den
+    MPEG-Frame-Headern (und ggf. Xing/Info/VBRI-Header), ohne einen Prozess zu starten.
+    Die Werte entsprechen denen von ffprobe. Gibt None zurück, wenn die Datei nicht als
+    MPEG-Audio erkannt werden kann.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = id3v2_size(data)
+            end = audio_end(data)
+            offset, header = find_first_frame(data, start, end)
+            if header is None or header.layer != 3:
+                return None
+            xing = read_xing(data, offset, header)
+            following = parse_frame_header(data, offset + header.frame_length)
+
+    channels = 1 if header.channel_mode == "mono" else 2
+    frame_duration = header.samples_per_frame / header.sample_rate
+    bit_rate = header.bitrate
+    if xing is not None and xing["frames"]:
+        duration = xing["frames"] * frame_duration
+        if xing["tag"] == "Info":
+            # CBR: Bitrate des ersten echten Frames nach dem Info-Frame
+            if following is not None:
+                bit_rate = following.bitrate
+        elif xing["bytes"] and duration > 0:
+            bit_rate = int(xing["bytes"] * 8 / duration)
+    else:
+        duration = (end - offset) * 8 / bit_rate
+    return {
+        "codec_name": "mp3",
+        "bit_rate": bit_rate,
+        "channels": channels,
+        "channel_layout": "mono" if channels == 1 else "stereo",
+        "duration": duration,
+    }
+
+
+
+def iter_frames(data, start, end):
+    """
+    Liefert (offset, FrameHeader) für alle Frames zwischen start und end.
+    Nach Störungen im Datenstrom wird neu synchronisiert.
+    """
+    headers = {}
+    pos = start
+    while pos + 4 <= end:
+        raw = bytes(data[pos:pos + 4])
+        header = headers.get(raw)
+        if header is None:
+            header = parse_frame_header(raw)
+            if header is None:
+                pos, header = find_first_frame(data, pos + 1, end)
+                if header is None:
+                    return
+                raw = bytes(data[pos:pos + 4])
+            headers[raw] = header
+        if pos + header.frame_length > end:
+            return
+        yield pos, header
+        pos += header.frame_length
+
+
+def audio_range(data):
+    """
+    Bereich (start, end) der reinen MPEG-Audioframes ohne Tags und ohne Xing/Info/VBRI-Frame,
+    dazu der erste Audio-Frame-Header und der gelesene Xing-Header (oder None).
+    Wirft ValueError, wenn keine MPEG-Frames gefunden werden.
+    """
+    start = id3v2_size(data)
+    end = audio_end(data)
+    offset, header = find_first_frame(data, start, end)
+    if header is None:
+        raise ValueError("keine MPEG-Audioframes gefunden")
+    xing = read_xing(data, offset, header)
+    if xing is not None:
+        offset += header.frame_length
+        header = parse_frame_header(data, offset)
+        if header is None:
+            offset, header = find_first_frame(data, offset, end)
+            if header is None:
+                raise ValueError("keine MPEG-Audioframes nach dem Xing-Header gefunden")
+    return offset, end, header, xing
+
+
+def decoded_samples(path):
+    """
+    Anzahl der Samples, die ein Decoder (wie ffmpeg) aus der Datei liefert: Audioframes mal Samples
+    pro Frame, abzüglich Encoder-Delay und -Padding laut LAME-Tag. Gibt (Samples, Samplerate) zurück.
+    Wirft ValueError, wenn keine MPEG-Frames gefunden werden.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path}: leere Datei")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end, header, xing = audio_range(data)
+            lame = xing is not None and "lame" in xing
+            if lame and xing["frames"]:
+                frames = xing["frames"]
+            else:
+                frames = sum(1 for _ in iter_frames(data, start, end))
+    samples = frames * header.samples_per_frame
+    if lame:
+        samples -= xing["enc_delay"] + xing["enc_padding"]
+    return max(samples, 0), header.sample_rate
+
+
+Segment = namedtuple("Segment", "first_file end_file start_sample end_sample first_frame cut_window")
+
+
+def plan_segments(file_samples, group_sizes, spf, preroll=SEGMENT_PREROLL_FRAMES, window=SEGMENT_CUT_FRAMES,
+                  tail=SEGMENT_TAIL_FRAMES):
+    """
+    Plant überlappende Segmente, damit aufeinanderfolgende Gruppen von Dateien (group_sizes Dateien je
+    Gruppe, file_samples dekodierte Samples je Datei) parallel enkodiert und mit join_segments lückenlos
+    zusammengefügt werden können. Jedes Segment beginnt auf einer Framegrenze (spf Samples pro Frame)
+    des Gesamtdatenstroms, damit seine Frames im selben Raster liegen wie bei einem einzigen Encoder:
+    preroll Frames vor dem Schnittfenster (window Frames ab der Gruppengrenze), das vorige Segment reicht
+    tail Frames über das Fenster hinaus.
+    Liefert pro Segment ein Segment-Tupel: Dateien first_file bis end_file (exklusiv), start_sample und
+    end_sample relativ zum Anfang von first_file (None: ab Anfang bzw. bis zum Ende), den globalen Index
+    des ersten Frames und das Schnittfenster (lo, hi) zum vorigen Segment (None beim ersten).
+    Wirft ValueError, wenn eine Gruppe für die Überlappung zu kurz ist.
+    """
+    offsets = [0]
+    for samples in file_samples:
+        offsets.append(offsets[-1] + samples)
+    total = offsets[-1]
+    starts = [0]
+    for size in group_sizes[:-1]:
+        starts.append(starts[-1] + size)
+    bounds = [offsets[start] // spf for start in starts] + [total // spf]
+    for i in range(len(group_sizes)):
+        needed = window + preroll + (tail if i == len(group_sizes) - 1 else 0)
+        if bounds[i + 1] - bounds[i] < needed:
+            raise ValueError(f"Gruppe {i + 1} ist zu kurz für das parallele Enkodieren")
+
+    segments = []
+    for i in range(len(group_sizes)):
+        last = i == len(group_sizes) - 1
+        start = 0 if i == 0 else (bounds[i] - preroll) * spf
+        end = total if last else min(total, (bounds[i + 1] + window + tail) * spf)
+        first_file = bisect_right(offsets, start) - 1
+        end_file = first_file
+        while end_file < len(file_samples) and offsets[end_file] < end:
+            end_file += 1
+        segments.append(Segment(
+            first_file=first_file,
+            end_file=end_file,
+            start_sample=start - offsets[first_file] if i > 0 else None,
+            end_sample=end - offsets[first_file] if not last else None,
+            first_frame=start // spf,
+            cut_window=None if i == 0 else (bounds[i], bounds[i] + window),
+        ))
+    return segments
+
+
+def crc16(data, crc=0):
+    """
+    CRC-16 (Polynom 0x8005, reflektiert), wie ihn LAME für die Prüfsummen im LAME-Tag verwendet.
+    """
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def _xing_frame_header(template):
+    """
+    Header für den Xing-Frame: gleiche Version, Samplerate und Kanalmodus wie template,
+    ohne CRC und Padding, mit der kleinsten Bitrate, deren Frame Xing- und LAME-Tag aufnimmt.
+    """
+    b1 = template[1] | 0x01
+    b2_base = template[2] & 0x0C
+    for bitrate_index in range(1, 15):
+        raw = bytes([0xFF, b1, b2_base | (bitrate_index << 4), template[3]])
+        header = parse_frame_header(raw)
+        if header.frame_length >= 4 + _side_info_length(header) + XING_LENGTH + LAME_TAG_LENGTH:
+            return raw, header
+    raise ValueError("kein Xing-Frame für dieses Format möglich")
+
+
+def build_xing_frame(template, frames, num_bytes, toc, vbr, lame=None):
+    """
+    Erzeugt einen Xing- (VBR) bzw. Info-Frame (CBR) mit Frameanzahl, Bytezahl und 100-Punkte-TOC.
+    template sind die 4 Header-Bytes eines Audioframes. Ist lame gesetzt (36 Bytes LAME-Erweiterung),
+    wird sie übernommen und ihre Tag-CRC neu berechnet.
+    """
+    raw, header = _xing_frame_header(template)
+    frame = bytearray(header.frame_length)
+    frame[0:4] = raw
+    pos = 4 + _side_info_length(header)
+    frame[pos:pos + 4] = b"Xing" if vbr else b"Info"
+    frame[pos + 4:pos + 16] = struct.pack(">III", 0xF, frames, num_bytes)
+    frame[pos + 16:pos + 116] = toc
+    frame[pos + 116:pos + 120] = struct.pack(">I", 0)
+    if lame is not None:
+        lame_pos = pos + XING_LENGTH
+        frame[lame_pos:lame_pos + LAME_TAG_LENGTH] = lame
+        frame[lame_pos + 28:lame_pos + 32] = struct.pack(">I", num_bytes)
+        # Die Prüfsumme über die Audiodaten wäre nach dem Zusammenfügen falsch, 0 = nicht gesetzt
+        frame[lame_pos + 32:lame_pos + 34] = b"\x00\x00"
+        frame[lame_pos + 34:lame_pos + 36] = struct.pack(">H", crc16(frame[:lame_pos + 34]))
+    return bytes(frame)
+
+
+def build_toc(frame_lengths, first_offset, num_bytes):
+    """
+    100-Punkte-TOC: für jedes Prozent der Spieldauer die relative Byteposition (0-255) des Frames.
+    frame_lengths sind die Längen aller Audioframes, first_offset die Position des ersten Audioframes.
+    """
+    toc = bytearray(100)
+    count = len(frame_lengths)
+    if count == 0:
+        return bytes(toc)
+    offset = first_offset
+    frame_index = 0
+    for i in range(100):
+        target = i * count // 100
+        while frame_index < target:
+            offset += frame_lengths[frame_index]
+            frame_index += 1
+        toc[i] = min(255, offset * 256 // num_bytes)
+    return bytes(toc)
+
+
+def copy_range(src_fd, dst_fd, offset, length):
+    """
+    Kopiert length Bytes ab offset aus src_fd an die aktuelle Position von dst_fd.
+    Nutzt copy_file_range bzw. sendfile, damit die Daten nicht durch den Userspace laufen,
+    und fällt auf read/write zurück, wenn das Dateisystem beides nicht unterstützt.
+    """
+    remaining = length
+    if hasattr(os, "copy_file_range"):
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src_fd, dst_fd, remaining, offset)
+                if copied == 0:
+                    raise IOError("unerwartetes Dateiende")
+                offset += copied
+                remaining -= copied
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            while remaining > 0:
+                copied = os.sendfile(dst_fd, src_fd, offset, remaining)
+                if copied == 0:
+                    raise IOError("unerwartetes Dateiende")
+                offset += copied
+                remaining -= copied
+            return
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    while remaining > 0:
+        chunk = os.pread(src_fd, min(remaining, 1 << 20), offset)
+        if not chunk:
+            raise IOError("unerwartetes Dateiende")
+        os.write(dst_fd, chunk)
+        offset += len(chunk)
+        remaining -= len(chunk)
+
+
+def clone_file(src_path, dst_path):
+    """
+    Kopiert eine ganze Datei, per Reflink (FICLONE) wenn das Dateisystem es unterstützt,
+    sonst mit copy_file_range/sendfile.
+    """
+    with open(src_path, "rb") as src, open(dst_path, "wb", buffering=0) as dst:
+        try:
+            import fcntl
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except (ImportError, OSError):
+            pass
+        copy_range(src.fileno(), dst.fileno(), 0, os.fstat(src.fileno()).st_size)
+
+
+def has_seek_table(path):
+    """
+    True, wenn die Datei einen Xing-Header mit TOC oder einen Info-Header (CBR) hat, sodass
+    Player in konstanter Zeit springen können.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                _, _, _, xing = audio_range(data)
+            except ValueError:
+                return False
+    return xing is not None and (xing["tag"] == "Info" or (xing["tag"] == "Xing" and xing["toc"] is not None))
+
+
+def join_mp3_files(inputs, output_path, durations=None):
+    """
+    Fügt MP3-Dateien auf Frame-Ebene zu output_path zusammen: Tags und Xing/Info-Frames der
+    Eingaben werden entfernt, die Audioframes unverändert übernommen und ein neuer Xing/Info-Frame
+    mit korrekter Frameanzahl, Bytezahl und TOC vorangestellt. Encoder-Delay und -Padding im
+    LAME-Tag stammen von der ersten bzw. letzten Eingabe.
+    Alle Eingaben müssen dieselbe MPEG-Version, Layer, Samplerate und Kanalzahl haben, sonst ValueError.
+    Ist durations eine Liste, wird die exakte Dauer jeder Eingabe in Sekunden (aus der Frameanzahl) angehängt.
+    Gibt die Anzahl der Audioframes zurück.
+    """
+    ranges = []
+    input_frames = []
+    frame_lengths = array("H")
+    bitrates = set()
+    template = None
+    first_header = None
+    lame = None
+    enc_padding = None
+    for path in inputs:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start, end, header, xing = audio_range(data)
+                if first_header is None:
+                    first_header = header
+                    template = bytes(data[start:start + 4])
+                    if xing is not None:
+                        lame = xing.get("lame")
+                elif not _same_stream(first_header, header) or \
+                        (first_header.channel_mode == "mono") != (header.channel_mode == "mono"):
+                    raise ValueError(f"{path}: anderes MPEG-Format als {inputs[0]}")
+                enc_padding = xing.get("enc_padding") if xing is not None else None
+                segments = []
+                segment_start = None
+                segment_end = None
+                for offset, frame in iter_frames(data, start, end):
+                    if offset != segment_end:
+                        if segment_start is not None:
+                            segments.append((segment_start, segment_end - segment_start))
+                        segment_start = offset
+                    segment_end = offset + frame.frame_length
+                    frame_lengths.append(frame.frame_length)
+                    bitrates.add(frame.bitrate)
+                if segment_start is not None:
+                    segments.append((segment_start, segment_end - segment_start))
+                ranges.append((path, segments))
+                input_frames.append(len(frame_lengths) - sum(input_frames))
+
+    if template is None:
+        raise ValueError("keine Eingabedateien")
+    if lame is not None and enc_padding is not None:
+        lame = _with_padding(lame, enc_padding)
+
+    if durations is not None:
+        frame_duration = first_header.samples_per_frame / first_header.sample_rate
+        durations.extend(count * frame_duration for count in input_frames)
+
+    vbr = len(bitrates) > 1
+    xing_length = len(build_xing_frame(template, 0, 0, bytes(100), vbr, lame))
+    num_bytes = xing_length + sum(frame_lengths)
+    toc = build_toc(frame_lengths, xing_length, num_bytes)
+    with open(output_path, "wb", buffering=0) as out:
+        out.write(build_xing_frame(template, len(frame_lengths), num_bytes, toc, vbr, lame))
+        for path, segments in ranges:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                for offset, length in segments:
+                    copy_range(fd, out.fileno(), offset, length)
+            finally:
+                os.close(fd)
+    return len(frame_lengths)
+
+
+def _with_padding(lame, enc_padding):
+    lame = bytearray(lame)
+    lame[22] = (lame[22] & 0xF0) | ((enc_padding >> 8) & 0x0F)
+    lame[23] = enc_padding & 0xFF
+    return bytes(lame)
+
+
+def _payload_tail(data, frames, last, count):
+    """
+    Dateibereiche (offset, Länge) der letzten count Bytes der Hauptdatenbereiche der Frames bis
+    einschließlich Frame last, in Dateireihenfolge. frames ist eine Liste von (offset, FrameHeader).
+    """
+    ranges = []
+    index = last
+    while count > 0:
+        if index < 0:
+            raise ValueError("Bit-Reservoir reicht vor den Anfang des Segments")
+        offset, header = frames[index]
+        payload = _payload_start(offset, header)
+        length = min(count, offset + header.frame_length - payload)
+        ranges.append((offset + header.frame_length - length, length))
+        count -= length
+        index -= 1
+    return ranges[::-1]
+
+
+def _find_cut(prev_data, prev_frames, prev_first, data, frames, first, lo, hi):
+    """
+    Erster globaler Frame g in [lo, hi), ab dem das Segment (data, frames, erster Frame first) an das
+    vorige anschließen kann: die Bytes, die Frame g aus dem Bit-Reservoir liest, müssen hinter den
+    Hauptdaten des letzten übernommenen Frames g-1 des vorigen Segments Platz haben.
+    Gibt (g, Quellbereiche im Segment, Zielbereiche im vorigen Segment) zurück; ValueError, wenn es keinen gibt.
+    """
+    for g in range(lo, hi):
+        k, prev_k = g - first, g - 1 - prev_first
+        if k < 1 or prev_k < 0 or k >= len(frames) or prev_k >= len(prev_frames):
+            continue
+        offset, header = frames[k]
+        need, _ = main_data_info(data, offset, header)
+        if need == 0:
+            return g, [], []
+        prev_offset, prev_header = prev_frames[prev_k]
+        prev_begin, prev_length = main_data_info(prev_data, prev_offset, prev_header)
+        free = prev_offset + prev_header.frame_length - _payload_start(prev_offset, prev_header) - prev_length + prev_begin
+        if free >= need:
+            return g, _payload_tail(data, frames, k - 1, need), _payload_tail(prev_data, prev_frames, prev_k, need)
+    raise ValueError(f"kein Schnittpunkt zwischen den Frames {lo} und {hi}")
+
+
+def join_segments(segments, output_path, first_frames, cut_windows):
+    """
+    Fügt überlappend enkodierte Segmente eines Datenstroms (siehe plan_segments) lückenlos zu
+    output_path zusammen. Segment i beginnt mit dem globalen Frame first_frames[i]; zwischen Segment
+    i-1 und i wird an einem Frame aus cut_windows[i] = (lo, hi) geschnitten, sodass jeder Frame genau
+    einmal und aus einem Segment mit genügend Vorlauf übernommen wird. Die Bytes, die der erste
+    übernommene Frame eines Segments aus dem Bit-Reservoir liest, werden in den freien Platz am Ende
+    der Hauptdaten davor übertragen. Encoder-Delay stammt aus dem ersten, Padding aus dem letzten Segment,
+    sodass die Ausgabe genau so viele Samples hat wie die Eingabe aller Segmente ohne Überlappung.
+    Wirft ValueError bei unterschiedlichem Format oder Encoder-Delay oder wenn kein Schnittpunkt passt.
+    Gibt die Anzahl der Audioframes zurück.
+    """
+    with ExitStack() as stack:
+        parsed = []
+        for path in segments:
+            f = stack.enter_context(open(path, "rb"))
+            data = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            start, end, header, xing = audio_range(data)
+            if parsed and not _same_stream(parsed[0][3], header):
+                raise ValueError(f"{path}: anderes MPEG-Format als {segments[0]}")
+            delay = xing.get("enc_delay") if xing is not None else None
+            if parsed and delay != parsed[0][5]:
+                raise ValueError(f"{path}: anderer Encoder-Delay als {segments[0]}")
+            parsed.append((f, data, list(iter_frames(data, start, end)), header, xing, delay))
+
+        # Übernommene Frames [begin, stop) je Segment (lokale Indizes) und Übertragungen ins vorige Segment
+        keep = [[0, len(parsed[0][2])]]
+        patches = []
+        for i in range(1, len(parsed)):
+            prev_data, prev_frames = parsed[i - 1][1:3]
+            data, frames = parsed[i][1:3]
+            g, sources, targets = _find_cut(prev_data, prev_frames, first_frames[i - 1], data, frames,
+                                            first_frames[i], *cut_windows[i])
+            keep[i - 1][1] = g - first_frames[i - 1]
+            keep.append([g - first_frames[i], len(frames)])
+            payload = b"".join(bytes(data[offset:offset + length]) for offset, length in sources)
+            patches.append((i - 1, targets, payload))
+
+        frame_lengths = array("H")
+        bitrates = set()
+        for (_, _, frames, _, _, _), (begin, stop) in zip(parsed, keep):
+            if begin >= stop:
+                raise ValueError("Segment ohne übernommene Frames")
+            for _, header in frames[begin:stop]:
+                frame_lengths.append(header.frame_length)
+                bitrates.add(header.bitrate)
+
+        _, first_data, frames, _, first_xing, _ = parsed[0]
+        template = bytes(first_data[frames[0][0]:frames[0][0] + 4])
+        lame = first_xing.get("lame") if first_xing is not None else None
+        last_xing = parsed[-1][4]
+        if lame is not None and last_xing is not None and last_xing.get("enc_padding") is not None:
+            lame = _with_padding(lame, last_xing["enc_padding"])
+        vbr = len(bitrates) > 1
+        xing_length = len(build_xing_frame(template, 0, 0, bytes(100), vbr, lame))
+        num_bytes = xing_length + sum(frame_lengths)
+        toc = build_toc(frame_lengths, xing_length, num_bytes)
+
+        with open(output_path, "wb", buffering=0) as out:
+            out.write(build_xing_frame(template, len(frame_lengths), num_bytes, toc, vbr, lame))
+            ends = []
+            for (f, data, frames, _, _, _), (begin, stop) in zip(parsed, keep):
+                run_start = run_end = None
+                for offset, header in frames[begin:stop]:
+                    if offset != run_end:
+                        if run_start is not None:
+                            copy_range(f.fileno(), out.fileno(), run_start, run_end - run_start)
+                        run_start = offset
+                    run_end = offset + header.frame_length
+                copy_range(f.fileno(), out.fileno(), run_start, run_end - run_start)
+                ends.append(out.tell())
+            for index, targets, payload in patches:
+                frames, stop = parsed[index][2], keep[index][1]
+                pos = 0
+                for offset, length in targets:
+                    target = _output_offset(frames, stop, ends[index], offset)
+                    os.pwrite(out.fileno(), payload[pos:pos + length], target)
+                    pos += length
+    return len(frame_lengths)
+
+
+def _output_offset(frames, stop, end, file_offset):
+    """
+    Position von file_offset in der Ausgabe, wenn die Frames bis stop (exklusiv) eines Segments
+    vor der Ausgabeposition end enden. Gesucht wird rückwärts ab dem letzten übernommenen Frame.
+    """
+    index = stop - 1
+    while index >= 0:
+        offset, header = frames[index]
+        end -= header.frame_length
+        if offset <= file_offset < offset + header.frame_length:
+            return end + file_offset - offset
+        index -= 1
+    raise ValueError("Zielbereich liegt nicht in den übernommenen Frames")
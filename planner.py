@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+
+import manifest as manifest_mod
+import scheduler
+
+# Bytes pro Sekunde Audio in der Ausgabe bei ca. 64 kBit/s, falls keine Messwerte vorliegen
+ENCODE_OUTPUT_BYTES_PER_SECOND = 64000 / 8
+# Freier Platz, der auf jedem Laufwerk mindestens übrig bleiben soll
+DISK_RESERVE_BYTES = 64 * 1024 * 1024
+# Mindestanzahl gemessener Konvertierungen, bevor sie die Standardwerte ersetzen
+MIN_SAMPLES = 3
+
+
+class Calibration:
+    """
+    Durchsätze für die Schätzung: Echtzeitfaktor beim Enkodieren (pro Job), Bytes pro Sekunde
+    beim Zusammenfügen und Ausgabe-Bytes pro Sekunde Audio beim Enkodieren.
+    """
+    def __init__(self, encode_realtime_factor=scheduler.ENCODE_REALTIME_FACTOR,
+                 copy_bytes_per_second=scheduler.COPY_BYTES_PER_SECOND,
+                 encode_output_bytes_per_second=ENCODE_OUTPUT_BYTES_PER_SECOND,
+                 encode_samples=0, copy_samples=0):
+        self.encode_realtime_factor = encode_realtime_factor
+        self.copy_bytes_per_second = copy_bytes_per_second
+        self.encode_output_bytes_per_second = encode_output_bytes_per_second
+        self.encode_samples = encode_samples
+        self.copy_samples = copy_samples
+
+    def describe(self):
+        encode = f"{self.encode_realtime_factor:.1f}x Echtzeit ({self.encode_samples} Messungen)" if self.encode_samples \
+            else f"{self.encode_realtime_factor:.1f}x Echtzeit (Standardwert)"
+        copy = f"{self.copy_bytes_per_second / 1e6:.1f} MB/s ({self.copy_samples} Messungen)" if self.copy_samples \
+            else f"{self.copy_bytes_per_second / 1e6:.1f} MB/s (Standardwert)"
+        return f"Enkodieren: {encode}, Zusammenfügen: {copy}"
+
+
+# Einstellungen, die Enkodier-Geschwindigkeit und Ausgabegröße bestimmen
+PROFILE_KEYS = ("acodec", "audio_bitrate", "quality", "container")
+
+
+def calibrate(manifest, profile=None):
+    """
+    Bestimmt die Durchsätze aus den im Manifest gespeicherten früheren Konvertierungen
+    (Dauer, Spieldauer, Größe von Quellen und Ausgabe). Ohne genügend Messungen bleiben die Standardwerte.
+    Mit profile (profiles.Profile) zählen beim Enkodieren nur Konvertierungen mit demselben Codec,
+    Container und derselben Bitrate bzw. Qualität; ohne Messungen gilt die Bitrate des Profils.
+    """
+    calibration = Calibration()
+    wanted = None
+    if profile is not None:
+        wanted = {key: profile.settings(1).get(key) for key in PROFILE_KEYS}
+        calibration.encode_output_bytes_per_second = profile.output_bytes_per_second() or ENCODE_OUTPUT_BYTES_PER_SECOND
+    encode_seconds = encode_duration = encode_output = 0.0
+    copy_seconds = copy_bytes = 0.0
+    for entry in manifest.entries.values():
+        seconds = entry.get("seconds")
+        if not seconds or not entry.get("output"):
+            continue
+        settings = entry["settings"]
+        same_profile = wanted is None or {key: settings.get(key) for key in PROFILE_KEYS} == wanted
+        if settings.get("mode") == "encode" and entry.get("duration") and same_profile:
+            calibration.encode_samples += 1
+            encode_seconds += seconds
+            encode_duration += entry["duration"]
+            encode_output += entry["output"][0]
+        elif settings.get("mode") == "copy" and entry.get("source_bytes"):
+            calibration.copy_samples += 1
+            copy_seconds += seconds
+            copy_bytes += entry["source_bytes"]
+    if calibration.encode_samples >= MIN_SAMPLES:
+        calibration.encode_realtime_factor = encode_duration / encode_seconds
+        calibration.encode_output_bytes_per_second = encode_output / encode_duration
+    else:
+        calibration.encode_samples = 0
+    if calibration.copy_samples >= MIN_SAMPLES:
+        calibration.copy_bytes_per_second = copy_bytes / copy_seconds
+    else:
+        calibration.copy_samples = 0
+    return calibration
+
+
+class BookPlan:
+    """
+    Geplante Konvertierung eines Hörbuchs: Zustand laut Manifest, Job (Art und geschätzte Dauer),
+    geschätzte Größe der Ausgabe und zusätzlicher Platzbedarf während der Konvertierung
+    im Zielverzeichnis (Segmente) und im temporären Verzeichnis (concat-Listen).
+    """
+    def __init__(self, hoerbuch, output_path, state, job, output_bytes, target_temp_bytes, temp_bytes):
+        self.hoerbuch = hoerbuch
+        self.output_path = output_path
+        self.state = state
+        self.job = job
+        self.output_bytes = output_bytes
+        self.target_temp_bytes = target_temp_bytes
+        self.temp_bytes = temp_bytes
+
+    @property
+    def needs_conversion(self):
+        return self.state in (manifest_mod.MISSING, manifest_mod.STALE)
+
+
+def estimate_output_bytes(hoerbuch, source_bytes, calibration):
+    """
+    Geschätzte Größe der Ausgabe: beim Zusammenfügen etwa die Größe der Quellen, beim Enkodieren
+    Spieldauer mal Ausgabe-Bytes pro Sekunde.
+    """
+    if not hoerbuch.needs_reencoding():
+        return source_bytes
+    duration = hoerbuch.duration
+    if not duration:
+        bytes_per_second = hoerbuch.avg_bitrate * 1000 / 8 or scheduler.FALLBACK_SOURCE_BYTES_PER_SECOND
+        duration = source_bytes / bytes_per_second
+    return int(duration * calibration.encode_output_bytes_per_second)
+
+
+def plan_book(hoerbuch, output_path, state, segment_jobs, calibration):
+    job = scheduler.estimate_job(hoerbuch, segment_jobs, calibration.encode_realtime_factor,
+                                 calibration.copy_bytes_per_second)
+    output_bytes = estimate_output_bytes(hoerbuch, job.source_bytes, calibration)
+    target_temp_bytes = 0
+    temp_bytes = 0
+    if job.kind == 'encode':
+        # concat-Liste für ffmpeg: eine Zeile "file '<pfad>'" pro Quelldatei
+        temp_bytes = sum(len(os.path.abspath(mp3).encode("utf-8")) + 8 for mp3 in hoerbuch.iter_mp3_files())
+        if segment_jobs > 1 and hoerbuch.num_mp3_files() > 1:
+            # Die Segmente liegen bis zum Zusammenfügen neben der Ausgabe
+            target_temp_bytes = output_bytes
+    return BookPlan(hoerbuch, output_path, state, job, output_bytes, target_temp_bytes, temp_bytes)
+
+
+def free_bytes(path):
+    return shutil.disk_usage(path).free
+
+
+def fit_to_free_space(plans, target_dir, temp_dir=None, reserve=DISK_RESERVE_BYTES):
+    """
+    Teilt die Pläne in (passend, abgelehnt): Pläne werden in LPT-Reihenfolge angenommen, solange die
+    Summe der Ausgaben plus der größte zusätzliche Platzbedarf auf dem Ziellaufwerk und im
+    temporären Verzeichnis (bei gleichem Laufwerk zusammen) frei ist.
+    Pläne für aktuelle Ausgaben (keine Konvertierung nötig) gelten immer als passend.
+    """
+    temp_dir = temp_dir or tempfile.gettempdir()
+    same_device = os.stat(target_dir).st_dev == os.stat(temp_dir).st_dev
+    target_free = free_bytes(target_dir) - reserve
+    temp_free = free_bytes(temp_dir) - reserve
+
+    fitting = []
+    refused = []
+    outputs = 0
+    max_target_temp = 0
+    temp_total = 0
+    by_job = {id(plan.job): plan for plan in plans}
+    for job in scheduler.lpt_order([plan.job for plan in plans]):
+        plan = by_job[id(job)]
+        if not plan.needs_conversion:
+            fitting.append(plan)
+            continue
+        new_outputs = outputs + plan.output_bytes
+        new_max_target_temp = max(max_target_temp, plan.target_temp_bytes)
+        new_temp_total = temp_total + plan.temp_bytes
+        target_need = new_outputs + new_max_target_temp + (new_temp_total if same_device else 0)
+        if target_need > target_free or (not same_device and new_temp_total > temp_free):
+            refused.append(plan)
+            continue
+        fitting.append(plan)
+        outputs, max_target_temp, temp_total = new_outputs, new_max_target_temp, new_temp_total
+    return fitting, refused
+
+
+def print_plan(plans, refused, calibration, encode_workers, copy_workers, target_dir=None):
+    """
+    Gibt den Plan pro Hörbuch und die Summen (Größe, Rechenzeit, vorhergesagte Gesamtdauer) aus.
+    """
+    mb = 1024 * 1024
+    refused_ids = {id(plan) for plan in refused}
+    print(f"Kalibrierung: {calibration.describe()}")
+    for plan in plans:
+        if not plan.needs_conversion:
+            continue
+        h = plan.hoerbuch
+        marker = " [kein Platz]" if id(plan) in refused_ids else ""
+        print(f"[{plan.state}] {h.author} - {h.title}: {plan.job.kind}, "
+              f"{plan.job.source_bytes / mb:.1f} MB -> ca. {plan.output_bytes / mb:.1f} MB, "
+              f"ca. {plan.job.cost:.0f} s{marker}")
+    fitting = [plan for plan in plans if id(plan) not in refused_ids and plan.needs_conversion]
+    total_output = sum(plan.output_bytes for plan in fitting)
+    total_cost = sum(plan.job.cost for plan in fitting)
+    makespan = scheduler.predict_total_makespan([plan.job for plan in fitting], encode_workers, copy_workers)
+    print(f"Geplant: {len(fitting)} von {len(plans)} Hörbüchern, Ausgabe ca. {total_output / mb:.1f} MB, "
+          f"Rechenzeit ca. {total_cost:.0f} s, vorhergesagte Gesamtdauer ca. {makespan:.0f} s "
+          f"({encode_workers} Enkodier-Jobs, {copy_workers} Kopier-Jobs)")
+    if target_dir is not None:
+        print(f"Frei in {target_dir}: {free_bytes(target_dir) / mb:.1f} MB, "
+              f"im temporären Verzeichnis {tempfile.gettempdir()}: {free_bytes(tempfile.gettempdir()) / mb:.1f} MB")
+    if refused:
+        print(f"Nicht genug Speicherplatz für {len(refused)} Hörbücher, diese werden nicht gestartet.")
+    return makespan
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+def default_cache_path():
+    """
+    Liefert den Standardpfad des Probe-Caches unter $XDG_CACHE_HOME (bzw. ~/.cache).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "convert_cd_audiobooks", "probe_cache.sqlite3")
+
+
+class ProbeCache:
+    """
+    Persistenter Cache für Probe-Ergebnisse von MP3-Dateien (SQLite).
+    Ein Eintrag gilt nur, solange Pfad, Größe, mtime und Inode der Datei unverändert sind.
+    Gespeichert werden codec_name, bit_rate, channels, channel_layout und duration.
+    Neue Einträge werden alle commit_every Einträge bzw. spätestens nach commit_interval Sekunden
+    festgeschrieben, damit ein Abbruch langer Läufe nicht alle Ergebnisse verwirft.
+    """
+
+    FIELDS = ("codec_name", "bit_rate", "channels", "channel_layout", "duration")
+
+    def __init__(self, path, rebuild=False, commit_every=500, commit_interval=5.0, clock=time.monotonic):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.clock = clock
+        self._pending = 0
+        self._last_commit = clock()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if rebuild:
+            self._conn.execute("DROP TABLE IF EXISTS probe")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probe ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " codec_name TEXT,"
+            " bit_rate INTEGER,"
+            " channels INTEGER,"
+            " channel_layout TEXT,"
+            " duration REAL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns, st.st_ino
+
+    def get(self, path):
+        """
+        Gibt die gespeicherten Eigenschaften als dict zurück oder None, wenn die Datei neu oder verändert ist.
+        """
+        abspath, size, mtime_ns, inode = self._key(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, codec_name, bit_rate, channels, channel_layout, duration"
+                " FROM probe WHERE path = ?",
+                (abspath,)
+            ).fetchone()
+            if row is None or tuple(row[:3]) != (size, mtime_ns, inode):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(zip(self.FIELDS, row[3:]))
+
+    def put(self, path, info):
+        abspath, size, mtime_ns, inode = self._key(path)
+        values = [info.get(field) for field in self.FIELDS]
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probe"
+                " (path, size, mtime_ns, inode, codec_name, bit_rate, channels, channel_layout, duration)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [abspath, size, mtime_ns, inode] + values
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every or self.clock() - self._last_commit >= self.commit_interval:
+                self._commit()
+
+    def _commit(self):
+        self._conn.commit()
+        self._pending = 0
+        self._last_commit = self.clock()
+
+    def commit(self):
+        """
+        Schreibt alle noch offenen Einträge fest.
+        """
+        with self._lock:
+            self._commit()
+
+    def probe(self, path, probe_func):
+        """
+        Liefert die Eigenschaften aus dem Cache oder ermittelt sie mit probe_func und speichert sie.
+        """
+        info = self.get(path)
+        if info is None:
+            info = probe_func(path)
+            self.put(path, info)
+        return info
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    def summary(self):
+        return f"Probe-Cache {self.path}: {self.hits} Treffer, {self.misses} Fehlschläge"
@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
+
+# Anzahl der letzten stderr-Zeilen, die für Fehlermeldungen aufbewahrt werden
+STDERR_TAIL_LINES = 40
+# Blockgröße beim Lesen von stdout und stderr
+READ_SIZE = 64 * 1024
+# Sekunden zwischen terminate() und kill()
+KILL_GRACE_SECONDS = 5.0
+
+
+class ProcessTimeout(Exception):
+    pass
+
+
+class ProcessCancelled(Exception):
+    pass
+
+
+class ProcessResult:
+    def __init__(self, returncode, stdout, stderr_tail):
+        self.returncode = returncode
+        # Nur mit capture_stdout, sonst b""
+        self.stdout = stdout
+        # Die letzten STDERR_TAIL_LINES Zeilen von stderr
+        self.stderr_tail = stderr_tail
+
+
+class ResourceClass:
+    """
+    Grenzen einer Klasse von Prozessen (z. B. 'probe', 'encode', 'copy'): höchstens limit
+    gleichzeitig, Abbruch nach timeout Sekunden insgesamt bzw. nach stall_timeout Sekunden ohne Ausgabe.
+    """
+    def __init__(self, limit, timeout=None, stall_timeout=None):
+        self.limit = limit
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.semaphore = asyncio.Semaphore(limit)
+        self.running = 0
+        self.peak = 0
+        self.started = 0
+        self.timeouts = 0
+        self.seconds = 0.0
+
+
+def parse_progress(line, progress):
+    """
+    Übernimmt eine Zeile 'key=value' der Ausgabe von ffmpeg -progress in progress (dict).
+    Gibt True zurück, wenn ein Block abgeschlossen ist (Zeile 'progress=...').
+    """
+    key, sep, value = line.partition("=")
+    if not sep:
+        return False
+    progress[key.strip()] = value.strip()
+    return key.strip() == "progress"
+
+
+class ProcessEngine:
+    """
+    Startet externe Prozesse (ffmpeg, ffprobe) mit asyncio.create_subprocess_exec in einer eigenen
+    Event-Loop (ein Thread für alle Prozesse). stdout und stderr werden zeilenweise gelesen statt im
+    Speicher gesammelt; pro Ressourcenklasse begrenzt ein Semaphor die Anzahl gleichzeitiger Prozesse,
+    wartende Jobs sind nur Koroutinen. Prozesse, die ihr Zeitlimit überschreiten oder zu lange nichts
+    ausgeben, werden beendet (terminate, nach KILL_GRACE_SECONDS kill).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._classes = {}
+        self._processes = set()
+        self._cancelled = False
+
+    def configure(self, resource, limit, timeout=None, stall_timeout=None):
+        """
+        Setzt die Grenzen einer Ressourcenklasse. Bereits laufende Prozesse behalten ihren Platz.
+        """
+        with self._lock:
+            self._classes[resource] = ResourceClass(max(1, limit), timeout, stall_timeout)
+
+    def _resource(self, resource):
+        with self._lock:
+            if resource not in self._classes:
+                self._classes[resource] = ResourceClass(4)
+            return self._classes[resource]
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="process-engine", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, args, resource="default", capture_stdout=False, on_progress=None):
+        """
+        Startet args, sobald in der Ressourcenklasse ein Platz frei ist, und liefert sofort ein
+        concurrent.futures.Future mit dem ProcessResult. on_progress(dict) wird für jeden Block
+        der Ausgabe von ffmpeg -progress pipe:1 aufgerufen (nur ohne capture_stdout).
+        """
+        if self._cancelled:
+            future = concurrent.futures.Future()
+            future.set_exception(ProcessCancelled("abgebrochen"))
+            return future
+        return asyncio.run_coroutine_threadsafe(
+            self._run(list(args), self._resource(resource), capture_stdout, on_progress), self._ensure_loop())
+
+    def run(self, args, resource="default", capture_stdout=False, on_progress=None):
+        return self.submit(args, resource, capture_stdout, on_progress).result()
+
+    async def _read_lines(self, stream, on_line, activity):
+        """
+        Liest stream blockweise und ruft on_line für jede Zeile (Ende \n oder \r) auf; überlange
+        Zeilen werden nach READ_SIZE Bytes abgeschnitten weitergegeben.
+        """
+        pending = b""
+        while True:
+            chunk = await stream.read(READ_SIZE)
+            if not chunk:
+                if pending:
+                    on_line(pending)
+                return
+            activity[0] = asyncio.get_running_loop().time()
+            lines = (pending + chunk).splitlines(keepends=True)
+            pending = b"" if lines[-1].endswith((b"\n", b"\r")) else lines.pop()
+            if len(pending) > READ_SIZE:
+                lines.append(pending)
+                pending = b""
+            for line in lines:
+                on_line(line)
+
+    async def _stop(self, process):
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+        except ProcessLookupError:
+            pass
+
+    async def _run(self, args, limits, capture_stdout, on_progress):
+        loop = asyncio.get_running_loop()
+        async with limits.semaphore:
+            if self._cancelled:
+                raise ProcessCancelled("abgebrochen")
+            process = await asyncio.create_subprocess_exec(
+                *args, stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            self._processes.add(process)
+            limits.started += 1
+            limits.running += 1
+            limits.peak = max(limits.peak, limits.running)
+            start = loop.time()
+            activity = [start]
+            stdout = bytearray()
+            stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+            progress = {}
+
+            def on_stdout(line):
+                if capture_stdout:
+                    stdout.extend(line)
+                elif parse_progress(line.decode("utf-8", "replace"), progress) and on_progress is not None:
+                    on_progress(dict(progress))
+
+            readers = asyncio.gather(
+                self._read_lines(process.stdout, on_stdout, activity),
+                self._read_lines(process.stderr, lambda line: stderr_tail.append(line.decode("utf-8", "replace")), activity))
+            try:
+                while True:
+                    now = loop.time()
+                    waits = [1.0]
+                    if limits.timeout is not None:
+                        waits.append(start + limits.timeout - now)
+                    if limits.stall_timeout is not None:
+                        waits.append(activity[0] + limits.stall_timeout - now)
+                    done, _ = await asyncio.wait({readers}, timeout=max(0.0, min(waits)))
+                    if done:
+                        break
+                    now = loop.time()
+                    if limits.timeout is not None and now - start >= limits.timeout:
+                        reason = f"nach {limits.timeout:g} s abgebrochen"
+                    elif limits.stall_timeout is not None and now - activity[0] >= limits.stall_timeout:
+                        reason = f"seit {limits.stall_timeout:g} s ohne Fortschritt, abgebrochen"
+                    else:
+                        continue
+                    limits.timeouts += 1
+                    await self._stop(process)
+                    raise ProcessTimeout(f"{args[0]} {reason}: {''.join(stderr_tail).strip()}")
+                returncode = await process.wait()
+            finally:
+                readers.cancel()
+                if process.returncode is None:
+                    await self._stop(process)
+                self._processes.discard(process)
+                limits.running -= 1
+                limits.seconds += loop.time() - start
+            if self._cancelled:
+                raise ProcessCancelled("abgebrochen")
+            return ProcessResult(returncode, bytes(stdout), "".join(stderr_tail))
+
+    async def _stop_all(self):
+        await asyncio.gather(*(self._stop(process) for process in list(self._processes)))
+
+    def cancel_all(self):
+        """
+        Verhindert den Start weiterer Prozesse und beendet alle laufenden.
+        """
+        self._cancelled = True
+        loop = self._loop
+        if loop is None:
+            return
+        stop_all = asyncio.run_coroutine_threadsafe(self._stop_all(), loop)
+        try:
+            stop_all.result(KILL_GRACE_SECONDS * 2)
+        except concurrent.futures.TimeoutError:
+            pass
+
+    def summary(self):
+        """
+        Eine Zeile pro Ressourcenklasse mit gestarteten Prozessen, Spitzenwert gleichzeitiger Prozesse
+        und Zeitüberschreitungen; leer, wenn kein Prozess gestartet wurde.
+        """
+        with self._lock:
+            classes = sorted(self._classes.items())
+        return [f"{name}: {c.started} Prozesse, höchstens {c.peak} von {c.limit} gleichzeitig, "
+                f"{c.seconds:.1f} s, {c.timeouts} Zeitüberschreitungen"
+                for name, c in classes if c.started]
@@ -0,0 +1,178 @@
+import json
+import os
+
+# Container: (Dateiendung, ffmpeg-Muxer)
+CONTAINERS = {
+    "mp3": (".mp3", "mp3"),
+    "ogg": (".ogg", "ogg"),
+    "opus": (".opus", "opus"),
+    "m4a": (".m4a", "ipod"),
+    "m4b": (".m4b", "ipod"),
+}
+
+FIELDS = ("codec", "container", "bitrate", "quality", "sample_rate", "channels", "threads", "copy_below", "options")
+
+
+class ProfileError(Exception):
+    pass
+
+
+def default_profiles_path():
+    """
+    Liefert den Standardpfad der Profil-Datei unter $XDG_CONFIG_HOME (bzw. ~/.config).
+    """
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(config_home, "convert_cd_audiobooks", "profiles.json")
+
+
+class Profile:
+    """
+    Ausgabeprofil: Codec (ffmpeg-Encoder), Container, Bitrate (z. B. '24k') oder VBR-Qualität (-q:a),
+    Abtastrate und Kanäle (None: mono bzw. stereo wie die Quelle). threads legt die ffmpeg-Threads
+    pro Prozess fest (None: automatisch, nur bei Encodern mit Thread-Unterstützung). Quellen unter
+    copy_below kBit/s werden nur zusammengefügt statt neu enkodiert (nur für MP3-Ausgaben).
+    options sind weitere Ausgabeparameter für ffmpeg, z. B. {"profile:a": "aac_he"}.
+    """
+    def __init__(self, name, codec="libmp3lame", container="mp3", bitrate=None, quality=None,
+                 sample_rate=None, channels=None, threads=None, copy_below=None, options=None):
+        self.name = name
+        self.codec = codec
+        self.container = container
+        self.bitrate = bitrate
+        self.quality = quality
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.threads = threads
+        self.copy_below = copy_below
+        self.options = dict(options or {})
+        self.validate()
+
+    def validate(self):
+        if self.container not in CONTAINERS:
+            raise ProfileError(f"Profil {self.name}: unbekannter Container '{self.container}' "
+                               f"(möglich: {', '.join(sorted(CONTAINERS))})")
+        if not isinstance(self.codec, str) or not self.codec:
+            raise ProfileError(f"Profil {self.name}: codec fehlt")
+        if (self.bitrate is None) == (self.quality is None):
+            raise ProfileError(f"Profil {self.name}: genau eines von bitrate und quality angeben")
+        if self.channels not in (None, 1, 2):
+            raise ProfileError(f"Profil {self.name}: channels muss 1 oder 2 sein")
+        if self.sample_rate is not None and (not isinstance(self.sample_rate, int) or self.sample_rate <= 0):
+            raise ProfileError(f"Profil {self.name}: ungültige sample_rate {self.sample_rate}")
+        if self.threads is not None and (not isinstance(self.threads, int) or self.threads < 1):
+            raise ProfileError(f"Profil {self.name}: ungültige Anzahl threads {self.threads}")
+        if self.copy_below is not None and self.container != "mp3":
+            raise ProfileError(f"Profil {self.name}: copy_below ist nur für den Container mp3 möglich")
+
+    @property
+    def extension(self):
+        return CONTAINERS[self.container][0]
+
+    @property
+    def is_mp3(self):
+        return self.container == "mp3"
+
+    def output_bytes_per_second(self):
+        """
+        Ausgabe-Bytes pro Sekunde Audio laut Bitrate; None bei VBR-Qualität.
+        """
+        if self.bitrate is None:
+            return None
+        value = str(self.bitrate).lower()
+        factor = 1000 if value.endswith("k") else 1
+        return float(value.rstrip("k")) * factor / 8
+
+    def output_args(self, channels, threads=None):
+        """
+        Ausgabeparameter für ffmpeg. channels ist die Kanalzahl der Quelle (falls das Profil keine festlegt).
+        """
+        args = {"acodec": self.codec, "ac": self.channels or channels}
+        if self.bitrate is not None:
+            args["audio_bitrate"] = self.bitrate
+        if self.quality is not None:
+            args["q:a"] = self.quality
+        if self.sample_rate is not None:
+            args["ar"] = self.sample_rate
+        if threads:
+            args["threads"] = threads
+        if self.is_mp3:
+            args["write_xing"] = 1
+        else:
+            args["format"] = CONTAINERS[self.container][1]
+        args.update(self.options)
+        return args
+
+    def settings(self, channels):
+        """
+        Einstellungen für das Manifest. Für MP3 mit fester Bitrate dieselben Schlüssel wie vor der
+        Einführung der Profile, damit vorhandene Ausgaben aktuell bleiben.
+        """
+        settings = {"mode": "encode", "acodec": self.codec, "audio_bitrate": self.bitrate,
+                    "ac": self.channels or channels}
+        if not self.is_mp3:
+            settings["container"] = self.container
+        if self.quality is not None:
+            settings["quality"] = self.quality
+        if self.sample_rate is not None:
+            settings["sample_rate"] = self.sample_rate
+        if self.options:
+            settings["options"] = self.options
+        return settings
+
+    def describe(self, channels=None):
+        if self.bitrate is None:
+            rate = f"VBR-Qualität {self.quality}"
+        elif str(self.bitrate).lower().endswith("k"):
+            rate = f"ca. {str(self.bitrate)[:-1]} kBit/s"
+        else:
+            rate = f"ca. {self.bitrate} Bit/s"
+        parts = [self.codec, rate]
+        if self.channels or channels:
+            parts.append("mono" if (self.channels or channels) == 1 else "stereo")
+        if self.sample_rate:
+            parts.append(f"{self.sample_rate} Hz")
+        return f"{', '.join(parts)}, {self.extension}"
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        if not isinstance(data, dict):
+            raise ProfileError(f"Profil {name}: erwartet ein Objekt")
+        unknown = set(data) - set(FIELDS)
+        if unknown:
+            raise ProfileError(f"Profil {name}: unbekannte Einträge {', '.join(sorted(unknown))}")
+        return cls(name, **data)
+
+
+# Bisherige Ausgabe: MP3 mit ca. 64 kBit/s, Quellen unter 70 kBit/s werden nur zusammengefügt
+DEFAULT_PROFILE = Profile("mp3", codec="libmp3lame", container="mp3", bitrate="64k", copy_below=70)
+
+BUILTIN_PROFILES = {
+    "mp3": DEFAULT_PROFILE,
+    "opus": Profile("opus", codec="libopus", container="opus", bitrate="32k", sample_rate=48000,
+                    options={"application": "voip"}),
+    "m4b": Profile("m4b", codec="aac", container="m4b", bitrate="64k"),
+}
+
+
+def load_profiles(path=None):
+    """
+    Die eingebauten Profile, ergänzt bzw. überschrieben durch die Profile aus der JSON-Datei path
+    ({"name": {"codec": ..., "container": ..., ...}}). Eine fehlende Datei wird ignoriert.
+    Wirft ProfileError bei ungültigen Angaben.
+    """
+    profiles = dict(BUILTIN_PROFILES)
+    if path is None or not os.path.exists(path):
+        return profiles
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ProfileError(f"Profil-Datei {path} kann nicht gelesen werden: {e}")
+    if not isinstance(data, dict):
+        raise ProfileError(f"Profil-Datei {path}: erwartet ein Objekt mit Profilen")
+    for name, entry in data.items():
+        profiles[name] = Profile.from_dict(name, entry)
+    return profiles
@@ -23,6 +23,7 @@ show_usage() {
     echo "Verfügbare Programme:"
     echo "  convert        - Startet convert_audiobooks.py"
     echo "  check          - Startet check_structure.py"
+    echo "  bench          - Startet benchmark.py"
     echo "  test           - Führt Tests mit pytest aus"
     echo "  help           - Zeigt diese Hilfe"
     echo
@@ -30,6 +31,7 @@ show_usage() {
     echo "  ./run.sh convert --help"
     echo "  ./run.sh convert /pfad/zu/hoerbuecher"
     echo "  ./run.sh check /pfad/zu/struktur --tryFix"
+    echo "  ./run.sh bench --files 10000 --compare alt.json"
     echo "  ./run.sh test"
     echo "  ./run.sh test tests/test_convert_audiobooks.py"
 }
@@ -52,6 +54,10 @@ case "$PROGRAM" in
         echo "Starte check_structure.py..."
         python check_structure.py "$@"
         ;;
+    "bench")
+        echo "Starte benchmark.py..."
+        python benchmark.py "$@"
+        ;;
     "test")
         echo "Führe Tests aus..."
         if [ $# -eq 0 ]; then
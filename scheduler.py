@@ -0,0 +1,141 @@
+import os
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import recorder
+
+# Sekunden Audio, die libmp3lame pro Sekunde auf einem Kern mit ca. 64 kBit/s enkodiert
+ENCODE_REALTIME_FACTOR = 25.0
+# Durchsatz beim reinen Zusammenfügen (Kopieren) in Bytes pro Sekunde
+COPY_BYTES_PER_SECOND = 40 * 1024 * 1024
+# Angenommene Bitrate der Quelldateien, falls keine Probe-Daten vorliegen (Bytes pro Sekunde)
+FALLBACK_SOURCE_BYTES_PER_SECOND = 128000 / 8
+
+
+class ConvertJob:
+    """
+    Ein zu konvertierendes Hörbuch mit geschätzten Kosten (Sekunden) und Art:
+    'copy' (nur zusammenfügen) oder 'encode' (neu enkodieren).
+    """
+    def __init__(self, hoerbuch, kind, cost, source_bytes):
+        self.hoerbuch = hoerbuch
+        self.kind = kind
+        self.cost = cost
+        self.source_bytes = source_bytes
+        # Geräte (st_dev) von Quelle und Ziel für die Grenzen pro Gerät, siehe devices.DeviceLimits
+        self.devices = ()
+        self.source_device = None
+        self.target_path = None
+
+
+def estimate_job(hoerbuch, segment_jobs=1, encode_realtime_factor=ENCODE_REALTIME_FACTOR,
+                 copy_bytes_per_second=COPY_BYTES_PER_SECOND):
+    """
+    Schätzt die Kosten der Konvertierung aus der Größe der Quelldateien und der geprüften Spieldauer.
+    Die Durchsätze können durch gemessene Werte (siehe planner.calibrate) ersetzt werden.
+    """
+    source_bytes = hoerbuch.source_bytes()
+    if not hoerbuch.needs_reencoding():
+        return ConvertJob(hoerbuch, 'copy', source_bytes / copy_bytes_per_second, source_bytes)
+    duration = hoerbuch.duration
+    if not duration:
+        bytes_per_second = hoerbuch.avg_bitrate * 1000 / 8 or FALLBACK_SOURCE_BYTES_PER_SECOND
+        duration = source_bytes / bytes_per_second
+    cost = duration / encode_realtime_factor / max(1, segment_jobs)
+    return ConvertJob(hoerbuch, 'encode', cost, source_bytes)
+
+
+def lpt_order(jobs):
+    """
+    Sortiert die Jobs absteigend nach Kosten (Longest Processing Time first).
+    """
+    return sorted(jobs, key=lambda job: job.cost, reverse=True)
+
+
+def predict_makespan(jobs, workers):
+    """
+    Simuliert die Verteilung der Jobs in LPT-Reihenfolge auf workers Worker
+    und gibt die vorhergesagte Gesamtdauer in Sekunden zurück.
+    """
+    loads = [0.0] * max(1, workers)
+    for job in lpt_order(jobs):
+        heapq.heappush(loads, heapq.heappop(loads) + job.cost)
+    return max(loads)
+
+
+def _run_job(job_func, job, devices):
+    """
+    Führt einen Job aus und gibt danach seine Plätze auf den Geräten frei, mit den gelesenen
+    (Quelle) und geschriebenen (Ziel) Bytes für die Durchsatz-Auswertung.
+    """
+    try:
+        return job_func(job.hoerbuch)
+    finally:
+        if devices is not None:
+            transferred = {}
+            if job.source_device is not None:
+                transferred[job.source_device] = job.source_bytes
+            if job.target_path is not None and os.path.exists(job.target_path):
+                target_device = os.stat(job.target_path).st_dev
+                transferred[target_device] = transferred.get(target_device, 0) + os.path.getsize(job.target_path)
+            devices.release(job.devices, transferred)
+
+
+def _submit(executor, job_func, job, devices=None):
+    h = job.hoerbuch
+    return recorder.submit(executor, "convert", _run_job, job_func, job, devices, book=f"{h.author} - {h.title}")
+
+
+def run_lpt(jobs, job_func, encode_workers, copy_workers, on_interrupt=None, devices=None):
+    """
+    Führt job_func(hoerbuch) für alle Jobs aus: Neuenkodierungen in einem Pool mit encode_workers
+    (Grenze für die CPU), reine Kopier-Jobs in einem eigenen Pool mit copy_workers, jeweils teuerste
+    Jobs zuerst. Mit devices (devices.DeviceLimits) startet ein Job erst, wenn auf allen seinen Geräten
+    (job.devices) ein Platz frei ist; bis dahin werden die nächsten Jobs anderer Geräte vorgezogen.
+    Liefert die Ergebnisse von job_func in der Reihenfolge ihrer Fertigstellung.
+    Bei KeyboardInterrupt werden wartende Jobs verworfen und on_interrupt() aufgerufen,
+    bevor auf die laufenden Jobs gewartet wird.
+    """
+    pending = {
+        'encode': lpt_order([job for job in jobs if job.kind == 'encode']),
+        'copy': lpt_order([job for job in jobs if job.kind == 'copy']),
+    }
+    workers = {'encode': max(1, encode_workers), 'copy': max(1, copy_workers)}
+    busy = {'encode': 0, 'copy': 0}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers['encode']) as encode_executor, \
+            ThreadPoolExecutor(max_workers=workers['copy']) as copy_executor:
+        executors = {'encode': encode_executor, 'copy': copy_executor}
+        try:
+            while True:
+                for kind, queue in pending.items():
+                    index = 0
+                    while busy[kind] < workers[kind] and index < len(queue):
+                        job = queue[index]
+                        if devices is not None and not devices.try_acquire(job.devices):
+                            index += 1
+                            continue
+                        del queue[index]
+                        running[_submit(executors[kind], job_func, job, devices)] = job
+                        busy[kind] += 1
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    busy[running.pop(future).kind] -= 1
+                    yield future.result()
+        except KeyboardInterrupt:
+            for future in running:
+                future.cancel()
+            if on_interrupt is not None:
+                on_interrupt()
+            raise
+
+
+def predict_total_makespan(jobs, encode_workers, copy_workers):
+    """
+    Vorhergesagte Gesamtdauer, wenn beide Pools wie in run_lpt parallel arbeiten.
+    """
+    encode_jobs = [job for job in jobs if job.kind == 'encode']
+    copy_jobs = [job for job in jobs if job.kind == 'copy']
+    return max(predict_makespan(encode_jobs, encode_workers), predict_makespan(copy_jobs, copy_workers))
@@ -0,0 +1,232 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from collections import deque
+
+# Blockgröße beim sequentiellen Lesen der Quelldateien
+READ_SIZE = 8 * 1024 * 1024
+
+QUEUED = "wartet"
+STAGING = "wird kopiert"
+READY = "bereit"
+DIRECT = "direkt"
+
+
+class StagedBook:
+    def __init__(self, hoerbuch):
+        self.hoerbuch = hoerbuch
+        self.state = QUEUED
+        self.size = None
+        self.path = None
+        self.acquired = False
+        # Ein Job wartet in acquire() auf dieses Hörbuch
+        self.requested = False
+        # Während des Kopierens freigegeben: die Kopie wird danach sofort verworfen
+        self.released = False
+
+
+def copy_sequential(src, dst):
+    """
+    Kopiert src in großen Blöcken nach dst. Die Quelle wird als sequentiell gelesen markiert und
+    danach aus dem Page-Cache entfernt, damit das Staging den Cache nicht verdrängt.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fd = fsrc.fileno()
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        shutil.copyfileobj(fsrc, fdst, READ_SIZE)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+class Stager:
+    """
+    Kopiert die Quelldateien der Hörbücher vor dem Enkodieren in einem einzigen Lese-Thread
+    (ein sequentieller Durchlauf pro Hörbuch, Dateien in Reihenfolge) in ein lokales Staging-
+    Verzeichnis (tmpfs oder SSD), damit parallele ffmpeg-Prozesse nicht gleichzeitig auf der
+    langsamen Quelle (z. B. USB-Festplatte) springen.
+    Höchstens prefetch_depth Hörbücher liegen fertig kopiert bereit, ohne dass ein Job sie verwendet,
+    und alle kopierten Hörbücher zusammen belegen höchstens max_bytes. Hörbücher, die allein größer
+    als max_bytes sind, werden direkt von der Quelle gelesen. release() entfernt die Kopie.
+    """
+    def __init__(self, stage_dir, max_bytes, prefetch_depth=2):
+        self.root = tempfile.mkdtemp(prefix="staging_", dir=stage_dir)
+        self.max_bytes = max_bytes
+        self.prefetch_depth = prefetch_depth
+        self.used_bytes = 0
+        self.staged_bytes = 0
+        self.staged_books = 0
+        self.staging_seconds = 0.0
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._books = {}
+        self._closed = False
+        self._counter = 0
+        self._thread = threading.Thread(target=self._reader, name="staging", daemon=True)
+        self._thread.start()
+
+    def schedule(self, hoerbuecher):
+        """
+        Hörbücher in der Reihenfolge, in der sie voraussichtlich konvertiert werden, zum Vorauslesen.
+        """
+        with self._cond:
+            for h in hoerbuecher:
+                if h not in self._books:
+                    self._books[h] = StagedBook(h)
+                    self._queue.append(h)
+            self._cond.notify_all()
+
+    def acquire(self, h):
+        """
+        Wartet, bis die Kopie des Hörbuchs bereit ist, und gibt ihr Verzeichnis zurück
+        (None, wenn das Hörbuch direkt von der Quelle gelesen werden soll).
+        Nicht (mehr) eingeplante Hörbücher werden als nächstes kopiert.
+        """
+        with self._cond:
+            book = self._books.get(h)
+            if book is None:
+                book = self._books[h] = StagedBook(h)
+                self._queue.appendleft(h)
+            elif book.state == QUEUED:
+                self._queue.remove(h)
+                self._queue.appendleft(h)
+            book.requested = True
+            self._cond.notify_all()
+            while book.state in (QUEUED, STAGING):
+                self._cond.wait()
+            book.acquired = True
+            self._cond.notify_all()
+            return book.path if book.state == READY else None
+
+    def release(self, h):
+        """
+        Entfernt die Kopie eines Hörbuchs, sobald sein Job fertig ist (oder nicht gestartet wird).
+        """
+        with self._cond:
+            book = self._books.pop(h, None)
+            if book is None:
+                return
+            if book.state == QUEUED:
+                self._queue.remove(h)
+            elif book.state == STAGING:
+                # Der Lese-Thread verwirft die Kopie, sobald er fertig ist
+                book.released = True
+                return
+            self._evict(book)
+            self._cond.notify_all()
+
+    def _evict(self, book):
+        if book.path is not None:
+            shutil.rmtree(book.path, ignore_errors=True)
+            book.path = None
+        if book.state == READY:
+            self.used_bytes -= book.size
+
+    def _book_size(self, h):
+        return sum(os.path.getsize(mp3) for mp3 in h.iter_mp3_files())
+
+    def _waiting(self):
+        """
+        Fertig kopierte Hörbücher, die noch kein Job verwendet.
+        """
+        return [book for book in self._books.values() if book.state == READY and not book.acquired]
+
+    def _next_locked(self):
+        """
+        Das nächste zu kopierende Hörbuch oder None, wenn gerade keines kopiert werden darf.
+        Wartet ein Job auf ein Hörbuch, das nicht mehr hineinpasst, werden vorausgelesene,
+        noch unbenutzte Kopien wieder verworfen.
+        """
+        if not self._queue:
+            return None
+        book = self._books[self._queue[0]]
+        if not book.requested and len(self._waiting()) >= self.prefetch_depth:
+            return None
+        if book.size is None:
+            return book
+        if book.size > self.max_bytes:
+            return book
+        if self.used_bytes + book.size > self.max_bytes and book.requested:
+            for other in reversed(self._waiting()):
+                self._evict(other)
+                other.state = QUEUED
+                self._queue.insert(1, other.hoerbuch)
+                if self.used_bytes + book.size <= self.max_bytes:
+                    break
+        if self.used_bytes + book.size > self.max_bytes:
+            return None
+        return book
+
+    def _reader(self):
+        while True:
+            with self._cond:
+                book = self._next_locked()
+                while book is None and not self._closed:
+                    self._cond.wait()
+                    book = self._next_locked()
+                if self._closed:
+                    return
+                if book.size is None:
+                    # Größe ohne Lock bestimmen (stat auf der langsamen Quelle)
+                    h = book.hoerbuch
+                    self._cond.release()
+                    try:
+                        size = self._book_size(h)
+                    except OSError:
+                        size = self.max_bytes + 1
+                    finally:
+                        self._cond.acquire()
+                    book.size = size
+                    continue
+                self._queue.popleft()
+                if book.size > self.max_bytes:
+                    book.state = DIRECT
+                    self._cond.notify_all()
+                    continue
+                book.state = STAGING
+                self.used_bytes += book.size
+                self._counter += 1
+                path = os.path.join(self.root, f"{self._counter:06d}")
+            ok = self._copy(book.hoerbuch, path)
+            with self._cond:
+                if ok:
+                    book.state = READY
+                    book.path = path
+                    self.staged_books += 1
+                    self.staged_bytes += book.size
+                else:
+                    book.state = DIRECT
+                    self.used_bytes -= book.size
+                    shutil.rmtree(path, ignore_errors=True)
+                if book.released:
+                    self._evict(book)
+                self._cond.notify_all()
+
+    def _copy(self, h, path):
+        start = time.perf_counter()
+        try:
+            for rel in h.relative_mp3_files:
+                dst = os.path.join(path, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                copy_sequential(os.path.join(h.path, rel), dst)
+        except OSError as e:
+            print(f"Staging von {h.author} - {h.title} fehlgeschlagen ({e}), lese direkt von der Quelle.")
+            return False
+        finally:
+            self.staging_seconds += time.perf_counter() - start
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def summary(self):
+        mb = 1024 * 1024
+        rate = self.staged_bytes / self.staging_seconds / mb if self.staging_seconds > 0 else 0
+        return (f"Staging: {self.staged_books} Hörbücher, {self.staged_bytes / mb:.1f} MB "
+                f"in {self.staging_seconds:.1f} s ({rate:.1f} MB/s)")
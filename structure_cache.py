@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+
+def default_structure_cache_path():
+    """
+    Liefert den Standardpfad des Struktur-Caches unter $XDG_CACHE_HOME (bzw. ~/.cache).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "convert_cd_audiobooks", "structure_cache.json")
+
+
+def dirs_unchanged(base_path, dir_mtimes):
+    """
+    True, wenn alle Verzeichnisse (relativ zu base_path) noch dieselbe mtime haben.
+    Kostet einen stat-Aufruf pro Verzeichnis.
+    """
+    for rel, mtime_ns in dir_mtimes.items():
+        try:
+            if os.stat(os.path.join(base_path, rel)).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class StructureCache:
+    """
+    Persistenter Cache der Ergebnisse von check_structure (JSON), pro Author-Verzeichnis.
+    Ein Eintrag speichert die mtime des Author-Verzeichnisses mit den Fehlern auf Author-Ebene
+    und pro Hörbuch die mtimes aller Verzeichnisse darunter mit den Fehlern des Hörbuchs.
+    Die mtime eines Verzeichnisses ändert sich, wenn Einträge angelegt, gelöscht oder umbenannt werden;
+    Hörbücher mit unveränderten Verzeichnissen werden daher nicht erneut geprüft.
+    """
+    def __init__(self, path, rebuild=False):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.entries = {}
+        if not rebuild and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                # Beschädigter Cache: neu aufbauen
+                self.entries = {}
+
+    @staticmethod
+    def _key(root_path, author_path):
+        return f"{os.path.abspath(root_path)}\0{os.path.relpath(author_path, root_path)}"
+
+    def get(self, root_path, author_path):
+        with self._lock:
+            return self.entries.get(self._key(root_path, author_path))
+
+    def put(self, root_path, author_path, entry):
+        with self._lock:
+            self.entries[self._key(root_path, author_path)] = entry
+            self._dirty = True
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def summary(self):
+        return f"Struktur-Cache: {self.hits} Hörbücher unverändert, {self.misses} geprüft"
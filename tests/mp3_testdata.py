@@ -0,0 +1,76 @@
+import struct
+
+# MPEG-1 Layer III, 44100 Hz, ohne CRC
+HEADER_MONO_64K = bytes([0xFF, 0xFB, 0x50, 0xC0])
+HEADER_JOINT_128K = bytes([0xFF, 0xFB, 0x90, 0x40])
+
+
+def frame_length(header):
+    bitrate = {0x50: 64000, 0x90: 128000}[header[2] & 0xF0]
+    return 144 * bitrate // 44100 + ((header[2] >> 1) & 1)
+
+
+def make_frames(header, count, fill=0):
+    """
+    Erzeugt count synthetische MPEG-Frames mit dem angegebenen Header.
+    Der Nutzdatenbereich enthält die Frame-Nummer, damit sich die Frames unterscheiden.
+    """
+    length = frame_length(header)
+    frames = bytearray()
+    for i in range(count):
+        body = bytes([(fill + i) & 0xFF]) * (length - 4)
+        frames += header + body
+    return bytes(frames)
+
+
+def make_xing_frame(header, tag, frames, num_bytes):
+    length = frame_length(header)
+    side_info = 17 if (header[3] >> 6) == 3 else 32
+    payload = bytearray(length - 4)
+    xing = tag + struct.pack(">III", 3, frames, num_bytes)
+    payload[side_info:side_info + len(xing)] = xing
+    return header + bytes(payload)
+
+
+def make_lame(delay, padding):
+    """
+    LAME-Erweiterung (36 Bytes) mit Encoder-Delay und -Padding.
+    """
+    lame = bytearray(36)
+    lame[0:9] = b"LAME3.100"
+    lame[21] = delay >> 4
+    lame[22] = ((delay & 0x0F) << 4) | (padding >> 8)
+    lame[23] = padding & 0xFF
+    return bytes(lame)
+
+
+def make_id3v2(size=20):
+    body = b"\x00" * size
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x03\x00\x00" + syncsafe + body
+
+
+def make_id3v1():
+    return b"TAG" + b"\x00" * 125
+
+
+def side_info_mono(main_data_begin=0, main_data_bytes=0):
+    """
+    Side-Information eines MPEG-1-Mono-Frames (17 Bytes) mit main_data_begin und Hauptdaten
+    von main_data_bytes Bytes (als part2_3_length des ersten Granules).
+    """
+    bits = (main_data_begin << (136 - 9)) | ((main_data_bytes * 8) << (136 - 18 - 12))
+    return bits.to_bytes(17, "big")
+
+
+def make_marked_frames(header, first, count, side_info=None):
+    """
+    Mono-Frames, deren Hauptdatenbereich die laufende Nummer first, first+1, ... enthält.
+    side_info(i) liefert die Side-Information des i-ten Frames (Standard: leeres Bit-Reservoir).
+    """
+    length = frame_length(header)
+    frames = bytearray()
+    for i in range(count):
+        side = side_info(i) if side_info is not None else bytes(17)
+        frames += header + side + bytes([(first + i) & 0xFF]) * (length - 4 - 17)
+    return bytes(frames)
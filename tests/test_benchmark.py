@@ -0,0 +1,71 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmark import generate_library, run_benchmark
+from check_structure import check_structure
+from tests.mp3_testdata import HEADER_MONO_64K, make_frames
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.template = os.path.join(self.temp_dir, "vorlage.mp3")
+        with open(self.template, "wb") as f:
+            f.write(make_frames(HEADER_MONO_64K, 40))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def list_tree(self, root):
+        return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, files in os.walk(root) for f in files)
+
+    def test_generate_library_is_valid_and_reproducible(self):
+        first = os.path.join(self.temp_dir, "a")
+        second = os.path.join(self.temp_dir, "b")
+        generate_library(first, 120, {"vorlage": self.template}, seed=7)
+        generate_library(second, 120, {"vorlage": self.template}, seed=7)
+        files = self.list_tree(first)
+        self.assertEqual(len(files), 120)
+        self.assertEqual(files, self.list_tree(second))
+        self.assertEqual(check_structure(first), [])
+
+    def test_run_benchmark(self):
+        root = os.path.join(self.temp_dir, "library")
+        generate_library(root, 30, {"vorlage": self.template})
+        with mock.patch("builtins.print"):
+            results = run_benchmark(root, self.temp_dir, "native", 2, 1, 1)
+        self.assertEqual(results["scan"]["files"], 30)
+        self.assertEqual(results["structure"]["violations"], 0)
+        self.assertEqual(results["filename_pattern"]["files"], 5000)
+        self.assertEqual(results["probe"]["failed_books"], 0)
+        self.assertEqual(results["convert"]["books"][0]["mode"], "copy")
+        self.assertEqual(results["convert"]["books"][0]["errors"], [])
+        for stage in ("scan", "structure", "probe", "convert"):
+            self.assertGreaterEqual(results[stage]["peak_memory_increase_mb"], 0)
+            self.assertGreaterEqual(results[stage]["children_peak_memory_increase_mb"], 0)
+            self.assertNotIn("peak_memory_mb", results[stage])
+        self.assertGreater(results["process"]["peak_memory_mb"], 0)
+
+    def test_run_benchmark_compares_segmented_encoding(self):
+        root = os.path.join(self.temp_dir, "library")
+        generate_library(root, 30, {"vorlage": self.template})
+        calls = []
+
+        def fake_convert(h, output_path, segment_jobs=1, chapters='file', profile=None):
+            calls.append(segment_jobs)
+            return []
+
+        with mock.patch("convert_audiobooks.Hoerbuch.conversion_settings", return_value={"mode": "encode"}), \
+                mock.patch("convert_audiobooks.Hoerbuch.convert", fake_convert), mock.patch("builtins.print"):
+            results = run_benchmark(root, self.temp_dir, "native", 2, 1, 4)
+        self.assertEqual(calls, [1, 4])
+        book = results["convert"]["books"][0]
+        self.assertIn("segmented_speedup", book)
+        self.assertEqual(book["segmented_errors"], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 import sys
 import os
+import re
+import random
 import shutil
 import tempfile
 import unittest
@@ -7,6 +9,7 @@ import unittest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from check_structure import (
     check_structure,
+    check_book,
     check_author_dir,
     check_book_dir,
     flatten_single_subdirs,
@@ -15,7 +18,9 @@ from check_structure import (
     author_valid_re,
     book_valid_re,
     check_mp3_filename_pattern,
+    snapshot,
 )
+from structure_cache import StructureCache
 
 class TestCheckStructure(unittest.TestCase):
     def setUp(self):
@@ -275,6 +280,68 @@ class TestCheckStructure(unittest.TestCase):
         finally:
             shutil.rmtree(test_dir)
 
+    def test_tryfix_updates_snapshot(self):
+        # Nach den Reparaturen müssen die Regeln auf dem aktualisierten Baum keine Fehler mehr finden
+        book_dir = os.path.join(self.test_dir, "M", "Max_Mustermann", "Mein_Buch", "x", "y")
+        for cd in ("CD1", "CD2"):
+            os.makedirs(os.path.join(book_dir, cd, "sub"))
+            for i in (1, 2):
+                self.make_file(os.path.join(book_dir, cd, "sub", f"track{i}.mp3"))
+        os.makedirs(os.path.join(self.test_dir, "B", "Bernd Beispiel", "Alpha"))
+        self.make_file(os.path.join(self.test_dir, "B", "Bernd Beispiel", "Alpha", "track1.mp3"))
+
+        errors = check_structure(self.test_dir, try_fix=True, jobs=2)
+        self.assertEqual(errors, [])
+        tree = snapshot(self.test_dir)
+        book = tree.dirs["M"].dirs["Max Mustermann"].dirs["Mein Buch"]
+        self.assertEqual(sorted(book.dirs), ["CD1", "CD2"])
+        self.assertEqual(sorted(book.dirs["CD1"].files), ["track1.mp3", "track2.mp3"])
+        self.assertEqual(check_structure(self.test_dir), [])
+
+    def test_structure_cache(self):
+        root = os.path.join(self.test_dir, "root")
+        book_dir = os.path.join(root, "M", "Max Mustermann", "Mein Buch")
+        os.makedirs(os.path.join(book_dir, "CD1"))
+        self.make_file(os.path.join(book_dir, "CD1", "track1.mp3"))
+        other_dir = os.path.join(root, "M", "Max Mustermann", "Anderes")
+        os.makedirs(other_dir)
+        self.make_file(os.path.join(other_dir, "track1.mp3"))
+        cache_path = os.path.join(self.test_dir, "cache.json")
+
+        cache = StructureCache(cache_path)
+        self.assertEqual(check_structure(root, cache=cache), [])
+        cache.save()
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+        # Neue Datei ohne Zahl in einem CD-Verzeichnis: nur dieses Hörbuch wird neu geprüft
+        self.make_file(os.path.join(book_dir, "CD1", "bonus.mp3"))
+        cache = StructureCache(cache_path)
+        errors = check_structure(root, cache=cache)
+        self.assertEqual(errors, check_structure(root))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.save()
+
+        cache = StructureCache(cache_path)
+        self.assertEqual(check_structure(root, cache=cache), errors)
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_check_book(self):
+        book_dir = os.path.join(self.test_dir, "M", "Max Mustermann", "Mein Buch")
+        os.makedirs(book_dir)
+        self.make_file(os.path.join(book_dir, "track1.mp3"))
+        self.assertEqual(check_book(self.test_dir, "M", "Max Mustermann", "Mein Buch"), [])
+        # Ein anderes fehlerhaftes Hörbuch desselben Authors wird nicht mitgeprüft
+        os.makedirs(os.path.join(self.test_dir, "M", "Max Mustermann", "Leer"))
+        self.assertEqual(check_book(self.test_dir, "M", "Max Mustermann", "Mein Buch"), [])
+        self.make_file(os.path.join(book_dir, "bonus.mp3"))
+        self.assertEqual(check_book(self.test_dir, "M", "Max Mustermann", "Mein Buch"),
+                         [e for e in check_structure(self.test_dir) if "Mein Buch" in e])
+        os.makedirs(os.path.join(self.test_dir, "M", "Erika Muster", "Buch"))
+        errors = check_book(self.test_dir, "M", "Erika Muster", "Buch")
+        self.assertEqual(len(errors), 1)
+        self.assertIn("beginnt nicht mit 'M'", errors[0])
+
 class TestCheckMp3FilenamePattern(unittest.TestCase):
     def test_all_files_same_prefix_and_number(self):
         files = ["track01.mp3", "track02.mp3", "track03.mp3"]
@@ -365,5 +432,54 @@ class TestCheckMp3FilenamePattern(unittest.TestCase):
             msg=f"Fehler erhalten, obwohl keiner erwartet: {err}"
         )
 
+    def test_same_messages_as_recursive_version(self):
+        # Zufällige Dateinamen aus wenigen Bausteinen, damit viele Gruppen und Fehlerfälle entstehen
+        rng = random.Random(7)
+        parts = ["track", "cd", "a", "b", "-", " ", "01", "02", "1", "10", "123", ""]
+        for _ in range(500):
+            files = ["".join(rng.choice(parts) for _ in range(rng.randint(1, 6))) + ".mp3"
+                     for _ in range(rng.randint(0, 8))]
+            with self.subTest(files=files):
+                self.assertEqual(check_mp3_filename_pattern(files, "bla"), reference_filename_pattern(files, "bla"))
+
+    def test_many_files(self):
+        files = [f"Hörbuch 2024 Teil 0000{cd:03d} Track {track:05d}.mp3" for cd in range(50) for track in range(100)]
+        self.assertIsNone(check_mp3_filename_pattern(files, "bla"))
+        files.append("Hörbuch 2024 Teil 0000049 Spur 00001.mp3")
+        self.assertEqual(check_mp3_filename_pattern(files, "bla"), reference_filename_pattern(files, "bla"))
+
+
+def reference_filename_pattern(file_list, relpath):
+    """
+    Die frühere rekursive Implementierung als Referenz für die Fehlermeldungen.
+    """
+    if len(file_list) <= 1:
+        return None
+    return _reference_rec([(fname, fname) for fname in file_list], relpath)
+
+
+def _reference_rec(file_list, relpath):
+    if len(file_list) <= 1:
+        return None
+    firstName, firstRest = file_list[0]
+    m = re.search(r'\d+', firstRest)
+    if not m:
+        return f"{relpath}: Dateiname '{firstName}' enthält keine Zahl."
+    prefix = firstRest[:m.start()]
+    number_dict = {}
+    for fname, frest in file_list:
+        m2 = re.search(r'\d+', frest)
+        if not m2:
+            return f"{relpath}: Dateiname '{frest}' aus '{fname}' enthält keine Zahl."
+        if not prefix == frest[:m2.start()]:
+            return f"{relpath}: Dateiname '{frest}' aus '{fname}' beginnt nicht mit dem Präfix vor der nächsten Zahl wie '{prefix}' von '{firstRest}' aus '{firstName}'."
+        number_dict.setdefault(m2.group(0), []).append((fname, frest[m2.end():]))
+    for group in number_dict.values():
+        if len(group) > 1:
+            err = _reference_rec(group, relpath)
+            if err:
+                return err
+    return None
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,11 +1,18 @@
 import sys
 import os
+import re
 import shutil
 import tempfile
 import unittest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from convert_audiobooks import Hoerbuch, finde_alle_hoerbuecher
+from unittest import mock
+import convert_audiobooks
+import mp3_frames
+import devices
+from convert_audiobooks import Hoerbuch, finde_alle_hoerbuecher, iter_hoerbuecher, check_hoerbuecher
+from mutagen.id3 import ID3, CHAP, TIT2
+from tests.mp3_testdata import HEADER_MONO_64K, HEADER_JOINT_128K, make_frames, make_lame, make_marked_frames
 
 class TestHoerbuch(unittest.TestCase):
     def setUp(self):
@@ -76,5 +83,267 @@ class TestHoerbuch(unittest.TestCase):
         result_tuples = [(h.author, h.title) for h in result]
         self.assertEqual(result_tuples, expected)
 
+    def test_iter_hoerbuecher_lazy(self):
+        for author, title in (("Bernd Beispiel", "Alpha"), ("Anna Autorin", "Buch")):
+            book_dir = os.path.join(self.temp_dir, author[0], author, title, "CD1")
+            os.makedirs(book_dir)
+            self.make_mp3(os.path.join(book_dir, "track1.mp3"))
+        books = iter_hoerbuecher(self.temp_dir, jobs=1)
+        first = next(books)
+        self.assertEqual((first.author, first.title), ("Anna Autorin", "Buch"))
+        # Die Dateien wurden schon in den Such-Threads gefunden und relativ gespeichert
+        self.assertEqual(first._files, (os.path.join("CD1", "track1.mp3"),))
+        self.assertEqual(list(first.iter_mp3_files()), [os.path.join(first.path, "CD1", "track1.mp3")])
+        self.assertEqual(first.mp3_files, [os.path.join(first.path, "CD1", "track1.mp3")])
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertEqual([h.title for h in books], ["Alpha"])
+
+    def test_check_hoerbuecher_generator_input(self):
+        root = os.path.join(self.temp_dir, "root")
+        os.makedirs(os.path.join(root, "L", "Lea Leer", "Leer"))
+        book_dir = os.path.join(root, "M", "Max Mustermann", "Buch")
+        os.makedirs(book_dir)
+        with open(os.path.join(book_dir, "track1.mp3"), "wb") as f:
+            f.write(make_frames(HEADER_MONO_64K, 10))
+        with mock.patch("builtins.print"):
+            results = [(h.title, errors) for h, errors in
+                       check_hoerbuecher(iter_hoerbuecher(root), 2, probe_backend='native')]
+        self.assertEqual(sorted(results), [("Buch", []), ("Leer", [])])
+
+    def test_segment_groups(self):
+        book_dir = os.path.join(self.temp_dir, "Max Mustermann", "Mein Buch")
+        os.makedirs(book_dir)
+        for i in range(5):
+            self.make_mp3(os.path.join(book_dir, f"track{i}.mp3"))
+        h = Hoerbuch("Max Mustermann", "Mein Buch", book_dir)
+        groups = h.segment_groups(2)
+        self.assertEqual([len(g) for g in groups], [3, 2])
+        self.assertEqual(sum(groups, []), h.mp3_files)
+
+        for cd in ("CD1", "CD2", "CD3"):
+            os.makedirs(os.path.join(book_dir, "Teil", cd), exist_ok=True)
+        cd_book = Hoerbuch("Max Mustermann", "Teil", os.path.join(book_dir, "Teil"))
+        for cd in ("CD1", "CD2", "CD3"):
+            self.make_mp3(os.path.join(cd_book.path, cd, "track1.mp3"))
+        self.assertEqual([len(g) for g in cd_book.segment_groups(2)], [1, 1, 1])
+
+    def test_convert_copy_path_joins_natively(self):
+        book_dir = os.path.join(self.temp_dir, "Max Mustermann", "Mein Buch")
+        os.makedirs(book_dir)
+        for i in range(3):
+            with open(os.path.join(book_dir, f"track{i}.mp3"), "wb") as f:
+                f.write(make_frames(HEADER_MONO_64K, 10, fill=i * 10))
+        h = Hoerbuch("Max Mustermann", "Mein Buch", book_dir)
+        h.avg_bitrate = 64
+        h.channel_layout = "mono"
+        output = os.path.join(self.temp_dir, "out.mp3")
+        self.assertEqual(h.convert(output), [])
+        tags = ID3(output)
+        self.assertEqual(str(tags["TPE1"]), "Max Mustermann")
+        self.assertEqual(str(tags["TIT2"]), "Mein Buch")
+        with open(output, "rb") as f:
+            self.assertTrue(f.read().endswith(make_frames(HEADER_MONO_64K, 30)))
+
+    def test_convert_writes_chapters_and_seek_table(self):
+        book_dir = os.path.join(self.temp_dir, "Max Mustermann", "Mein Buch")
+        for cd, counts in (("CD1", (10, 20)), ("CD2", (30,))):
+            os.makedirs(os.path.join(book_dir, cd))
+            for i, count in enumerate(counts):
+                with open(os.path.join(book_dir, cd, f"track{i}.mp3"), "wb") as f:
+                    f.write(make_frames(HEADER_MONO_64K, count))
+        frame_ms = 1152 / 44100 * 1000
+        for mode, expected in (("file", [("track0", 0, 10), ("track1", 10, 30), ("track0", 30, 60)]),
+                               ("cd", [("CD1", 0, 30), ("CD2", 30, 60)])):
+            with self.subTest(mode=mode):
+                h = Hoerbuch("Max Mustermann", "Mein Buch", book_dir)
+                h.avg_bitrate = 64
+                h.channel_layout = "mono"
+                output = os.path.join(self.temp_dir, f"out_{mode}.mp3")
+                with mock.patch("builtins.print"):
+                    self.assertEqual(h.convert(output, chapters=mode), [])
+                tags = ID3(output)
+                chapters = sorted(tags.getall("CHAP"), key=lambda c: c.start_time)
+                self.assertEqual([(str(c.sub_frames["TIT2"]), c.start_time, c.end_time) for c in chapters],
+                                 [(t, round(a * frame_ms), round(b * frame_ms)) for t, a, b in expected])
+                self.assertEqual(tags.getall("CTOC")[0].child_element_ids, [c.element_id for c in chapters])
+                self.assertTrue(mp3_frames.has_seek_table(output))
+
+        # Einzelne Datei ohne Xing-Header: die Ausgabe bekommt trotzdem eine Seek-Tabelle
+        single_dir = os.path.join(self.temp_dir, "Max Mustermann", "Einzeln")
+        os.makedirs(single_dir)
+        with open(os.path.join(single_dir, "track1.mp3"), "wb") as f:
+            f.write(make_frames(HEADER_MONO_64K, 10))
+        self.assertFalse(mp3_frames.has_seek_table(os.path.join(single_dir, "track1.mp3")))
+        h = Hoerbuch("Max Mustermann", "Einzeln", single_dir)
+        h.avg_bitrate = 64
+        output = os.path.join(self.temp_dir, "einzeln.mp3")
+        with mock.patch("builtins.print"):
+            self.assertEqual(h.convert(output), [])
+        self.assertTrue(mp3_frames.has_seek_table(output))
+        self.assertEqual(ID3(output).getall("CHAP"), [])
+
+        # Eigene Kapitel einer einzelnen Quelldatei bleiben erhalten
+        source = os.path.join(single_dir, "track1.mp3")
+        source_tags = ID3()
+        for i in range(2):
+            source_tags.add(CHAP(element_id=f"q{i}", start_time=i * 100, end_time=(i + 1) * 100,
+                                 sub_frames=[TIT2(encoding=3, text=f"Teil {i + 1}")]))
+        source_tags.save(source)
+        output = os.path.join(self.temp_dir, "einzeln_kapitel.mp3")
+        with mock.patch("builtins.print"):
+            self.assertEqual(h.convert(output), [])
+        self.assertEqual(sorted(c.element_id for c in ID3(output).getall("CHAP")), ["q0", "q1"])
+        # Bei mehreren Quelldateien gelten die Kapitel der ersten nicht für das ganze Hörbuch
+        with open(os.path.join(single_dir, "track2.mp3"), "wb") as f:
+            f.write(make_frames(HEADER_MONO_64K, 10))
+        h = Hoerbuch("Max Mustermann", "Einzeln", single_dir)
+        h.avg_bitrate = 64
+        output = os.path.join(self.temp_dir, "zwei.mp3")
+        with mock.patch("builtins.print"):
+            self.assertEqual(h.convert(output, chapters='none'), [])
+        self.assertEqual(ID3(output).getall("CHAP"), [])
+
+    def test_convert_segmented_is_gapless(self):
+        book_dir = os.path.join(self.temp_dir, "Max Mustermann", "Mein Buch")
+        sources = []
+        for cd, files in (("CD1", ((100, 100), (80, 1000))), ("CD2", ((90, 500), (120, 50)))):
+            os.makedirs(os.path.join(book_dir, cd))
+            for i, (count, padding) in enumerate(files):
+                path = os.path.join(book_dir, cd, f"track{i}.mp3")
+                with open(path, "wb") as f:
+                    f.write(mp3_frames.build_xing_frame(HEADER_MONO_64K, count, 0, bytes(100), False, make_lame(576, padding)))
+                    f.write(make_frames(HEADER_MONO_64K, count))
+                sources.append(count * 1152 - 576 - padding)
+        offsets = dict(zip(sorted(os.path.join(book_dir, cd, f"track{i}.mp3") for cd in ("CD1", "CD2") for i in range(2)),
+                           [sum(sources[:i]) for i in range(4)]))
+        delay = 576
+        calls = []
+
+        def fake_lame(stream, resource='encode', on_progress=None):
+            # Wie LAME: Encoder-Delay am Anfang, aufgefüllt auf ganze Frames; die Frames tragen ihren
+            # globalen Index, sodass ein einzelner Encoder die Frames 0, 1, 2, ... liefern würde
+            args = stream.compile()
+            calls.append(args)
+            with open(args[args.index("-i") + 1]) as f:
+                inputs = [line[len("file '"):-1] for line in f.read().splitlines()]
+            command = " ".join(args)
+            start = int(re.search(r"start_sample=(\d+)", command).group(1)) if "start_sample" in command else 0
+            available = sum(mp3_frames.decoded_samples(mp3)[0] for mp3 in inputs)
+            end = int(re.search(r"end_sample=(\d+)", command).group(1)) if "end_sample" in command else available
+            first_sample = offsets[inputs[0]] + start
+            self.assertEqual(first_sample % 1152, 0)
+            samples = min(end, available) - start
+            frames = (samples + delay) // 1152 + 2
+            with open(args[-1], "wb") as f:
+                f.write(mp3_frames.build_xing_frame(HEADER_MONO_64K, frames, 0, bytes(100), False,
+                                                    make_lame(delay, frames * 1152 - delay - samples)))
+                f.write(make_marked_frames(HEADER_MONO_64K, first_sample // 1152, frames))
+
+        h = Hoerbuch("Max Mustermann", "Mein Buch", book_dir)
+        h.avg_bitrate = 128
+        h.channel_layout = "mono"
+        h.file_durations = (2.6, 2.1, 2.3, 3.1)
+        output = os.path.join(self.temp_dir, "out.mp3")
+        with mock.patch.object(convert_audiobooks, "run_ffmpeg", fake_lame), \
+                mock.patch.object(convert_audiobooks, "merge_id3_tags_from_first_mp3") as merge, \
+                mock.patch("builtins.print"):
+            self.assertEqual(h.convert(output, segment_jobs=2), [])
+        self.assertEqual(len(calls), 2)
+
+        # So viele Samples wie alle Quellen zusammen, dieselben Frames wie bei einem einzigen Encoder
+        total = sum(sources)
+        self.assertEqual(mp3_frames.decoded_samples(output), (total, 44100))
+        with open(output, "rb") as f:
+            data = f.read()
+        start, end, _, _ = mp3_frames.audio_range(data)
+        markers = [data[offset + 21] for offset, _ in mp3_frames.iter_frames(data, start, end)]
+        self.assertEqual(markers, [g & 0xFF for g in range((total + delay) // 1152 + 2)])
+        # Die Kapitel folgen den exakten Dauern der Quelldateien
+        chapters = merge.call_args[0][4]
+        self.assertEqual([c[2] for c in chapters], [round(sum(sources[:i + 1]) / 44.1) for i in range(4)])
+
+    def test_check_hoerbuecher_file_queue(self):
+        books = []
+        for title, header, count in (("Kurz", HEADER_MONO_64K, 2), ("Lang", HEADER_JOINT_128K, 12)):
+            book_dir = os.path.join(self.temp_dir, "M", "Max Mustermann", title)
+            os.makedirs(book_dir)
+            for i in range(count):
+                with open(os.path.join(book_dir, f"track{i:02d}.mp3"), "wb") as f:
+                    f.write(make_frames(header, 20))
+            if title == "Lang":
+                self.make_mp3(os.path.join(book_dir, "track99.mp3"))
+            books.append(Hoerbuch("Max Mustermann", title, book_dir))
+
+        results = dict(check_hoerbuecher(books, 3, probe_backend='native'))
+        self.assertEqual(results[books[0]], [])
+        self.assertEqual(books[0].avg_bitrate, 64)
+        self.assertEqual(books[0].channel_layout, "mono")
+        self.assertAlmostEqual(books[0].duration, 2 * 20 * 1152 / 44100, delta=0.1)
+        self.assertEqual(len(books[0].file_durations), 2)
+        self.assertAlmostEqual(sum(books[0].file_durations), books[0].duration)
+        # Die Dummy-Datei kann nicht klassifiziert werden, ffprobe ist nicht zwingend vorhanden
+        self.assertEqual(len(results[books[1]]), 1)
+        self.assertIn("track99.mp3", results[books[1]][0])
+
+    def test_check_hoerbuecher_device_caps(self):
+        books = []
+        for title in ("Eins", "Zwei"):
+            book_dir = os.path.join(self.temp_dir, "M", "Max Mustermann", title)
+            os.makedirs(book_dir)
+            for i in range(5):
+                with open(os.path.join(book_dir, f"track{i}.mp3"), "wb") as f:
+                    f.write(make_frames(HEADER_MONO_64K, 10))
+            books.append(Hoerbuch("Max Mustermann", title, book_dir))
+        limits = devices.DeviceLimits("Prüfung", default_cap=1)
+        with mock.patch("builtins.print"), mock.patch.object(limits, "release", wraps=limits.release) as release:
+            results = dict(check_hoerbuecher(books, 4, probe_backend='native', devices=limits))
+        self.assertEqual(results, {books[0]: [], books[1]: []})
+        # Die gelesenen Bytes gehen in den Durchsatz ein
+        total = sum(os.path.getsize(mp3) for h in books for mp3 in h.mp3_files)
+        self.assertEqual(sum(sum(call.args[1].values()) for call in release.call_args_list), total)
+        summary = limits.summary()
+        self.assertEqual(len(summary), 1)
+        self.assertIn("10 Jobs", summary[0])
+        self.assertIn("höchstens 1 von 1 gleichzeitig", summary[0])
+
+    def test_pipeline_skips_failed_books(self):
+        root = os.path.join(self.temp_dir, "root")
+        target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(target)
+        good = os.path.join(root, "M", "Max Mustermann", "Gut")
+        bad = os.path.join(root, "M", "Max Mustermann", "Kaputt")
+        os.makedirs(good)
+        os.makedirs(bad)
+        for i in range(3):
+            with open(os.path.join(good, f"track{i}.mp3"), "wb") as f:
+                f.write(make_frames(HEADER_MONO_64K, 10))
+        self.make_mp3(os.path.join(bad, "track1.mp3"))
+        argv = ["convert_audiobooks.py", root, "--pipeline", "--probe-backend", "native",
+                "--no-probe-cache", "--convert-to", target, "-j", "2"]
+        with mock.patch.object(sys, "argv", argv), mock.patch("builtins.print"):
+            with self.assertRaises(SystemExit) as cm:
+                convert_audiobooks.main()
+        self.assertEqual(cm.exception.code, 1)
+        self.assertTrue(os.path.exists(os.path.join(target, "Max_Mustermann", "Gut.mp3")))
+        self.assertFalse(os.path.exists(os.path.join(target, "Max_Mustermann", "Kaputt.mp3")))
+
+    def test_plan_does_not_convert(self):
+        root = os.path.join(self.temp_dir, "root")
+        target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(target)
+        book_dir = os.path.join(root, "M", "Max Mustermann", "Buch")
+        os.makedirs(book_dir)
+        for i in range(3):
+            with open(os.path.join(book_dir, f"track{i}.mp3"), "wb") as f:
+                f.write(make_frames(HEADER_MONO_64K, 10))
+        argv = ["convert_audiobooks.py", root, "--plan", "--probe-backend", "native",
+                "--no-probe-cache", "--convert-to", target, "-j", "2"]
+        with mock.patch.object(sys, "argv", argv), mock.patch("builtins.print") as printed:
+            convert_audiobooks.main()
+        output = "\n".join(" ".join(str(a) for a in call.args) for call in printed.call_args_list)
+        self.assertIn("[fehlt] Max Mustermann - Buch: copy", output)
+        self.assertIn("Geplant: 1 von 1 Hörbüchern", output)
+        self.assertEqual(os.listdir(target), [])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
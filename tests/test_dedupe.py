@@ -0,0 +1,89 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import dedupe
+import convert_audiobooks
+from dedupe import quick_fingerprint, full_fingerprint, find_duplicate_files, find_duplicate_books
+from convert_audiobooks import Hoerbuch
+from mutagen.id3 import ID3
+from tests.mp3_testdata import HEADER_MONO_64K, make_frames, make_id3v2, make_id3v1
+
+class TestDedupe(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_fingerprint_ignores_tags(self):
+        audio = make_frames(HEADER_MONO_64K, 20)
+        plain = self.write(os.path.join(self.temp_dir, "plain.mp3"), audio)
+        tagged = self.write(os.path.join(self.temp_dir, "tagged.mp3"), make_id3v2(300) + audio + make_id3v1())
+        self.assertEqual(quick_fingerprint(plain), quick_fingerprint(tagged))
+        self.assertEqual(full_fingerprint(plain), full_fingerprint(tagged))
+        self.assertEqual(full_fingerprint(plain)[0], len(audio))
+
+    def test_full_hash_separates_sample_collisions(self):
+        # Gleiche Länge und gleiche Stichproben, Unterschied nur zwischen den Stichproben
+        audio = bytearray(make_frames(HEADER_MONO_64K, 2000))
+        first = self.write(os.path.join(self.temp_dir, "a.mp3"), bytes(audio))
+        sample_gap = dedupe.SAMPLE_SIZE + 1000
+        audio[sample_gap] ^= 0xFF
+        second = self.write(os.path.join(self.temp_dir, "b.mp3"), bytes(audio))
+        self.assertEqual(quick_fingerprint(first), quick_fingerprint(second))
+        self.assertNotEqual(full_fingerprint(first), full_fingerprint(second))
+        self.assertEqual(find_duplicate_files([first, second], jobs=2), {})
+
+    def test_find_duplicate_books(self):
+        tracks = [make_frames(HEADER_MONO_64K, 10, fill=i * 10) for i in range(3)]
+        books = []
+        for author, title, tag in (("Max Mustermann", "Buch", b""), ("Max Mustermann", "Buch Kopie", make_id3v2())):
+            book_dir = os.path.join(self.temp_dir, author, title)
+            for i, track in enumerate(tracks):
+                self.write(os.path.join(book_dir, f"track{i}.mp3"), tag + track)
+            books.append(Hoerbuch(author, title, book_dir))
+        # Gleicher erster Track, aber ein anderes Hörbuch
+        other_dir = os.path.join(self.temp_dir, "Erika Muster", "Anders")
+        self.write(os.path.join(other_dir, "track0.mp3"), tracks[0])
+        self.write(os.path.join(other_dir, "track1.mp3"), make_frames(HEADER_MONO_64K, 11))
+        books.append(Hoerbuch("Erika Muster", "Anders", other_dir))
+
+        book_groups, file_groups = find_duplicate_books(books, jobs=2)
+        self.assertEqual([[h.title for h in group] for group in book_groups], [["Buch", "Buch Kopie"]])
+        self.assertEqual(sorted(len(group) for group in file_groups), [2, 2, 3])
+
+    def test_convert_reuses_duplicate_output(self):
+        root = os.path.join(self.temp_dir, "root")
+        target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(target)
+        for i in range(2):
+            track = make_frames(HEADER_MONO_64K, 10, fill=i * 10)
+            self.write(os.path.join(root, "M", "Max Mustermann", "Buch", f"track{i}.mp3"), track)
+            self.write(os.path.join(root, "E", "Erika Muster", "Anderer Titel", f"track{i}.mp3"), make_id3v2() + track)
+        argv = ["convert_audiobooks.py", root, "--dedupe", "--probe-backend", "native",
+                "--no-probe-cache", "--convert-to", target, "-j", "2"]
+        with mock.patch.object(sys, "argv", argv), mock.patch("builtins.print"), \
+                mock.patch.object(convert_audiobooks.ConvertRun, "job_run",
+                                  side_effect=convert_audiobooks.ConvertRun.job_run, autospec=True) as job_run:
+            convert_audiobooks.main()
+        # Nur das Original wird konvertiert, das Duplikat übernimmt dessen Ausgabe
+        self.assertEqual([call.args[1].title for call in job_run.call_args_list], ["Anderer Titel"])
+        original = os.path.join(target, "Erika_Muster", "Anderer_Titel.mp3")
+        duplicate = os.path.join(target, "Max_Mustermann", "Buch.mp3")
+        self.assertEqual(str(ID3(duplicate)["TPE1"]), "Max Mustermann")
+        self.assertEqual(str(ID3(original)["TPE1"]), "Erika Muster")
+        self.assertEqual(full_fingerprint(original), full_fingerprint(duplicate))
+
+if __name__ == "__main__":
+    unittest.main()
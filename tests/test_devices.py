@@ -0,0 +1,107 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from devices import DeviceLimits, device_of, mount_point, parse_caps
+from scheduler import ConvertJob, run_lpt
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeHoerbuch:
+    def __init__(self, title):
+        self.author = "Max Mustermann"
+        self.title = title
+
+class TestDevices(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_device_of_missing_path_and_mount_point(self):
+        missing = os.path.join(self.temp_dir, "noch", "nicht", "da.mp3")
+        self.assertEqual(device_of(missing), os.stat(self.temp_dir).st_dev)
+        mount = mount_point(missing)
+        self.assertEqual(os.stat(mount).st_dev, os.stat(self.temp_dir).st_dev)
+        self.assertTrue(os.path.abspath(self.temp_dir).startswith(mount))
+
+    def test_parse_caps(self):
+        default, caps = parse_caps(["3", f"{self.temp_dir}=1"])
+        self.assertEqual(default, 3)
+        self.assertEqual(caps, {os.stat(self.temp_dir).st_dev: 1})
+        self.assertEqual(parse_caps(None), (None, {}))
+        for spec in (["x"], ["0"], [os.path.join(self.temp_dir, "fehlt") + "=2"]):
+            with self.assertRaises(ValueError):
+                parse_caps(spec)
+
+    def test_caps_and_throughput(self):
+        clock = FakeClock()
+        limits = DeviceLimits("Konvertierung", default_cap=2, caps={1: 1}, clock=clock)
+        self.assertTrue(limits.try_acquire((1, 2)))
+        # Gerät 1 ist ausgelastet, auch wenn auf Gerät 2 noch Platz ist
+        self.assertFalse(limits.try_acquire((1, 2)))
+        self.assertTrue(limits.try_acquire((2,)))
+        self.assertFalse(limits.try_acquire((2,)))
+        clock.now = 2.0
+        limits.release((1, 2), {1: 4 * 1024 * 1024, 2: 1024 * 1024})
+        clock.now = 4.0
+        limits.release((2,), {2: 1024 * 1024})
+        lines = limits.summary()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0], "Konvertierung 1: 1 Jobs, 4.0 MB in 2.0 s (2.0 MB/s, 0.5 Jobs/s), höchstens 1 von 1 gleichzeitig")
+        self.assertEqual(lines[1], "Konvertierung 2: 2 Jobs, 2.0 MB in 4.0 s (0.5 MB/s, 0.5 Jobs/s), höchstens 2 von 2 gleichzeitig")
+
+    def test_acquire_waits_for_release(self):
+        limits = DeviceLimits("Prüfung", default_cap=1)
+        limits.acquire((1,))
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limits.acquire((1,)), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.2))
+        limits.release((1,))
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_run_lpt_respects_device_caps(self):
+        limits = DeviceLimits("Konvertierung", default_cap=1)
+        jobs = []
+        for i in range(6):
+            job = ConvertJob(FakeHoerbuch(str(i)), "encode", 10 - i, 0)
+            # Die drei teuersten Jobs liegen auf Gerät 1, die anderen auf Gerät 2
+            job.devices = (1,) if i < 3 else (2,)
+            jobs.append(job)
+        lock = threading.Lock()
+        running = {1: 0, 2: 0}
+        peaks = {1: 0, 2: 0}
+        overlap = []
+
+        def job_func(h):
+            dev = 1 if int(h.title) < 3 else 2
+            with lock:
+                running[dev] += 1
+                peaks[dev] = max(peaks[dev], running[dev])
+                overlap.append(running[1] and running[2])
+            time.sleep(0.05)
+            with lock:
+                running[dev] -= 1
+            return h.title
+
+        results = list(run_lpt(jobs, job_func, 4, 1, devices=limits))
+        self.assertEqual(sorted(results), [str(i) for i in range(6)])
+        self.assertEqual(peaks, {1: 1, 2: 1})
+        # Jobs von Gerät 2 warten nicht hinter den teureren Jobs von Gerät 1
+        self.assertTrue(any(overlap))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from journal import RunJournal, partial_path, commit_output, segment_prefix
+
+class TestRunJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.author_dir = os.path.join(self.temp_dir, "Max_Mustermann")
+        os.makedirs(self.author_dir)
+        self.output = os.path.join(self.author_dir, "Mein_Buch.mp3")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_partial_path(self):
+        self.assertEqual(partial_path(self.output), os.path.join(self.author_dir, ".Mein_Buch.part.mp3"))
+        self.assertEqual(segment_prefix(partial_path(self.output)), ".segmente_.Mein_Buch.part_")
+
+    def test_commit_output(self):
+        partial = partial_path(self.output)
+        with open(partial, "w") as f:
+            f.write("dummy")
+        commit_output(partial, self.output)
+        self.assertTrue(os.path.exists(self.output))
+        self.assertFalse(os.path.exists(partial))
+
+    def test_recover_unfinished(self):
+        journal = RunJournal(self.temp_dir)
+        done = os.path.join(self.author_dir, "Fertig.mp3")
+        journal.record("started", done)
+        journal.record("completed", done)
+        journal.record("started", self.output)
+        with open(partial_path(self.output), "w") as f:
+            f.write("abgeschnitten")
+        os.makedirs(os.path.join(self.author_dir, segment_prefix(partial_path(self.output)) + "abc"))
+        # Segmente anderer Ausgaben (z. B. eines Workers) gehören zu noch laufenden Jobs
+        other = os.path.join(self.author_dir, segment_prefix(partial_path(self.output, "worker1")) + "def")
+        os.makedirs(other)
+        os.makedirs(os.path.join(self.author_dir, segment_prefix(partial_path(done)) + "ghi"))
+        # Unvollständige letzte Zeile wie nach einem Stromausfall
+        with open(journal.path, "a") as f:
+            f.write('{"event": "sta')
+
+        self.assertEqual(journal.unfinished(), [self.output])
+        self.assertEqual(journal.recover(), [self.output])
+        self.assertFalse(os.path.exists(partial_path(self.output)))
+        self.assertEqual(sorted(os.listdir(self.author_dir)),
+                         sorted([os.path.basename(other), segment_prefix(partial_path(done)) + "ghi"]))
+        self.assertEqual(journal.unfinished(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from manifest import Manifest, UP_TO_DATE, STALE, MISSING, UNKNOWN
+from convert_audiobooks import Hoerbuch
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(self.target)
+        self.book_dir = os.path.join(self.temp_dir, "M", "Max Mustermann", "Mein Buch")
+        os.makedirs(self.book_dir)
+        for name in ("track01.mp3", "track02.mp3"):
+            self.make_file(os.path.join(self.book_dir, name))
+        self.h = Hoerbuch("Max Mustermann", "Mein Buch", self.book_dir)
+        self.output = os.path.join(self.target, "Max_Mustermann", "Mein_Buch.mp3")
+        os.makedirs(os.path.dirname(self.output))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_file(self, path, content="dummy"):
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_status(self):
+        manifest = Manifest(self.target)
+        settings = {"mode": "copy"}
+        self.assertEqual(manifest.status(self.h, self.output), MISSING)
+        self.make_file(self.output)
+        self.assertEqual(manifest.status(self.h, self.output), UNKNOWN)
+        manifest.record(self.h, self.output, settings)
+        manifest.save()
+
+        manifest = Manifest(self.target)
+        self.assertEqual(manifest.status(self.h, self.output, settings), UP_TO_DATE)
+        self.assertEqual(manifest.status(self.h, self.output, {"mode": "encode"}), STALE)
+        # Ersetzte CD-Rip-Datei
+        self.make_file(os.path.join(self.book_dir, "track02.mp3"), "neuer Rip")
+        self.assertEqual(manifest.status(self.h, self.output, settings), STALE)
+
+    def test_changed_output_is_stale(self):
+        manifest = Manifest(self.target)
+        self.make_file(self.output)
+        manifest.record(self.h, self.output, {"mode": "copy"})
+        self.make_file(self.output, "abgeschnitten")
+        self.assertEqual(manifest.status(self.h, self.output), STALE)
+
+if __name__ == "__main__":
+    unittest.main()
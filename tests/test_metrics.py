@@ -0,0 +1,58 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from metrics import MetricsRecorder
+
+class TestMetricsRecorder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_disabled_records_nothing(self):
+        recorder = MetricsRecorder()
+        with recorder.span("probe"):
+            pass
+        self.assertEqual(recorder.events, [])
+
+    def test_exports(self):
+        recorder = MetricsRecorder()
+        recorder.enable()
+        with recorder.span("convert", "Max Mustermann - Mein Buch", mode="copy") as fields:
+            fields["bytes_read"] = 100
+            fields["bytes_written"] = 90
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertEqual(recorder.submit(executor, "probe", lambda x: x * 2, 21).result(), 42)
+
+        jsonl = os.path.join(self.temp_dir, "metrics.jsonl")
+        recorder.write_jsonl(jsonl)
+        with open(jsonl) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([e["stage"] for e in entries], ["convert", "probe_wait"])
+        self.assertEqual(entries[0]["bytes_read"], 100)
+        self.assertAlmostEqual(entries[0]["start"], time.time(), delta=60)
+
+        trace = os.path.join(self.temp_dir, "trace.json")
+        recorder.write_chrome_trace(trace)
+        with open(trace) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertEqual(events[0]["args"]["book"], "Max Mustermann - Mein Buch")
+
+        prom = os.path.join(self.temp_dir, "hoerbuch.prom")
+        recorder.write_prometheus(prom)
+        with open(prom) as f:
+            text = f.read()
+        self.assertIn('hoerbuch_stage_bytes_written_total{stage="convert"} 90', text)
+        self.assertIn('hoerbuch_stage_events_total{stage="probe_wait"} 1', text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from mp3_frames import (
+    parse_frame_header, find_first_frame, read_mp3_info, id3v2_size, audio_end,
+    read_xing, build_xing_frame, join_mp3_files, crc16, decoded_samples, plan_segments, join_segments,
+    audio_range, iter_frames,
+)
+from tests.mp3_testdata import (
+    HEADER_MONO_64K, HEADER_JOINT_128K, make_frames, make_xing_frame, make_id3v2, make_id3v1,
+    make_lame, make_marked_frames, side_info_mono,
+)
+
+class TestMp3Frames(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_parse_frame_header(self):
+        header = parse_frame_header(HEADER_JOINT_128K)
+        self.assertEqual(header.version, 1)
+        self.assertEqual(header.layer, 3)
+        self.assertEqual(header.bitrate, 128000)
+        self.assertEqual(header.sample_rate, 44100)
+        self.assertEqual(header.channel_mode, "joint_stereo")
+        self.assertEqual(header.frame_length, 417)
+        self.assertIsNone(parse_frame_header(b"dumm"))
+
+    def test_tags_are_skipped(self):
+        data = make_id3v2() + make_frames(HEADER_MONO_64K, 3) + make_id3v1()
+        self.assertEqual(id3v2_size(data), 30)
+        self.assertEqual(audio_end(data), len(data) - 128)
+        offset, header = find_first_frame(data, id3v2_size(data), audio_end(data))
+        self.assertEqual(offset, 30)
+        self.assertEqual(header.channel_mode, "mono")
+
+    def test_read_mp3_info_cbr(self):
+        path = self.write("cbr.mp3", make_id3v2() + make_frames(HEADER_MONO_64K, 100) + make_id3v1())
+        info = read_mp3_info(path)
+        self.assertEqual(info["codec_name"], "mp3")
+        self.assertEqual(info["bit_rate"], 64000)
+        self.assertEqual(info["channels"], 1)
+        self.assertEqual(info["channel_layout"], "mono")
+        self.assertAlmostEqual(info["duration"], 100 * 1152 / 44100, delta=0.05)
+
+    def test_read_mp3_info_xing(self):
+        frames = make_frames(HEADER_JOINT_128K, 50)
+        xing = make_xing_frame(HEADER_JOINT_128K, b"Xing", 200, 200 * 209)
+        info = read_mp3_info(self.write("vbr.mp3", xing + frames))
+        self.assertEqual(info["channel_layout"], "stereo")
+        self.assertAlmostEqual(info["duration"], 200 * 1152 / 44100)
+        self.assertEqual(info["bit_rate"] // 1000, 64)
+
+    def test_read_mp3_info_not_mp3(self):
+        self.assertIsNone(read_mp3_info(self.write("dummy.mp3", b"dummy")))
+        self.assertIsNone(read_mp3_info(self.write("empty.mp3", b"")))
+
+    def test_join_mp3_files(self):
+        first = build_xing_frame(HEADER_MONO_64K, 10, 0, bytes(100), False, make_lame(576, 100))
+        last = build_xing_frame(HEADER_MONO_64K, 20, 0, bytes(100), False, make_lame(576, 900))
+        a = self.write("a.mp3", make_id3v2() + first + make_frames(HEADER_MONO_64K, 10) + make_id3v1())
+        b = self.write("b.mp3", last + make_frames(HEADER_MONO_64K, 20, fill=10))
+        out = os.path.join(self.temp_dir, "out.mp3")
+        self.assertEqual(join_mp3_files([a, b], out), 30)
+
+        with open(out, "rb") as f:
+            data = f.read()
+        offset, header = find_first_frame(data)
+        self.assertEqual(offset, 0)
+        xing = read_xing(data, offset, header)
+        self.assertEqual(xing["tag"], "Info")
+        self.assertEqual(xing["frames"], 30)
+        self.assertEqual(xing["bytes"], len(data))
+        self.assertEqual((xing["enc_delay"], xing["enc_padding"]), (576, 900))
+        self.assertEqual(xing["toc"][0], header.frame_length * 256 // len(data))
+        self.assertEqual(xing["toc"][50], (header.frame_length + 15 * 208) * 256 // len(data))
+        self.assertEqual(crc16(data[:offset + 4 + 17 + 120 + 34]), int.from_bytes(xing["lame"][34:36], "big"))
+        # Audioframes wurden unverändert und in Reihenfolge übernommen
+        self.assertEqual(data[header.frame_length:], make_frames(HEADER_MONO_64K, 30))
+        self.assertAlmostEqual(read_mp3_info(out)["duration"], 30 * 1152 / 44100)
+
+    def test_join_mp3_files_rejects_different_format(self):
+        a = self.write("a.mp3", make_frames(HEADER_MONO_64K, 5))
+        b = self.write("b.mp3", make_frames(HEADER_JOINT_128K, 5))
+        with self.assertRaises(ValueError):
+            join_mp3_files([a, b], os.path.join(self.temp_dir, "out.mp3"))
+
+    def test_decoded_samples_and_plan_segments(self):
+        lame = build_xing_frame(HEADER_MONO_64K, 100, 0, bytes(100), False, make_lame(576, 900))
+        self.assertEqual(decoded_samples(self.write("lame.mp3", lame + make_frames(HEADER_MONO_64K, 100))),
+                         (100 * 1152 - 1476, 44100))
+        self.assertEqual(decoded_samples(self.write("plain.mp3", make_frames(HEADER_MONO_64K, 7))), (7 * 1152, 44100))
+
+        first, second = plan_segments([50000, 60000, 70000, 80000], [2, 2], 1152)
+        # Das erste Segment reicht über das Schnittfenster (Frames 95 bis 126) hinaus
+        self.assertEqual(first, (0, 3, None, (95 + 32 + 4) * 1152, 0, None))
+        # Das zweite beginnt 16 Frames vor der Gruppengrenze auf einer Framegrenze
+        self.assertEqual(second, (1, 4, 79 * 1152 - 50000, None, 79, (95, 127)))
+        with self.assertRaises(ValueError):
+            plan_segments([50000, 10000], [1, 1], 1152)
+
+    def test_join_segments(self):
+        lo = 30
+        # Segment A: Hauptdaten von 100 Bytes ohne Bit-Reservoir, nur Frame lo-1 ist voll (kein Platz frei)
+        a_side = lambda i: side_info_mono(0, 187 if i == lo - 1 else 100)
+        a = build_xing_frame(HEADER_MONO_64K, 60, 0, bytes(100), False, make_lame(576, 0)) + \
+            make_marked_frames(HEADER_MONO_64K, 0, 60, a_side)
+        # Segment B beginnt mit dem globalen Frame 14, jeder Frame liest 40 Bytes aus dem Reservoir
+        b = build_xing_frame(HEADER_MONO_64K, 50, 0, bytes(100), False, make_lame(576, 700)) + \
+            make_marked_frames(HEADER_MONO_64K, 100 + 14, 50, lambda i: side_info_mono(40, 187))
+        paths = [self.write("a.mp3", a), self.write("b.mp3", b)]
+        out = os.path.join(self.temp_dir, "out.mp3")
+        self.assertEqual(join_segments(paths, out, [0, 14], [None, (lo, lo + 10)]), 64)
+
+        with open(out, "rb") as f:
+            data = f.read()
+        start, end, header, xing = audio_range(data)
+        self.assertEqual((xing["frames"], xing["enc_delay"], xing["enc_padding"]), (64, 576, 700))
+        frames = [data[offset + 21:offset + header.frame_length] for offset, _ in iter_frames(data, start, end)]
+        # Geschnitten wird erst bei lo+1, jeder Frame kommt genau einmal vor
+        self.assertEqual([frame[0] for frame in frames], list(range(lo + 1)) + [100 + g for g in range(lo + 1, 64)])
+        # Die Reservoir-Bytes des ersten Frames aus B stehen am Ende des letzten Frames aus A
+        self.assertEqual(frames[lo][-40:], bytes([100 + lo]) * 40)
+        self.assertEqual(frames[lo][:-40], bytes([lo]) * (187 - 40))
+        with self.assertRaises(ValueError):
+            join_segments(paths, out, [0, 14], [None, (lo, lo + 1)])
+
+if __name__ == "__main__":
+    unittest.main()
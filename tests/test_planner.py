@@ -0,0 +1,88 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import planner
+import manifest as manifest_mod
+from planner import Calibration, calibrate, plan_book, fit_to_free_space
+from scheduler import ENCODE_REALTIME_FACTOR
+
+class FakeHoerbuch:
+    def __init__(self, title, avg_bitrate, duration, size, files=("a.mp3",)):
+        self.author = "Max Mustermann"
+        self.title = title
+        self.avg_bitrate = avg_bitrate
+        self.duration = duration
+        self.size = size
+        self.mp3_files = [os.path.join("/hoerbuecher", title, f) for f in files]
+
+    def needs_reencoding(self):
+        return self.avg_bitrate >= 70
+
+    def source_bytes(self):
+        return self.size
+
+    def iter_mp3_files(self):
+        return iter(self.mp3_files)
+
+    def num_mp3_files(self):
+        return len(self.mp3_files)
+
+class FakeManifest:
+    def __init__(self, entries):
+        self.entries = entries
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_plan_book(self):
+        calibration = Calibration()
+        encode = plan_book(FakeHoerbuch("a", 128, 3600.0, 57600000, ("1.mp3", "2.mp3")), None,
+                           manifest_mod.MISSING, 2, calibration)
+        self.assertEqual(encode.job.kind, "encode")
+        self.assertEqual(encode.output_bytes, 3600 * 8000)
+        # Mit Segmenten liegt die Ausgabe bis zum Zusammenfügen doppelt im Zielverzeichnis
+        self.assertEqual(encode.target_temp_bytes, encode.output_bytes)
+        self.assertGreater(encode.temp_bytes, 0)
+        self.assertAlmostEqual(encode.job.cost, 3600.0 / ENCODE_REALTIME_FACTOR / 2)
+
+        copy = plan_book(FakeHoerbuch("b", 64, 3600.0, 28800000), None, manifest_mod.MISSING, 2, calibration)
+        self.assertEqual((copy.job.kind, copy.output_bytes, copy.target_temp_bytes, copy.temp_bytes),
+                         ("copy", 28800000, 0, 0))
+
+    def test_calibrate(self):
+        entries = {
+            f"{i}.mp3": {"settings": {"mode": "encode"}, "seconds": 100.0, "duration": 5000.0,
+                         "output": [40000000, 0], "source_bytes": 80000000}
+            for i in range(3)
+        }
+        entries["copy.mp3"] = {"settings": {"mode": "copy"}, "seconds": 1.0, "duration": 10.0,
+                               "output": [1000, 0], "source_bytes": 1000}
+        calibration = calibrate(FakeManifest(entries))
+        self.assertAlmostEqual(calibration.encode_realtime_factor, 50.0)
+        self.assertAlmostEqual(calibration.encode_output_bytes_per_second, 8000.0)
+        self.assertEqual(calibration.encode_samples, 3)
+        # Zu wenige Messungen: Standardwert bleibt
+        self.assertEqual(calibration.copy_samples, 0)
+        self.assertEqual(calibration.copy_bytes_per_second, Calibration().copy_bytes_per_second)
+
+    def test_fit_to_free_space(self):
+        calibration = Calibration()
+        plans = [plan_book(FakeHoerbuch(str(i), 64, 0.0, size), None, manifest_mod.MISSING, 1, calibration)
+                 for i, size in enumerate((600, 300, 200))]
+        plans.append(plan_book(FakeHoerbuch("fertig", 64, 0.0, 10000), None, manifest_mod.UP_TO_DATE, 1, calibration))
+        with mock.patch.object(planner, "free_bytes", return_value=900):
+            fitting, refused = fit_to_free_space(plans, self.temp_dir, self.temp_dir, reserve=0)
+        self.assertEqual([p.hoerbuch.title for p in fitting], ["fertig", "0", "1"])
+        self.assertEqual([p.hoerbuch.title for p in refused], ["2"])
+
+if __name__ == "__main__":
+    unittest.main()
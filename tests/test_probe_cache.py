@@ -0,0 +1,99 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from probe_cache import ProbeCache
+from convert_audiobooks import Hoerbuch
+
+INFO = {
+    'codec_name': 'mp3',
+    'bit_rate': 128000,
+    'channels': 2,
+    'channel_layout': 'stereo',
+    'duration': 12.5,
+}
+
+class TestProbeCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, "cache", "probe.sqlite3")
+        self.mp3 = os.path.join(self.temp_dir, "track01.mp3")
+        with open(self.mp3, "w") as f:
+            f.write("dummy")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_probe_only_once(self):
+        calls = []
+        def probe_func(path):
+            calls.append(path)
+            return dict(INFO)
+        cache = ProbeCache(self.cache_path)
+        self.assertEqual(cache.probe(self.mp3, probe_func), INFO)
+        self.assertEqual(cache.probe(self.mp3, probe_func), INFO)
+        cache.close()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_persistent_and_invalidated_on_change(self):
+        cache = ProbeCache(self.cache_path)
+        cache.put(self.mp3, INFO)
+        cache.close()
+
+        cache = ProbeCache(self.cache_path)
+        self.assertEqual(cache.get(self.mp3), INFO)
+        with open(self.mp3, "a") as f:
+            f.write("more")
+        self.assertIsNone(cache.get(self.mp3))
+        cache.close()
+
+    def test_commits_without_close(self):
+        other = os.path.join(self.temp_dir, "track02.mp3")
+        with open(other, "w") as f:
+            f.write("dummy")
+        clock = [0.0]
+        cache = ProbeCache(self.cache_path, commit_every=2, commit_interval=10.0, clock=lambda: clock[0])
+        reader = ProbeCache(self.cache_path)
+        cache.put(self.mp3, INFO)
+        self.assertIsNone(reader.get(self.mp3))
+        # Nach commit_every Einträgen sind sie für andere Verbindungen sichtbar, ohne close()
+        cache.put(other, INFO)
+        self.assertEqual(reader.get(self.mp3), INFO)
+        cache.put(self.mp3, dict(INFO, duration=1.0))
+        clock[0] = 11.0
+        cache.put(other, dict(INFO, duration=2.0))
+        self.assertEqual(reader.get(other)["duration"], 2.0)
+        reader.close()
+        cache.close()
+
+    def test_rebuild_discards_entries(self):
+        cache = ProbeCache(self.cache_path)
+        cache.put(self.mp3, INFO)
+        cache.close()
+        cache = ProbeCache(self.cache_path, rebuild=True)
+        self.assertIsNone(cache.get(self.mp3))
+        cache.close()
+
+    def test_check_mp3_properties_uses_cache(self):
+        book_dir = os.path.join(self.temp_dir, "Max Mustermann", "Mein Buch")
+        os.makedirs(book_dir)
+        mp3 = os.path.join(book_dir, "track01.mp3")
+        with open(mp3, "w") as f:
+            f.write("dummy")
+        cache = ProbeCache(self.cache_path)
+        cache.put(mp3, INFO)
+        h = Hoerbuch("Max Mustermann", "Mein Buch", book_dir)
+        errors = h.check_mp3_properties(cache)
+        cache.close()
+        self.assertEqual(errors, [])
+        self.assertEqual(h.avg_bitrate, 128)
+        self.assertEqual(h.channel_layout, "stereo")
+        self.assertEqual(h.duration, 12.5)
+        self.assertEqual(cache.hits, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import sys
+import os
+import time
+import shutil
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import process_engine
+from process_engine import ProcessEngine, ProcessTimeout, ProcessCancelled
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+class TestProcessEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = ProcessEngine()
+
+    def test_stdout_and_stderr_tail(self):
+        result = self.engine.run(python(
+            "import sys\n"
+            "print('{\"ok\": true}')\n"
+            "for i in range(1000): print(f'Zeile {i}', file=sys.stderr)\n"
+            "sys.exit(3)"), capture_stdout=True)
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.stdout.strip(), b'{"ok": true}')
+        lines = result.stderr_tail.splitlines()
+        self.assertEqual(len(lines), process_engine.STDERR_TAIL_LINES)
+        self.assertEqual(lines[-1], "Zeile 999")
+
+    def test_progress(self):
+        progress = []
+        self.engine.run(python(
+            "print('out_time_us=1000'); print('progress=continue')\n"
+            "print('out_time_us=2000'); print('progress=end')"), on_progress=progress.append)
+        self.assertEqual([(p["out_time_us"], p["progress"]) for p in progress],
+                         [("1000", "continue"), ("2000", "end")])
+
+    def test_stall_timeout_kills_process(self):
+        self.engine.configure("encode", 1, stall_timeout=0.5)
+        start = time.monotonic()
+        with self.assertRaises(ProcessTimeout) as cm:
+            self.engine.run(python(
+                "import sys, time\n"
+                "print('progress=continue', flush=True)\n"
+                "print('Lese beschädigte Datei', file=sys.stderr, flush=True)\n"
+                "time.sleep(60)"), "encode")
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertIn("ohne Fortschritt", str(cm.exception))
+        self.assertIn("Lese beschädigte Datei", str(cm.exception))
+        self.assertEqual(self.engine.summary()[0].split(":")[0], "encode")
+        self.assertIn("1 Zeitüberschreitungen", self.engine.summary()[0])
+
+    def test_total_timeout(self):
+        self.engine.configure("probe", 1, timeout=0.5)
+        with self.assertRaises(ProcessTimeout):
+            # Gibt ständig etwas aus, hängt also nicht, wird aber zu lang
+            self.engine.run(python("import time\nwhile True:\n    print('.', flush=True)\n    time.sleep(0.05)"), "probe")
+
+    def test_semaphore_limits_concurrency(self):
+        self.engine.configure("encode", 2)
+        start = time.monotonic()
+        futures = [self.engine.submit(python("import time; time.sleep(0.3)"), "encode") for _ in range(6)]
+        for future in futures:
+            self.assertEqual(future.result().returncode, 0)
+        self.assertGreaterEqual(time.monotonic() - start, 0.85)
+        self.assertIn("6 Prozesse, höchstens 2 von 2 gleichzeitig", self.engine.summary()[0])
+
+    @unittest.skipUnless(shutil.which("true"), "true nicht vorhanden")
+    def test_many_pending_jobs_without_threads(self):
+        self.engine.configure("probe", 8)
+        threads = threading.active_count()
+        futures = [self.engine.submit([shutil.which("true")], "probe") for _ in range(300)]
+        # Wartende Jobs sind Koroutinen: hinzu kommen nur die Event-Loop und ggf. je laufendem
+        # Prozess ein Thread, der auf sein Ende wartet (ThreadedChildWatcher)
+        self.assertLessEqual(threading.active_count(), threads + 1 + 8)
+        self.assertEqual({future.result().returncode for future in futures}, {0})
+
+    def test_cancel_all(self):
+        future = self.engine.submit(python("import time; time.sleep(60)"))
+        time.sleep(0.3)
+        self.engine.cancel_all()
+        with self.assertRaises(ProcessCancelled):
+            future.result(timeout=10)
+        with self.assertRaises(ProcessCancelled):
+            self.engine.run(python("pass"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import convert_audiobooks
+import profiles
+from convert_audiobooks import Hoerbuch, output_path_for, ffmetadata
+from profiles import Profile, ProfileError, load_profiles, DEFAULT_PROFILE
+from planner import calibrate
+from tests.mp3_testdata import HEADER_MONO_64K, make_frames
+
+class FakeManifest:
+    def __init__(self, entries):
+        self.entries = entries
+
+class TestProfiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_profiles(self, data):
+        path = os.path.join(self.temp_dir, "profiles.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return path
+
+    def test_load_profiles(self):
+        path = self.write_profiles({
+            "sprache": {"codec": "libopus", "container": "opus", "bitrate": "24k", "channels": 1,
+                        "sample_rate": 48000, "options": {"application": "voip"}},
+            "mp3": {"codec": "libmp3lame", "container": "mp3", "quality": 7, "copy_below": 60},
+        })
+        available = load_profiles(path)
+        self.assertIn("m4b", available)
+        self.assertEqual(available["sprache"].extension, ".opus")
+        self.assertEqual(available["mp3"].quality, 7)
+        self.assertEqual(set(load_profiles(os.path.join(self.temp_dir, "fehlt.json"))), set(profiles.BUILTIN_PROFILES))
+        for entry in ({"container": "wav", "bitrate": "64k"}, {"codec": "aac", "container": "m4b"},
+                      {"codec": "aac", "container": "m4b", "bitrate": "64k", "copy_below": 70},
+                      {"codec": "aac", "container": "m4b", "bitrate": "64k", "bitrat": "32k"}):
+            with self.subTest(entry=entry):
+                with self.assertRaises(ProfileError):
+                    load_profiles(self.write_profiles({"kaputt": entry}))
+
+    def test_output_args_and_settings(self):
+        # Das Standardprofil erzeugt dieselben Manifest-Einträge wie vor den Profilen
+        self.assertEqual(DEFAULT_PROFILE.settings(2),
+                         {"mode": "encode", "acodec": "libmp3lame", "audio_bitrate": "64k", "ac": 2})
+        self.assertEqual(DEFAULT_PROFILE.output_args(1),
+                         {"acodec": "libmp3lame", "ac": 1, "audio_bitrate": "64k", "write_xing": 1})
+        he_aac = Profile("he", codec="libfdk_aac", container="m4b", bitrate="32k", channels=1,
+                         options={"profile:a": "aac_he"})
+        self.assertEqual(he_aac.output_args(2, threads=4),
+                         {"acodec": "libfdk_aac", "ac": 1, "audio_bitrate": "32k", "threads": 4,
+                          "format": "ipod", "profile:a": "aac_he"})
+        self.assertEqual(he_aac.settings(2)["container"], "m4b")
+        self.assertEqual(he_aac.output_bytes_per_second(), 4000.0)
+        self.assertEqual(he_aac.describe(), "libfdk_aac, ca. 32 kBit/s, mono, .m4b")
+
+    def test_profile_decides_reencoding_and_output_path(self):
+        h = Hoerbuch("Max Mustermann", "Mein Buch", self.temp_dir)
+        h.avg_bitrate = 32
+        opus = profiles.BUILTIN_PROFILES["opus"]
+        self.assertFalse(h.needs_reencoding())
+        self.assertTrue(h.needs_reencoding(opus))
+        self.assertEqual(h.conversion_settings(), {"mode": "copy"})
+        self.assertEqual(output_path_for(h, "/ziel", opus), os.path.join("/ziel", "Max_Mustermann", "Mein_Buch.opus"))
+        with mock.patch.object(convert_audiobooks, "output_profile", opus):
+            self.assertTrue(h.needs_reencoding())
+            self.assertTrue(output_path_for(h, "/ziel").endswith(".opus"))
+
+    def test_ffmetadata(self):
+        text = ffmetadata({"artist": "A=B", "title": "Teil 1; Teil 2"}, [("Kapitel #1", 0, 1500), ("Ende", 1500, 3000)])
+        lines = text.splitlines()
+        self.assertEqual(lines[:3], [";FFMETADATA1", "artist=A\\=B", "title=Teil 1\\; Teil 2"])
+        self.assertEqual(lines[3:8], ["[CHAPTER]", "TIMEBASE=1/1000", "START=0", "END=1500", "title=Kapitel \\#1"])
+        self.assertEqual(lines.count("[CHAPTER]"), 2)
+
+    def test_convert_with_container_profile(self):
+        book_dir = os.path.join(self.temp_dir, "Max Mustermann", "Mein Buch")
+        os.makedirs(book_dir)
+        for i in range(2):
+            with open(os.path.join(book_dir, f"track{i}.mp3"), "wb") as f:
+                f.write(make_frames(HEADER_MONO_64K, 10))
+        h = Hoerbuch("Max Mustermann", "Mein Buch", book_dir)
+        h.avg_bitrate = 64
+        h.channel_layout = "mono"
+        h.file_durations = (1.5, 2.5)
+        calls = []
+
+        def fake_run_ffmpeg(stream, resource='encode', on_progress=None):
+            args = stream.compile()
+            metadata_file = args[args.index("ffmetadata") + 2]
+            with open(metadata_file, encoding="utf-8") as f:
+                calls.append((args, resource, f.read()))
+
+        profile = profiles.BUILTIN_PROFILES["m4b"]
+        output = os.path.join(self.temp_dir, "out.m4b")
+        with mock.patch.object(convert_audiobooks, "run_ffmpeg", fake_run_ffmpeg), \
+                mock.patch.object(convert_audiobooks, "encoder_supports_threads", return_value=True), \
+                mock.patch("builtins.print"):
+            self.assertEqual(h.convert(output, segment_jobs=4, profile=profile), [])
+        # Ein einziger ffmpeg-Aufruf (keine MP3-Segmente), Tags und Kapitel aus der FFMETADATA-Datei
+        self.assertEqual(len(calls), 1)
+        args, resource, metadata = calls[0]
+        self.assertEqual(resource, "encode")
+        self.assertEqual(args[-1], output)
+        for option, value in (("-acodec", "aac"), ("-f", "ipod"), ("-map", "0:a"), ("-map_chapters", "1"),
+                              ("-map_metadata", "1"), ("-threads", str(convert_audiobooks.encoder_threads))):
+            self.assertIn(value, [args[i + 1] for i, arg in enumerate(args) if arg == option])
+        self.assertIn("artist=Max Mustermann", metadata)
+        self.assertIn("START=1500", metadata)
+        self.assertIn("END=4000", metadata)
+
+    def test_calibrate_uses_matching_profile(self):
+        entries = {
+            f"{i}.mp3": {"settings": DEFAULT_PROFILE.settings(1), "seconds": 100.0, "duration": 5000.0,
+                         "output": [40000000, 0], "source_bytes": 80000000}
+            for i in range(3)
+        }
+        calibration = calibrate(FakeManifest(entries), DEFAULT_PROFILE)
+        self.assertEqual(calibration.encode_samples, 3)
+        # Messungen eines anderen Profils zählen nicht, die Ausgabegröße folgt der Bitrate
+        opus = calibrate(FakeManifest(entries), profiles.BUILTIN_PROFILES["opus"])
+        self.assertEqual(opus.encode_samples, 0)
+        self.assertEqual(opus.encode_output_bytes_per_second, 4000.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import sys
+import os
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scheduler import ConvertJob, estimate_job, lpt_order, predict_makespan, run_lpt
+
+class FakeHoerbuch:
+    def __init__(self, title, avg_bitrate, duration, size):
+        self.author = "Max Mustermann"
+        self.title = title
+        self.avg_bitrate = avg_bitrate
+        self.duration = duration
+        self.size = size
+
+    def needs_reencoding(self):
+        return self.avg_bitrate >= 70
+
+    def source_bytes(self):
+        return self.size
+
+class TestScheduler(unittest.TestCase):
+    def test_estimate_job(self):
+        encode = estimate_job(FakeHoerbuch("a", 128, 3600.0, 57600000))
+        copy = estimate_job(FakeHoerbuch("b", 64, 3600.0, 28800000))
+        self.assertEqual(encode.kind, "encode")
+        self.assertEqual(copy.kind, "copy")
+        self.assertGreater(encode.cost, copy.cost)
+        self.assertAlmostEqual(estimate_job(FakeHoerbuch("c", 128, 3600.0, 0), segment_jobs=4).cost, encode.cost / 4)
+
+    def test_lpt_makespan(self):
+        jobs = [ConvertJob(None, "encode", cost, 0) for cost in (3, 3, 2, 2, 2)]
+        self.assertEqual([job.cost for job in lpt_order(jobs)], [3, 3, 2, 2, 2])
+        self.assertEqual(predict_makespan(jobs, 2), 7)
+        self.assertEqual(predict_makespan([], 2), 0)
+
+    def test_run_lpt_separate_pools(self):
+        books = [FakeHoerbuch(str(i), 128 if i % 2 else 64, float(i), 10 * i) for i in range(6)]
+        jobs = [estimate_job(h) for h in books]
+        threads = {}
+        def job_func(h):
+            threads[h.title] = threading.current_thread().name
+            return h.title
+        results = list(run_lpt(jobs, job_func, 2, 1))
+        self.assertEqual(sorted(results), [str(i) for i in range(6)])
+        copy_threads = {threads[h.title] for h in books if h.avg_bitrate < 70}
+        encode_threads = {threads[h.title] for h in books if h.avg_bitrate >= 70}
+        self.assertTrue(copy_threads.isdisjoint(encode_threads))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import convert_audiobooks
+from convert_audiobooks import Hoerbuch, ConvertRun
+from staging import Stager
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Bedingung nicht erfüllt")
+        time.sleep(0.01)
+
+class TestStager(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.stage_dir = os.path.join(self.temp_dir, "staging")
+        os.makedirs(self.stage_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_book(self, title, sizes):
+        path = os.path.join(self.temp_dir, "quelle", title)
+        files = []
+        for i, size in enumerate(sizes):
+            rel = os.path.join(f"CD{i + 1}", "track.mp3")
+            os.makedirs(os.path.dirname(os.path.join(path, rel)), exist_ok=True)
+            with open(os.path.join(path, rel), "wb") as f:
+                f.write(bytes([i]) * size)
+            files.append(rel)
+        h = Hoerbuch("Max Mustermann", title, path)
+        h._files = tuple(files)
+        return h
+
+    def test_acquire_copies_files_and_release_removes_them(self):
+        stager = Stager(self.stage_dir, 10000)
+        try:
+            h = self.make_book("Eins", [100, 200])
+            staged = stager.acquire(h)
+            self.assertTrue(staged.startswith(stager.root))
+            for rel in h.relative_mp3_files:
+                with open(os.path.join(staged, rel), "rb") as a, open(os.path.join(h.path, rel), "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+            self.assertEqual(stager.used_bytes, 300)
+            stager.release(h)
+            self.assertFalse(os.path.exists(staged))
+            self.assertEqual(stager.used_bytes, 0)
+        finally:
+            stager.close()
+        self.assertFalse(os.path.exists(stager.root))
+        self.assertIn("1 Hörbücher", stager.summary())
+
+    def test_prefetch_depth_and_size_limit(self):
+        stager = Stager(self.stage_dir, 1000, prefetch_depth=2)
+        try:
+            books = [self.make_book(f"Buch{i}", [300]) for i in range(4)]
+            huge = self.make_book("Riesig", [2000])
+            stager.schedule(books + [huge])
+            wait_until(lambda: stager.staged_books == 2)
+            time.sleep(0.2)
+            # Nicht mehr als prefetch_depth Hörbücher liegen unbenutzt bereit
+            self.assertEqual(stager.staged_books, 2)
+            self.assertIsNotNone(stager.acquire(books[0]))
+            wait_until(lambda: stager.staged_books == 3)
+            # Buch3 passt erst, wenn Buch0 fertig ist (4 * 300 > 1000)
+            self.assertIsNotNone(stager.acquire(books[1]))
+            time.sleep(0.2)
+            self.assertEqual(stager.staged_books, 3)
+            stager.release(books[0])
+            wait_until(lambda: stager.staged_books == 4)
+            self.assertLessEqual(stager.used_bytes, 1000)
+            # Größer als das Staging-Verzeichnis: direkt von der Quelle lesen
+            self.assertIsNone(stager.acquire(huge))
+        finally:
+            stager.close()
+
+    def test_requested_book_evicts_unused_prefetch(self):
+        stager = Stager(self.stage_dir, 1000, prefetch_depth=2)
+        try:
+            first, second = self.make_book("Eins", [400]), self.make_book("Zwei", [400])
+            stager.schedule([first, second])
+            wait_until(lambda: stager.staged_books == 2)
+            # Ein anderes Hörbuch wird zuerst gebraucht und passt nur ohne eine der Vorab-Kopien
+            other = self.make_book("Drei", [400])
+            self.assertIsNotNone(stager.acquire(other))
+            self.assertLessEqual(stager.used_bytes, 1000)
+            self.assertIsNotNone(stager.acquire(second))
+            stager.release(other)
+            self.assertIsNotNone(stager.acquire(first))
+        finally:
+            stager.close()
+
+    def test_job_run_converts_staged_copy(self):
+        target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(target)
+        stager = Stager(self.stage_dir, 10000)
+        h = self.make_book("Eins", [100, 200])
+        h.avg_bitrate = 128
+        h.channel_layout = "mono"
+        h.duration = 10.0
+        h.file_durations = (4.0, 6.0)
+        converted_from = []
+
+        def fake_convert(book, output_path, segment_jobs=1, chapters='file'):
+            converted_from.append((book.path, [os.path.exists(mp3) for mp3 in book.mp3_files], book.duration))
+            with open(output_path, "wb") as f:
+                f.write(b"x")
+            return []
+
+        try:
+            run = ConvertRun(target, stager=stager)
+            with mock.patch.object(Hoerbuch, "convert", fake_convert), mock.patch("builtins.print"):
+                _, filepath, errors = run.job_run(h)
+            self.assertEqual(errors, [])
+            path, exists, duration = converted_from[0]
+            self.assertTrue(path.startswith(stager.root))
+            self.assertEqual(exists, [True, True])
+            self.assertEqual(duration, 10.0)
+            # Die Kopie ist nach dem Job entfernt, das Manifest verweist auf die Quelle
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(run.manifest.status(h, filepath), convert_audiobooks.manifest_mod.UP_TO_DATE)
+        finally:
+            stager.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import convert_audiobooks
+from watcher import book_key, BookSettler, PollingWatcher, InotifyWatcher
+from tests.mp3_testdata import HEADER_MONO_64K, make_frames
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def inotify_available():
+    try:
+        InotifyWatcher(tempfile.gettempdir()).close()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, "root")
+        os.makedirs(os.path.join(self.root, "M", "Max Mustermann"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, path, data=b"dummy"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def collect(self, source, until, timeout=5.0):
+        keys = set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not until <= keys:
+            for rel_path in source.read_changes(0.1):
+                key = book_key(rel_path)
+                if key is not None:
+                    keys.add(key)
+        return keys
+
+    def test_book_key(self):
+        self.assertIsNone(book_key("."))
+        self.assertIsNone(book_key(os.path.join("M", "Max Mustermann")))
+        self.assertEqual(book_key(os.path.join("M", "Max Mustermann", "Buch", "CD1", "track1.mp3")),
+                         ("M", "Max Mustermann", "Buch"))
+
+    def test_settler(self):
+        clock = FakeClock()
+        book = os.path.join(self.root, "M", "Max Mustermann", "Buch")
+        self.write(os.path.join(book, "track1.mp3"))
+        settler = BookSettler(self.root, 10.0, check_interval=1.0, clock=clock)
+        settler.mark_path(os.path.join("M", "Max Mustermann", "Buch", "track1.mp3"))
+        self.assertEqual(settler.due(), [])
+        clock.now = 5.0
+        # Datei wächst ohne Ereignis: die Wartezeit beginnt neu
+        self.write(os.path.join(book, "track1.mp3"), b"dummy, aber laenger")
+        self.assertEqual(settler.due(), [])
+        clock.now = 12.0
+        self.assertEqual(settler.due(), [])
+        self.assertAlmostEqual(settler.timeout(60.0), 1.0)
+        clock.now = 15.0
+        self.assertEqual(settler.due(), [("M", "Max Mustermann", "Buch")])
+        self.assertEqual(len(settler), 0)
+
+    def test_polling_watcher(self):
+        source = PollingWatcher(self.root, interval=0.05)
+        self.write(os.path.join(self.root, "M", "Max Mustermann", "Buch", "CD1", "track1.mp3"))
+        # Ein ganzes Author-Verzeichnis wird auf einmal hineinverschoben
+        self.write(os.path.join(self.temp_dir, "Erika Muster", "Anders", "track1.mp3"))
+        os.makedirs(os.path.join(self.root, "E"))
+        shutil.move(os.path.join(self.temp_dir, "Erika Muster"), os.path.join(self.root, "E"))
+        expected = {("M", "Max Mustermann", "Buch"), ("E", "Erika Muster", "Anders")}
+        self.assertEqual(self.collect(source, expected), expected)
+
+    @unittest.skipUnless(inotify_available(), "inotify nicht verfügbar")
+    def test_inotify_watcher(self):
+        source = InotifyWatcher(self.root)
+        try:
+            self.write(os.path.join(self.root, "M", "Max Mustermann", "Buch", "CD1", "track1.mp3"))
+            self.write(os.path.join(self.temp_dir, "Erika Muster", "Anders", "track1.mp3"))
+            os.makedirs(os.path.join(self.root, "E"))
+            shutil.move(os.path.join(self.temp_dir, "Erika Muster"), os.path.join(self.root, "E"))
+            expected = {("M", "Max Mustermann", "Buch"), ("E", "Erika Muster", "Anders")}
+            self.assertEqual(self.collect(source, expected), expected)
+            # Auch Verzeichnisse im hineinverschobenen Baum werden überwacht
+            self.write(os.path.join(self.root, "E", "Erika Muster", "Anders", "track2.mp3"))
+            self.assertEqual(self.collect(source, {("E", "Erika Muster", "Anders")}),
+                             {("E", "Erika Muster", "Anders")})
+        finally:
+            source.close()
+
+    def test_run_watch_converts_settled_books(self):
+        target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(target)
+        args = SimpleNamespace(watch_backend="poll", poll_interval=0.05, settle=0.2, convert_to=target,
+                               segment_jobs=1, chapters="file", probe_backend="native",
+                               no_probe_cache=True, probe_cache=None, rebuild_probe_cache=False,
+                               stage_dir=None)
+        stop = threading.Event()
+        with mock.patch("builtins.print"):
+            thread = threading.Thread(target=convert_audiobooks.run_watch, args=(self.root, args, 2, 2, stop))
+            thread.start()
+            try:
+                time.sleep(0.1)
+                for i in range(2):
+                    self.write(os.path.join(self.root, "M", "Max Mustermann", "Buch", f"track{i}.mp3"),
+                               make_frames(HEADER_MONO_64K, 10))
+                # Verletzt die Strukturregeln und wird nicht konvertiert
+                self.write(os.path.join(self.root, "M", "Max Mustermann", "Max Buch", "track1.mp3"),
+                           make_frames(HEADER_MONO_64K, 10))
+                output = os.path.join(target, "Max_Mustermann", "Buch.mp3")
+                deadline = time.monotonic() + 10
+                while not os.path.exists(output) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+            finally:
+                stop.set()
+                thread.join()
+        self.assertTrue(os.path.exists(output))
+        self.assertEqual(os.listdir(os.path.join(target, "Max_Mustermann")), ["Buch.mp3"])
+
+if __name__ == "__main__":
+    unittest.main()
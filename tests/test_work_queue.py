@@ -0,0 +1,170 @@
+import sys
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import convert_audiobooks
+import manifest as manifest_mod
+import profiles
+from journal import partial_path, segment_prefix
+from work_queue import WorkQueue
+from tests.mp3_testdata import HEADER_MONO_64K, make_frames
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "convert_audiobooks.py")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue_dir = os.path.join(self.temp_dir, "queue")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_claim_heartbeat_and_takeover(self):
+        clock = FakeClock()
+        coordinator = WorkQueue(self.queue_dir)
+        first = coordinator.enqueue(0, {"name": "gross"})
+        second = coordinator.enqueue(1, {"name": "klein"})
+        coordinator.mark_complete()
+        a = WorkQueue(self.queue_dir, worker="a", lease_seconds=10, clock=clock)
+        b = WorkQueue(self.queue_dir, worker="b", lease_seconds=10, clock=clock)
+
+        claim_a = a.claim()
+        self.assertEqual(claim_a.data, {"name": "gross"})
+        self.assertEqual(b.claim().data, {"name": "klein"})
+        self.assertIsNone(b.claim())
+
+        # a sendet Heartbeats: keine Übernahme
+        clock.now = 8.0
+        os.utime(claim_a.lease.path, ns=(1, 1))
+        self.assertIsNone(b.claim())
+        # a ist ausgefallen: nach lease_seconds ohne Heartbeat übernimmt b
+        clock.now = 20.0
+        takeover = b.claim()
+        self.assertEqual(takeover.lease.job_id, first)
+        self.assertEqual(takeover.previous_owner, "a")
+        self.assertFalse(claim_a.lease.renew())
+        self.assertFalse(a.finish(claim_a.lease, {"errors": [], "seconds": 1.0}))
+        self.assertTrue(b.finish(takeover.lease, {"errors": [], "seconds": 2.0}))
+        self.assertEqual(coordinator.results()[first]["worker"], "b")
+        self.assertFalse(coordinator.finished())
+        coordinator.remove(first)
+        coordinator.remove(second)
+        self.assertTrue(coordinator.finished())
+
+    def test_gives_up_after_max_attempts(self):
+        clock = FakeClock()
+        job_id = WorkQueue(self.queue_dir).enqueue(0, {})
+        self.assertIsNotNone(WorkQueue(self.queue_dir, worker="a", clock=clock).claim())
+        observer = WorkQueue(self.queue_dir, worker="b", lease_seconds=1, max_attempts=2, clock=clock)
+        self.assertIsNone(observer.claim())
+        clock.now = 1.0
+        self.assertEqual(observer.claim().lease.generation, 2)
+        self.assertIsNone(observer.claim())
+        # Auch der zweite Versuch wurde nicht abgeschlossen
+        clock.now = 2.0
+        self.assertIsNone(observer.claim())
+        result = observer.results()[job_id]
+        self.assertEqual(len(result["errors"]), 1)
+        self.assertIn("2-mal", result["errors"][0])
+
+    def test_unreadable_job_leaves_no_lease(self):
+        coordinator = WorkQueue(self.queue_dir)
+        job_id = coordinator.enqueue(0, {"name": "gross"})
+        with open(coordinator.job_path(job_id), "w", encoding="utf-8") as f:
+            f.write('{"name": ')
+        worker = WorkQueue(self.queue_dir, worker="a")
+        self.assertIsNone(worker.claim())
+        self.assertEqual(worker.entries()["leases"], {})
+        # Sobald der Job lesbar ist, wird er mit der ersten Generation übernommen
+        with open(coordinator.job_path(job_id), "w", encoding="utf-8") as f:
+            f.write('{"name": "gross"}')
+        self.assertEqual(worker.claim().lease.generation, 1)
+
+    def test_takeover_removes_previous_partial_and_segments(self):
+        clock = FakeClock()
+        coordinator = WorkQueue(self.queue_dir)
+        profile = profiles.DEFAULT_PROFILE
+        coordinator.enqueue(0, {"profile_name": profile.name, "profile": profile.to_dict(), "chapters": None})
+        WorkQueue(self.queue_dir, worker="a", lease_seconds=10, clock=clock).claim()
+        b = WorkQueue(self.queue_dir, worker="b", lease_seconds=10, clock=clock)
+        self.assertIsNone(b.claim())
+        clock.now = 20.0
+        claim = b.claim()
+        self.assertEqual(claim.previous_owner, "a")
+
+        target = os.path.join(self.temp_dir, "ziel")
+        filepath = os.path.join(target, "Titel.mp3")
+        stale = partial_path(filepath, "a")
+        os.makedirs(target)
+        with open(stale, "wb") as f:
+            f.write(b"alt")
+        stale_segments = tempfile.mkdtemp(prefix=segment_prefix(stale), dir=target)
+        other_segments = tempfile.mkdtemp(prefix=segment_prefix(partial_path(filepath, "c")), dir=target)
+
+        class FakeHoerbuch:
+            def needs_reencoding(self, profile):
+                return True
+
+            def convert(self, output_path, segment_jobs, chapters, profile):
+                with open(output_path, "wb") as f:
+                    f.write(b"neu")
+                return []
+
+        errors, _ = convert_audiobooks.queue_job_run(FakeHoerbuch(), filepath, claim, 1, "b")
+        self.assertEqual(errors, [])
+        self.assertFalse(os.path.exists(stale))
+        self.assertFalse(os.path.exists(stale_segments))
+        # Segmente eines anderen Workers bleiben unberührt
+        self.assertTrue(os.path.isdir(other_segments))
+        with open(filepath, "rb") as f:
+            self.assertEqual(f.read(), b"neu")
+
+    def test_coordinator_with_worker_processes(self):
+        root = os.path.join(self.temp_dir, "root")
+        target = os.path.join(self.temp_dir, "ziel")
+        os.makedirs(target)
+        titles = ["Eins", "Zwei", "Drei", "Vier", "Fuenf"]
+        for n, title in enumerate(titles):
+            book_dir = os.path.join(root, "M", "Max Mustermann", title)
+            os.makedirs(book_dir)
+            for i in range(2):
+                with open(os.path.join(book_dir, f"track{i}.mp3"), "wb") as f:
+                    f.write(make_frames(HEADER_MONO_64K, 10 + n))
+        worker_args = [sys.executable, SCRIPT, root, "--worker", "--queue", self.queue_dir,
+                       "--convert-to", target, "-j", "2"]
+        workers = [subprocess.Popen(worker_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                   for _ in range(3)]
+        try:
+            argv = ["convert_audiobooks.py", root, "--queue", self.queue_dir, "--probe-backend", "native",
+                    "--no-probe-cache", "--convert-to", target]
+            with mock.patch.object(sys, "argv", argv), mock.patch("builtins.print"):
+                convert_audiobooks.main()
+            outputs = [worker.communicate(timeout=60)[0].decode("utf-8") for worker in workers]
+        finally:
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.kill()
+                    worker.wait()
+        self.assertEqual([worker.returncode for worker in workers], [0, 0, 0])
+        self.assertEqual(sum(output.count("[Done]") for output in outputs), len(titles))
+        self.assertEqual(sorted(os.listdir(os.path.join(target, "Max_Mustermann"))),
+                         sorted(f"{title}.mp3" for title in titles))
+        manifest = manifest_mod.Manifest(target)
+        for h in convert_audiobooks.finde_alle_hoerbuecher(root):
+            self.assertEqual(manifest.status(h, convert_audiobooks.output_path_for(h, target)), manifest_mod.UP_TO_DATE)
+        self.assertEqual(sorted(os.listdir(self.queue_dir)), [".complete"])
+
+if __name__ == "__main__":
+    unittest.main()
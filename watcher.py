@@ -0,0 +1,325 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# Hörbücher liegen unter <Buchstabe>/<Author>/<Titel>
+BOOK_DEPTH = 3
+
+# Konstanten aus <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+
+
+def book_key(rel_path):
+    """
+    (Buchstabe, Author, Titel) für einen Pfad relativ zur Wurzel, None oberhalb der Hörbuch-Ebene.
+    """
+    if rel_path in ("", os.curdir):
+        return None
+    parts = rel_path.split(os.sep)
+    if len(parts) < BOOK_DEPTH:
+        return None
+    return tuple(parts[:BOOK_DEPTH])
+
+
+def _subdirs(path):
+    """
+    Alle Verzeichnisse unter path (ohne path selbst), Elternverzeichnisse zuerst.
+    """
+    result = []
+    stack = [path]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                children = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            continue
+        result.extend(children)
+        stack.extend(children)
+    return result
+
+
+class InotifyWatcher:
+    """
+    Überwacht alle Verzeichnisse unter root mit inotify (nur Linux, über ctypes ohne zusätzliche Pakete).
+    Neue Verzeichnisse werden sofort mit überwacht. Bei einem Überlauf der Ereignis-Warteschlange
+    werden alle Verzeichnisse gemeldet, die sich seit dem letzten Lesen geändert haben.
+    """
+    name = "inotify"
+
+    def __init__(self, root):
+        self.root = root
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self._paths = {}
+        self._last_read = time.time()
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, path):
+        wd = self._add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            # ENOSPC: fs.inotify.max_user_watches reicht nicht aus
+            raise OSError(err, f"inotify_add_watch für {path} fehlgeschlagen: {os.strerror(err)}")
+        self._paths[wd] = path
+
+    def _watch_tree(self, path):
+        """
+        Überwacht path und alle Verzeichnisse darunter; gibt die Unterverzeichnisse zurück.
+        """
+        self._watch(path)
+        subdirs = _subdirs(path)
+        for subdir in subdirs:
+            self._watch(subdir)
+        return subdirs
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root)
+
+    def _changed_since(self, since):
+        changed = []
+        for path in [self.root] + self._watch_tree(self.root):
+            try:
+                if os.stat(path).st_mtime >= since:
+                    changed.append(self._rel(path))
+            except OSError:
+                pass
+        return changed
+
+    def read_changes(self, timeout):
+        """
+        Wartet höchstens timeout Sekunden auf Ereignisse und gibt die geänderten Pfade relativ zu root zurück.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        since = self._last_read
+        self._last_read = time.time()
+        changed = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Ereignisse verloren: geänderte Verzeichnisse anhand der mtime bestimmen
+                    changed.extend(self._changed_since(since - 1))
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                dir_path = self._paths.get(wd)
+                if dir_path is None:
+                    continue
+                path = os.path.join(dir_path, os.fsdecode(name)) if name else dir_path
+                changed.append(self._rel(path))
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Ein fertig befülltes Verzeichnis kann auf einmal hineinverschoben werden
+                    changed.extend(self._rel(subdir) for subdir in self._watch_tree(path))
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    Fallback ohne inotify: prüft alle interval Sekunden die mtime jedes bekannten Verzeichnisses
+    (ein stat-Aufruf pro Verzeichnis) und liest nur geänderte Verzeichnisse neu ein.
+    Erkennt angelegte, gelöschte und umbenannte Einträge; dass Dateien noch geschrieben werden,
+    erkennt BookSettler über die Größe und mtime der Dateien.
+    """
+    name = "polling"
+
+    def __init__(self, root, interval=5.0):
+        self.root = root
+        self.interval = interval
+        self._dirs = {}
+        self._scan(root)
+
+    def _scan(self, path):
+        """
+        Nimmt path mit allen Unterverzeichnissen auf und gibt die neuen Pfade relativ zu root zurück.
+        """
+        new = []
+        for dir_path in [path] + _subdirs(path):
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            rel = os.path.relpath(dir_path, self.root)
+            if rel not in self._dirs:
+                new.append(rel)
+            self._dirs[rel] = mtime
+        return new
+
+    def read_changes(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        changed = []
+        for rel, mtime in list(self._dirs.items()):
+            if rel not in self._dirs:
+                continue
+            dir_path = os.path.join(self.root, rel)
+            try:
+                current = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                # Verzeichnis entfernt oder umbenannt
+                prefix = rel + os.sep
+                for gone in [d for d in self._dirs if d == rel or d.startswith(prefix)]:
+                    del self._dirs[gone]
+                changed.append(rel)
+                continue
+            if current == mtime:
+                continue
+            self._dirs[rel] = current
+            changed.append(rel)
+            try:
+                with os.scandir(dir_path) as it:
+                    subdirs = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            for subdir in subdirs:
+                if os.path.relpath(subdir, self.root) not in self._dirs:
+                    changed.extend(self._scan(subdir))
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(root, backend="auto", interval=5.0):
+    """
+    Erzeugt einen InotifyWatcher oder (backend="poll") PollingWatcher. Mit backend="auto" wird auf Polling
+    ausgewichen, wenn inotify nicht verfügbar ist (kein Linux, zu wenige Watches).
+    """
+    if backend in ("auto", "inotify"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            if backend == "inotify":
+                raise
+            print(f"inotify nicht verfügbar ({e}), Verzeichnisse werden alle {interval:.0f} s abgefragt.")
+    return PollingWatcher(root, interval)
+
+
+def book_signature(book_path):
+    """
+    (Pfad, Größe, mtime) aller Dateien unter book_path; ändert sich, solange noch geschrieben wird.
+    """
+    signature = []
+    stack = [book_path]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        signature.append((entry.path, st.st_size, st.st_mtime_ns))
+        except OSError:
+            pass
+    signature.sort()
+    return tuple(signature)
+
+
+class BookSettler:
+    """
+    Sammelt geänderte Hörbücher und gibt sie erst frei, wenn sie settle_seconds lang unverändert waren.
+    Neben den gemeldeten Änderungen wird höchstens alle check_interval Sekunden die Signatur (Größe
+    und mtime der Dateien) der wartenden Hörbücher verglichen, damit auch noch laufende Kopien ohne
+    Ereignis (Polling, Netzlaufwerke) den Zeitpunkt verschieben.
+    """
+    def __init__(self, root, settle_seconds, check_interval=1.0, clock=time.monotonic):
+        self.root = root
+        self.settle_seconds = settle_seconds
+        self.check_interval = check_interval
+        self._clock = clock
+        # (Buchstabe, Author, Titel) -> [letzte Änderung, Signatur, Zeitpunkt der Signatur]
+        self._pending = {}
+
+    def mark(self, key):
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [self._clock(), None, None]
+        else:
+            entry[0] = self._clock()
+
+    def mark_path(self, rel_path):
+        key = book_key(rel_path)
+        if key is not None:
+            self.mark(key)
+
+    def timeout(self, default):
+        """
+        Wie lange höchstens auf Änderungen gewartet werden soll, bevor due() wieder aufgerufen wird.
+        """
+        if not self._pending:
+            return default
+        now = self._clock()
+        remaining = min(last + self.settle_seconds - now for last, _, _ in self._pending.values())
+        return max(0.0, min(default, self.check_interval, remaining))
+
+    def due(self):
+        """
+        Gibt die Hörbücher (Buchstabe, Author, Titel) zurück, die lange genug unverändert sind.
+        """
+        now = self._clock()
+        ready = []
+        for key, entry in list(self._pending.items()):
+            last, signature, checked = entry
+            settled = now - last >= self.settle_seconds
+            if settled or checked is None or now - checked >= self.check_interval:
+                current = book_signature(os.path.join(self.root, *key))
+                entry[1], entry[2] = current, now
+                if signature is not None and current != signature:
+                    entry[0] = now
+                    continue
+            if settled:
+                del self._pending[key]
+                ready.append(key)
+        return ready
+
+    def __len__(self):
+        return len(self._pending)
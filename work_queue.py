@@ -0,0 +1,263 @@
+import json
+import os
+import time
+import uuid
+import socket
+
+# Sekunden ohne Heartbeat, nach denen ein Job von einem anderen Worker übernommen wird
+LEASE_SECONDS = 60.0
+# Nach so vielen Übernahmen gilt ein Job als nicht konvertierbar (z. B. weil er jeden Worker abstürzen lässt)
+MAX_ATTEMPTS = 3
+# Abstand der Abfragen des Warteschlangen-Verzeichnisses
+POLL_SECONDS = 1.0
+# Marker: der Koordinator hat alle Jobs eingestellt
+COMPLETE_NAME = ".complete"
+
+
+def new_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def write_json_atomic(path, data):
+    """
+    Schreibt data als JSON in eine temporäre Datei und benennt sie atomar in path um.
+    """
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    """
+    Liest eine JSON-Datei; None, wenn sie fehlt oder (noch) unvollständig ist.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Lease:
+    """
+    Lease eines Workers auf einen Job: die Datei <job>.lease.<generation>, exklusiv angelegt.
+    Eine Übernahme legt die nächste Generation an; der bisherige Inhaber erkennt daran, dass er
+    den Job verloren hat.
+    """
+    def __init__(self, queue, job_id, generation):
+        self.queue = queue
+        self.job_id = job_id
+        self.generation = generation
+        self.path = queue.lease_path(job_id, generation)
+        self.renewed = queue.clock()
+
+    def valid(self):
+        """
+        True, solange der Job noch existiert und niemand eine höhere Generation angelegt hat.
+        """
+        entries = self.queue.entries()
+        return self.job_id in entries["jobs"] and entries["leases"].get(self.job_id, 0) == self.generation
+
+    def renew(self):
+        """
+        Heartbeat: setzt die mtime der Lease-Datei neu. Gibt False zurück, wenn die Lease verloren ist.
+        """
+        if not self.valid():
+            return False
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        self.renewed = self.queue.clock()
+        return True
+
+
+class Claim:
+    def __init__(self, lease, data, previous_owner):
+        self.lease = lease
+        self.data = data
+        # Worker, dessen Lease abgelaufen ist (für das Aufräumen seiner temporären Dateien)
+        self.previous_owner = previous_owner
+
+
+class WorkQueue:
+    """
+    Warteschlange als gemeinsames Verzeichnis ohne externen Dienst (auch über NFS/SMB auf mehreren Hosts):
+    <job>.job (vom Koordinator), <job>.lease.<n> (vom Worker exklusiv angelegt und per mtime erneuert)
+    und <job>.result (Ergebnis für den Koordinator). Die Jobnamen beginnen mit der Reihenfolge,
+    in der die Worker sie abarbeiten sollen.
+    Eine Lease gilt als abgelaufen, wenn sich ihre mtime lease_seconds lang (gemessen mit der
+    lokalen Uhr des beobachtenden Workers) nicht geändert hat; die Uhren der Hosts müssen daher
+    nicht synchron sein.
+    """
+    def __init__(self, path, worker=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 clock=time.monotonic):
+        self.path = path
+        self.worker = worker or new_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+        # Lease-Datei -> (mtime_ns, Zeitpunkt, seit dem sie unverändert ist)
+        self._observed = {}
+        os.makedirs(path, exist_ok=True)
+
+    def job_path(self, job_id):
+        return os.path.join(self.path, f"{job_id}.job")
+
+    def result_path(self, job_id):
+        return os.path.join(self.path, f"{job_id}.result")
+
+    def lease_path(self, job_id, generation):
+        return os.path.join(self.path, f"{job_id}.lease.{generation}")
+
+    def entries(self):
+        """
+        Liest das Verzeichnis einmal: {'jobs': set, 'results': set, 'leases': {job: höchste Generation}}.
+        """
+        jobs, results, leases = set(), set(), {}
+        for name in os.listdir(self.path):
+            base, _, ext = name.partition(".")
+            if ext == "job":
+                jobs.add(base)
+            elif ext == "result":
+                results.add(base)
+            elif ext.startswith("lease.") and ext[6:].isdigit():
+                leases[base] = max(leases.get(base, 0), int(ext[6:]))
+        return {"jobs": jobs, "results": results, "leases": leases}
+
+    # Koordinator
+
+    def reset(self):
+        """
+        Entfernt Jobs, Leases und Ergebnisse eines früheren Laufs sowie den Abschluss-Marker.
+        """
+        for name in os.listdir(self.path):
+            if name == COMPLETE_NAME or name.partition(".")[2].split(".")[0] in ("job", "lease", "result"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def enqueue(self, order, data):
+        job_id = f"{order:06d}-{uuid.uuid4().hex[:8]}"
+        write_json_atomic(self.job_path(job_id), data)
+        return job_id
+
+    def mark_complete(self):
+        with open(os.path.join(self.path, COMPLETE_NAME), "w"):
+            pass
+
+    def jobs(self):
+        """
+        Alle eingestellten Jobs als dict Job -> Daten.
+        """
+        jobs = {}
+        for job_id in self.entries()["jobs"]:
+            data = read_json(self.job_path(job_id))
+            if data is not None:
+                jobs[job_id] = data
+        return jobs
+
+    def results(self):
+        """
+        Alle vorliegenden Ergebnisse als dict Job -> Ergebnis.
+        """
+        results = {}
+        for job_id in self.entries()["results"]:
+            result = read_json(self.result_path(job_id))
+            if result is not None:
+                results[job_id] = result
+        return results
+
+    def remove(self, job_id):
+        """
+        Entfernt einen abgeschlossenen Job samt Leases und Ergebnis.
+        """
+        prefix = f"{job_id}."
+        for name in os.listdir(self.path):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    # Worker
+
+    def finished(self):
+        """
+        True, wenn der Koordinator alle Jobs eingestellt hat und für jeden ein Ergebnis vorliegt.
+        """
+        if not os.path.exists(os.path.join(self.path, COMPLETE_NAME)):
+            return False
+        entries = self.entries()
+        return entries["jobs"] <= entries["results"]
+
+    def _expired(self, lease_file):
+        """
+        True, wenn sich die mtime der Lease-Datei seit lease_seconds nicht geändert hat.
+        """
+        try:
+            mtime = os.stat(lease_file).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        now = self.clock()
+        seen = self._observed.get(lease_file)
+        if seen is None or seen[0] != mtime:
+            self._observed[lease_file] = (mtime, now)
+            return False
+        return now - seen[1] >= self.lease_seconds
+
+    def _create_lease(self, job_id, generation):
+        try:
+            fd = os.open(self.lease_path(job_id, generation), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"worker": self.worker, "host": socket.gethostname(), "pid": os.getpid()}, f)
+        return Lease(self, job_id, generation)
+
+    def claim(self):
+        """
+        Übernimmt den ersten Job ohne Ergebnis, der entweder noch keine oder eine abgelaufene Lease hat.
+        Liefert einen Claim oder None. Nach max_attempts abgelaufenen Leases wird statt einer weiteren
+        Übernahme ein Fehler als Ergebnis eingetragen.
+        """
+        entries = self.entries()
+        for job_id in sorted(entries["jobs"] - entries["results"]):
+            generation = entries["leases"].get(job_id, 0)
+            previous_owner = None
+            if generation:
+                lease_file = self.lease_path(job_id, generation)
+                if not self._expired(lease_file):
+                    continue
+                previous_owner = (read_json(lease_file) or {}).get("worker")
+                if generation >= self.max_attempts:
+                    write_json_atomic(self.result_path(job_id), {
+                        "worker": self.worker, "seconds": None,
+                        "errors": [f"Job wurde {generation}-mal von einem Worker nicht abgeschlossen "
+                                   f"(zuletzt {previous_owner}), wird nicht erneut versucht."],
+                    })
+                    continue
+            # Erst lesen, dann leasen: ein unlesbarer Job darf keine verwaiste Lease hinterlassen
+            data = read_json(self.job_path(job_id))
+            if data is None:
+                continue
+            lease = self._create_lease(job_id, generation + 1)
+            if lease is None:
+                # Ein anderer Worker war schneller
+                continue
+            return Claim(lease, data, previous_owner)
+        return None
+
+    def finish(self, lease, result):
+        """
+        Meldet das Ergebnis eines Jobs, sofern die Lease noch gültig ist. Gibt True bei Erfolg zurück.
+        """
+        if not lease.valid():
+            return False
+        result = dict(result, worker=self.worker)
+        write_json_atomic(self.result_path(lease.job_id), result)
+        return True